@@ -2,7 +2,8 @@ from django.contrib import admin
 from .models import (
     Farmacia, Moto, Motorista, Movimiento,
     AsignacionMoto, AsignacionFarmacia, UsuarioRol,
-    PasswordRecoveryCode, ReporteMovimiento
+    PasswordRecoveryCode, ReporteMovimiento, ResumenMovimientoDiario, TrabajoReporte,
+    MovimientoEliminado, TransicionMovimiento,
 )
 
 # Register your models here.
@@ -34,11 +35,13 @@ class MovimientoAdmin(admin.ModelAdmin):
 @admin.register(AsignacionMoto)
 class AsignacionMotoAdmin(admin.ModelAdmin):
     list_display = ['motorista', 'moto', 'fecha_asignacion', 'activa']
+    search_fields = ['motorista__nombre', 'moto__patente']
     list_filter = ['activa', 'fecha_asignacion']
 
 @admin.register(AsignacionFarmacia)
 class AsignacionFarmaciaAdmin(admin.ModelAdmin):
     list_display = ['motorista', 'farmacia', 'fecha_asignacion', 'activa']
+    search_fields = ['motorista__nombre', 'farmacia__nombre']
     list_filter = ['activa', 'fecha_asignacion']
 
 @admin.register(UsuarioRol)
@@ -54,4 +57,26 @@ class PasswordRecoveryCodeAdmin(admin.ModelAdmin):
 @admin.register(ReporteMovimiento)
 class ReporteMovimientoAdmin(admin.ModelAdmin):
     list_display = ['tipo', 'fecha_generacion', 'generado_por', 'total_movimientos']
-    list_filter = ['tipo', 'fecha_generacion']
\ No newline at end of file
+    list_filter = ['tipo', 'fecha_generacion']
+
+@admin.register(ResumenMovimientoDiario)
+class ResumenMovimientoDiarioAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'farmacia_origen', 'tipo', 'estado', 'total']
+    list_filter = ['tipo', 'estado', 'fecha']
+
+@admin.register(TrabajoReporte)
+class TrabajoReporteAdmin(admin.ModelAdmin):
+    list_display = ['id', 'reporte', 'solicitado_por', 'estado', 'fecha_creacion', 'fecha_fin']
+    list_filter = ['estado', 'fecha_creacion']
+
+@admin.register(TransicionMovimiento)
+class TransicionMovimientoAdmin(admin.ModelAdmin):
+    list_display = ['movimiento', 'estado_anterior', 'estado_nuevo', 'version', 'usuario', 'fecha']
+    list_filter = ['estado_nuevo', 'fecha']
+    raw_id_fields = ['movimiento']
+
+
+@admin.register(MovimientoEliminado)
+class MovimientoEliminadoAdmin(admin.ModelAdmin):
+    list_display = ['movimiento_id', 'codigo', 'fecha_eliminacion']
+    search_fields = ['codigo']
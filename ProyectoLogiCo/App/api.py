@@ -0,0 +1,221 @@
+"""
+Utilidades para los ViewSets de la API REST.
+
+- Paginación por cursor (keyset), así los clientes que consultan seguido
+  no descargan la tabla completa en cada llamada.
+- ?fields=a,b     proyección de columnas, se aplica con .only() en el SQL.
+- ?expand=fk1,fk2 relaciones anidadas resueltas con select_related (un JOIN)
+  en lugar de devolver solo el id de la FK.
+- 409 Conflict cuando la versión enviada ya no es la vigente.
+- ETag en listados y detalles (más Last-Modified en detalles): quien
+  consulta seguido y no hay cambios recibe 304 sin que se serialice nada.
+- RolRequerido: el @rol_requerido de las vistas, para la API (por defecto
+  solo admin; settings.REST_FRAMEWORK exige además sesión iniciada).
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import BasePermission
+from rest_framework.relations import PrimaryKeyRelatedField
+
+from .models import Movimiento, rol_de
+
+
+def _parametro_lista(request, nombre):
+    if request is None:
+        return []
+    valor = request.query_params.get(nombre, '')
+    return [campo.strip() for campo in valor.split(',') if campo.strip()]
+
+
+# =====================================================
+# PAGINACIÓN
+# =====================================================
+
+class CursorCatalogo(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'tamano'
+    max_page_size = 500
+    ordering = 'id'
+
+
+class CursorMovimientos(CursorCatalogo):
+    ordering = Movimiento._meta.ordering
+
+
+# =====================================================
+# SERIALIZERS CON CAMPOS DINÁMICOS
+# =====================================================
+
+class RelacionPrecargada(PrimaryKeyRelatedField):
+    """
+    FK por id que primero busca en context['precargadas'][campo] ({pk: obj}),
+    así un lote resuelve sus relaciones con un IN en vez de un GET por ítem
+    """
+
+    def to_internal_value(self, data):
+        precargadas = self.context.get('precargadas', {}).get(self.field_name)
+        if precargadas is None or isinstance(data, bool):
+            return super().to_internal_value(data)
+        try:
+            return precargadas[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class CamposDinamicosMixin:
+    """
+    Mixin para ModelSerializer. Las relaciones que se pueden expandir se
+    declaran en Meta.expandibles = {'campo_fk': SerializerAnidado}.
+    """
+    serializer_related_field = RelacionPrecargada
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+
+        expand = set(_parametro_lista(request, 'expand'))
+        for campo, serializer_class in getattr(self.Meta, 'expandibles', {}).items():
+            if campo in expand:
+                self.fields[campo] = serializer_class(read_only=True)
+
+        campos = _parametro_lista(request, 'fields')
+        if campos:
+            permitidos = set(campos) | expand
+            for campo in list(self.fields):
+                if campo not in permitidos and campo != 'id':
+                    self.fields.pop(campo)
+
+
+class ProyeccionMixin:
+    """
+    Mixin para ModelViewSet: lleva ?fields= y ?expand= hasta el queryset
+    para que el SQL solo lea las columnas y relaciones pedidas.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method != 'GET':
+            return queryset
+
+        model = queryset.model
+        concretos = {f.name for f in model._meta.concrete_fields}
+        expandibles = getattr(self.get_serializer_class().Meta, 'expandibles', {})
+
+        expand = [c for c in _parametro_lista(self.request, 'expand') if c in expandibles]
+        if expand:
+            queryset = queryset.select_related(*expand)
+
+        campos = [c for c in _parametro_lista(self.request, 'fields') if c in concretos]
+        if campos:
+            # El paginador necesita las columnas de orden en cada fila
+            orden = getattr(self.pagination_class, 'ordering', ())
+            if isinstance(orden, str):
+                orden = (orden,)
+            obligatorios = {'id'} | {c.lstrip('-') for c in orden} | set(expand)
+            queryset = queryset.only(*(set(campos) | obligatorios))
+        return queryset
+
+
+# =====================================================
+# PETICIONES CONDICIONALES
+# =====================================================
+
+class CondicionalMixin:
+    """
+    Mixin para ModelViewSet: list y retrieve responden If-None-Match a
+    partir de fecha_actualizacion, con una sola consulta de agregados antes
+    de serializar.
+
+    - Listado: MAX(fecha_actualizacion) y COUNT(*) del queryset filtrado
+      (un borrado no mueve el máximo, pero sí el conteo). Solo ETag: una
+      fecha no refleja los borrados, así que no se envía Last-Modified ni
+      se atiende If-Modified-Since.
+    - Detalle: la fecha_actualizacion de la fila, también como
+      Last-Modified / If-Modified-Since.
+
+    Las relaciones pedidas con ?expand= aportan su propio máximo, y la URL
+    completa y el formato entran al ETag porque cambian el cuerpo.
+    """
+    campo_actualizacion = 'fecha_actualizacion'
+
+    def _validadores(self, queryset):
+        campo = self.campo_actualizacion
+        expandibles = getattr(self.get_serializer_class().Meta, 'expandibles', {})
+        relaciones = [
+            c for c in _parametro_lista(self.request, 'expand')
+            if c in expandibles and hasattr(expandibles[c].Meta.model, campo)
+        ]
+        marcas = {'propia': Max(campo), **{r: Max(f'{r}__{campo}') for r in relaciones}}
+        agregados = queryset.order_by().aggregate(total=Count('pk'), **marcas)
+        total = agregados.pop('total')
+        fechas = [fecha for fecha in agregados.values() if fecha is not None]
+
+        firma = '|'.join([
+            *(fecha.isoformat() if fecha else '-' for fecha in agregados.values()),
+            str(total), self.request.get_full_path(), self.request.accepted_media_type or '',
+        ])
+        etag = f'"{hashlib.sha1(firma.encode()).hexdigest()}"'
+        ultima = int(max(fechas).timestamp()) if fechas else None
+        return etag, ultima, total
+
+    def _condicional(self, queryset, vista, *args, **kwargs):
+        etag, ultima, total = self._validadores(queryset)
+        if self.action != 'retrieve':
+            # Tras un borrado el máximo sigue igual: un listado se valida solo con el ETag
+            ultima = None
+        elif not total:
+            # Detalle inexistente: el 404 lo arma DRF
+            return vista(self.request, *args, **kwargs)
+        respuesta = get_conditional_response(self.request, etag=etag, last_modified=ultima)
+        if respuesta is None:
+            respuesta = vista(self.request, *args, **kwargs)
+        if respuesta.status_code in (200, 304):
+            respuesta['ETag'] = etag
+            if ultima is not None:
+                respuesta['Last-Modified'] = http_date(ultima)
+        return respuesta
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self._condicional(queryset, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        campo = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(**{self.lookup_field: kwargs[campo]})
+        except (TypeError, ValueError):
+            return super().retrieve(request, *args, **kwargs)
+        return self._condicional(queryset, super().retrieve, *args, **kwargs)
+
+
+# =====================================================
+# CONFLICTOS
+# =====================================================
+
+class Conflicto(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Otro usuario modificó el recurso; vuelve a leerlo antes de guardar.'
+    default_code = 'conflicto'
+
+
+class RolRequerido(BasePermission):
+    """
+    Roles permitidos en view.roles (por defecto solo admin, como los CRUD
+    del sitio); view.roles_por_accion los cambia para acciones puntuales.
+    """
+    message = 'Su rol no tiene acceso a este recurso.'
+
+    def has_permission(self, request, view):
+        roles = getattr(view, 'roles', ('admin',))
+        roles = getattr(view, 'roles_por_accion', {}).get(getattr(view, 'action', None), roles)
+        return rol_de(request.user) in roles
@@ -8,6 +8,7 @@ class AppConfig(AppConfig):
     def ready(self):
         """Se ejecuta automáticamente cuando Django inicia"""
         post_migrate.connect(create_default_users, sender=self)
+        from . import signals  # noqa: F401  registra los receivers
 
 def create_default_users(sender, **kwargs):
     """Crea usuarios por defecto después de las migraciones"""
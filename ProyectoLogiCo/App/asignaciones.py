@@ -0,0 +1,79 @@
+"""
+Historial de asignaciones: quién tenía la moto X (o atendía la farmacia Y)
+en la fecha T.
+
+Cada AsignacionMoto / AsignacionFarmacia cubre el intervalo semiabierto
+[fecha_asignacion, fecha_fin): el día de término ya corresponde a la
+asignación siguiente, y fecha_fin nula significa "hasta hoy". Las consultas
+filtran solo por fechas y usan los índices (moto|farmacia|motorista,
+fecha_asignacion, fecha_fin) de la migración 0016.
+
+Las restricciones únicas parciales sobre activa impiden dos asignaciones
+vigentes a la vez para la misma moto o el mismo motorista. Los cruces en
+el historial cerrado los rechaza en PostgreSQL la restricción de exclusión
+de la migración 0025 y en SQLite la validación del modelo;
+`solapamientos` sirve para revisar datos cargados por otras vías.
+"""
+from datetime import date
+
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.functions import Coalesce
+
+from .models import AsignacionFarmacia, AsignacionMoto
+
+FIN_ABIERTO = date.max
+
+
+def _vigente_en(fecha):
+    return Q(fecha_asignacion__lte=fecha) & (Q(fecha_fin__isnull=True) | Q(fecha_fin__gt=fecha))
+
+
+def _cruza(desde, hasta):
+    """Intervalos que se cruzan con [desde, hasta)"""
+    return Q(fecha_asignacion__lt=hasta) & (Q(fecha_fin__isnull=True) | Q(fecha_fin__gt=desde))
+
+
+def asignaciones_en(modelo, fecha, **filtros):
+    """Asignaciones de `modelo` vigentes en `fecha`"""
+    return modelo.objects.filter(_vigente_en(fecha), **filtros)
+
+
+def asignaciones_entre(modelo, desde, hasta, **filtros):
+    """Asignaciones de `modelo` con algún día dentro de [desde, hasta)"""
+    return modelo.objects.filter(_cruza(desde, hasta), **filtros)
+
+
+def motoristas_de_motos_en(fecha, motos=None):
+    """{moto_id: motorista_id} en `fecha`, en una sola consulta"""
+    filtros = {} if motos is None else {'moto_id__in': list(motos)}
+    return dict(asignaciones_en(AsignacionMoto, fecha, **filtros).values_list('moto_id', 'motorista_id'))
+
+
+def motoristas_de_farmacias_en(fecha, farmacias=None):
+    """{farmacia_id: [motorista_id, ...]} en `fecha`, en una sola consulta"""
+    filtros = {} if farmacias is None else {'farmacia_id__in': list(farmacias)}
+    resultado = {}
+    filas = asignaciones_en(AsignacionFarmacia, fecha, **filtros).order_by('farmacia_id', 'motorista_id')
+    for farmacia_id, motorista_id in filas.values_list('farmacia_id', 'motorista_id'):
+        resultado.setdefault(farmacia_id, []).append(motorista_id)
+    return resultado
+
+
+def cerrar_asignaciones_vencidas():
+    """Desactiva las asignaciones con fecha_fin cumplida (comando purgar_vencidos)"""
+    return AsignacionMoto.cerrar_vencidas() + AsignacionFarmacia.cerrar_vencidas()
+
+
+def solapamientos(modelo, campo):
+    """
+    Asignaciones de `modelo` que se cruzan con otra del mismo `campo`
+    ('moto' o 'motorista'), p. ej. solapamientos(AsignacionMoto, 'moto').
+    """
+    fin = Coalesce('fecha_fin', FIN_ABIERTO)
+    otras = (
+        modelo.objects.annotate(fin=fin)
+        .filter(**{campo: OuterRef(campo)})
+        .exclude(pk=OuterRef('pk'))
+        .filter(fecha_asignacion__lt=OuterRef('fin'), fin__gt=OuterRef('fecha_asignacion'))
+    )
+    return modelo.objects.annotate(fin=fin).filter(Exists(otras)).order_by(campo, 'fecha_asignacion', 'pk')
@@ -0,0 +1,58 @@
+"""
+Búsqueda por prefijo para los selects de motorista, moto y farmacia.
+
+Los formularios ya no cargan la tabla completa en el <select>: el widget
+SelectAutocompletar (App/forms.py) solo trae la opción elegida y el resto
+se pide a /autocompletar/<modelo>/?q= mientras se escribe.
+
+Las búsquedas usan istartswith, que en PostgreSQL genera
+UPPER(col::text) LIKE 'PREFIJO%'. La migración 0015 crea índices sobre
+esa misma expresión con text_pattern_ops, que sirven para LIKE con prefijo
+cualquiera sea la collation de la base.
+"""
+from django.db.models import Q
+
+from .models import Farmacia, Moto, Motorista
+
+LIMITE = 20
+
+# modelo -> (modelo, campos buscados, columnas para armar el texto, formato)
+# El texto replica el __str__ de cada modelo sin instanciar objetos
+AUTOCOMPLETABLES = {
+    'motorista': (Motorista, ('nombre', 'rut'), ('nombre', 'licencia'), "{0} ({1})"),
+    'moto': (Moto, ('patente',), ('marca', 'modelo', 'patente'), "{0} {1} - {2}"),
+    'farmacia': (Farmacia, ('nombre',), ('nombre', 'comuna'), "{0} ({1})"),
+}
+
+
+def _consulta(modelo, texto, limite):
+    """(queryset ordenado y acotado o None, columnas, formato)"""
+    model, campos, columnas, formato = AUTOCOMPLETABLES[modelo]
+    texto = (texto or '').strip()
+    if not texto:
+        return None, columnas, formato
+    filtro = Q()
+    for campo in campos:
+        filtro |= Q(**{f'{campo}__istartswith': texto})
+    return model.objects.filter(filtro).order_by(campos[0], 'pk')[:limite], columnas, formato
+
+
+def buscar(modelo, texto, limite=LIMITE):
+    """[{'id': pk, 'texto': etiqueta}, ...] de los registros que empiezan por texto"""
+    filas, columnas, formato = _consulta(modelo, texto, limite)
+    if filas is None:
+        return []
+    return [{'id': pk, 'texto': formato.format(*valores)} for pk, *valores in filas.values_list('pk', *columnas)]
+
+
+async def abuscar(modelo, texto, limite=LIMITE):
+    """buscar() con el ORM asíncrono, para la vista servida por ASGI"""
+    filas, columnas, formato = _consulta(modelo, texto, limite)
+    if filas is None:
+        return []
+    # values() y no values_list(): en Django 5.2 el aiterator de values_list
+    # ejecuta la consulta fuera del hilo de sync_to_async
+    return [
+        {'id': fila['pk'], 'texto': formato.format(*(fila[c] for c in columnas))}
+        async for fila in filas.values('pk', *columnas).aiterator()
+    ]
@@ -0,0 +1,20 @@
+"""
+Backend de autenticación que carga el rol junto con el usuario.
+
+AuthenticationMiddleware llama a get_user() en cada request; con el JOIN a
+usuario_rol los predicados es_admin / es_recepcionista leen user.rol desde
+memoria en lugar de hacer una consulta extra por vista. Como el rol se lee
+de la base en cada request, un cambio de UsuarioRol se ve de inmediato.
+"""
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+
+
+class RolBackend(ModelBackend):
+
+    def get_user(self, user_id):
+        try:
+            user = User._default_manager.select_related('rol').get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,196 @@
+"""
+Cache en disco de reportes PDF.
+
+La clave es el hash del periodo normalizado más la versión de ese periodo
+(VersionPeriodo), que se incrementa con cada escritura de Movimiento que
+cae dentro de él. Un periodo cerrado que nadie modifica conserva su
+versión y su PDF se sirve desde disco sin volver a recorrer Movimiento.
+
+Cada escritura incrementa solo su día y su mes; la versión del año y la
+del total son la suma de las de sus meses, así no hay una fila que todos
+los escritores actualicen. El incremento corre en transaction.on_commit,
+fuera de la transacción del escritor: los bloqueos de fila duran un
+UPDATE y no toda la transacción.
+
+Los nombres de motorista y farmacia también salen en el PDF; editar o
+borrar uno incrementa la clave global "G", que invalida todos los periodos.
+Solo cuenta el cambio de nombre: las demás ediciones no tocan el cache.
+
+El directorio se mantiene bajo settings.REPORTES_CACHE_MAX_BYTES
+expulsando los archivos usados hace más tiempo (mtime se actualiza en
+cada acierto).
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import VersionPeriodo
+from .reportes import rango_periodo
+
+# Cambiar si cambia el formato del PDF, invalida todo el cache
+FORMATO = 'pdf-1'
+CLAVE_GLOBAL = 'G'
+
+
+def claves_periodo(fecha_registro):
+    dia = timezone.localdate(fecha_registro)
+    return [f"D{dia.isoformat()}", f"M{dia.year}-{dia.month:02d}"]
+
+
+def incrementar_versiones(fechas_registro):
+    """Invalida los periodos (día y mes; año y total por suma) de las fechas dadas, tras el commit"""
+    claves = sorted({clave for fecha in fechas_registro for clave in claves_periodo(fecha)})
+    transaction.on_commit(lambda: _incrementar(claves))
+
+
+def invalidar_todo():
+    """Para cambios en datos que aparecen en todos los reportes (nombres)"""
+    transaction.on_commit(lambda: _incrementar([CLAVE_GLOBAL]))
+
+
+def _incrementar(claves):
+    if not claves:
+        return
+    actualizadas = VersionPeriodo.objects.filter(clave__in=claves).update(version=F('version') + 1)
+    if actualizadas == len(claves):
+        return
+    existentes = set(VersionPeriodo.objects.filter(clave__in=claves).values_list('clave', flat=True))
+    for clave in claves:
+        if clave in existentes:
+            continue
+        try:
+            with transaction.atomic():
+                VersionPeriodo.objects.create(clave=clave, version=1)
+        except IntegrityError:
+            VersionPeriodo.objects.filter(clave=clave).update(version=F('version') + 1)
+
+
+def periodo_de(tipo, fecha=None, mes=None, anio=None):
+    """Clave de VersionPeriodo para parámetros ya normalizados"""
+    rango = rango_periodo(tipo, fecha, mes, anio)
+    if rango is None:
+        return "T"
+    inicio = timezone.localdate(rango[0])
+    if tipo == "DIARIO":
+        return f"D{inicio.isoformat()}"
+    if tipo == "MENSUAL":
+        return f"M{inicio.year}-{inicio.month:02d}"
+    return f"A{inicio.year}"
+
+
+def _prefijo_meses(periodo):
+    """Prefijo de los meses cuya suma es la versión del año o del total; None para día y mes"""
+    if periodo == "T":
+        return "M"
+    if periodo.startswith("A"):
+        return f"M{periodo[1:]}-"
+    return None
+
+
+def clave_cache(tipo, fecha=None, mes=None, anio=None):
+    periodo = periodo_de(tipo, fecha, mes, anio)
+    prefijo = _prefijo_meses(periodo)
+    if prefijo is None:
+        filtro = Q(clave__in=[periodo, CLAVE_GLOBAL])
+    else:
+        filtro = Q(clave=CLAVE_GLOBAL) | Q(clave__startswith=prefijo)
+    versiones = dict(VersionPeriodo.objects.filter(filtro).values_list('clave', 'version'))
+    if prefijo is None:
+        version = versiones.get(periodo, 0)
+    else:
+        # Las versiones solo crecen: la suma cambia con cualquier mes
+        version = sum(v for clave, v in versiones.items() if clave.startswith(prefijo))
+    texto = (
+        f"{FORMATO}|{tipo}|{fecha}|{mes}|{anio}|{periodo}|"
+        f"{version}|{versiones.get(CLAVE_GLOBAL, 0)}"
+    )
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+class CacheReportes:
+
+    def __init__(self, directorio=None, max_bytes=None):
+        self.directorio = str(directorio or settings.REPORTES_CACHE_DIR)
+        self.max_bytes = max_bytes if max_bytes is not None else settings.REPORTES_CACHE_MAX_BYTES
+
+    def ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.pdf")
+
+    def obtener(self, clave):
+        """Ruta del PDF cacheado o None. Marca el archivo como recién usado"""
+        ruta = self.ruta(clave)
+        try:
+            os.utime(ruta)
+        except FileNotFoundError:
+            return None
+        return ruta
+
+    def abrir(self, clave):
+        """
+        PDF cacheado abierto para lectura, o None. expulsar() de otro proceso
+        puede borrarlo entre obtener() y open(): entonces se regenera.
+        """
+        ruta = self.obtener(clave)
+        if ruta is None:
+            return None
+        try:
+            return open(ruta, 'rb')
+        except FileNotFoundError:
+            return None
+
+    def _temporal(self):
+        os.makedirs(self.directorio, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=self.directorio, suffix='.tmp', delete=False)
+
+    def guardar_stream(self, clave, partes):
+        """
+        Reenvía las partes del PDF y a la vez las escribe en el cache. El
+        archivo solo se publica si el stream se completó.
+        """
+        temporal = self._temporal()
+        completo = False
+        try:
+            with temporal:
+                for parte in partes:
+                    temporal.write(parte)
+                    yield parte
+            completo = True
+        finally:
+            if completo:
+                os.replace(temporal.name, self.ruta(clave))
+                self.expulsar()
+            else:
+                os.remove(temporal.name)
+
+    def guardar_archivo(self, clave, origen):
+        temporal = self._temporal()
+        temporal.close()
+        shutil.copyfile(origen, temporal.name)
+        os.replace(temporal.name, self.ruta(clave))
+        self.expulsar()
+
+    def expulsar(self):
+        """Borra los PDFs menos usados hasta quedar bajo el límite"""
+        archivos = []
+        total = 0
+        with os.scandir(self.directorio) as entradas:
+            for entrada in entradas:
+                if not entrada.name.endswith('.pdf'):
+                    continue
+                info = entrada.stat()
+                archivos.append((info.st_mtime, info.st_size, entrada.path))
+                total += info.st_size
+        for _, tamano, ruta in sorted(archivos):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+            total -= tamano
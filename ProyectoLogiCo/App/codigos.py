@@ -0,0 +1,111 @@
+"""
+Códigos de Movimiento asignados por el servidor.
+
+Formato AAMMDD-<farmacia>-NNNN (p. ej. 251018-12-0042): una secuencia por
+farmacia de origen y día, guardada en SecuenciaCodigo.
+
+Cada proceso reserva bloques de CODIGOS_BLOQUE números con un solo UPDATE
+y los entrega desde memoria, sin ir a la base por cada movimiento:
+
+- El UPDATE ... SET siguiente = siguiente + bloque toma el lock de la fila
+  y la lectura posterior, en la misma transacción, devuelve el valor que
+  dejó este proceso; dos procesos (o dos workers de gunicorn) nunca
+  reciben el mismo bloque.
+- Un bloque solo queda en memoria si se reservó en su propia transacción.
+  Dentro de un atomic() externo se reserva un único número sin guardarlo:
+  si esa transacción se revierte, el número vuelve a la base junto con el
+  movimiento que lo usaba.
+
+Los números que un proceso no alcanza a usar (reinicio, cambio de día)
+quedan como huecos: los códigos son únicos, no correlativos.
+"""
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import SecuenciaCodigo
+
+
+def prefijo(farmacia_id, fecha):
+    return f"{fecha:%y%m%d}-{farmacia_id or 0}"
+
+
+def formatear(clave, numero):
+    return f"{clave}-{numero:04d}"
+
+
+def reservar(clave, cantidad):
+    """Reserva `cantidad` números de la secuencia `clave`; devuelve el primero"""
+    with transaction.atomic():
+        actualizadas = SecuenciaCodigo.objects.filter(clave=clave).update(siguiente=F('siguiente') + cantidad)
+        if not actualizadas:
+            try:
+                with transaction.atomic():
+                    SecuenciaCodigo.objects.create(clave=clave, siguiente=1 + cantidad)
+                return 1
+            except IntegrityError:
+                # Otro proceso creó la fila entre el UPDATE y el INSERT
+                SecuenciaCodigo.objects.filter(clave=clave).update(siguiente=F('siguiente') + cantidad)
+        siguiente = SecuenciaCodigo.objects.values_list('siguiente', flat=True).get(clave=clave)
+    return siguiente - cantidad
+
+
+def asignar_lote(movimientos, fecha=None):
+    """
+    Completa el código de los movimientos que no traen uno, con un solo
+    UPDATE por farmacia. Pensado para bulk_create dentro de la transacción
+    del lote: si se revierte, los números vuelven a la secuencia.
+    """
+    fecha = fecha or timezone.localdate()
+    por_farmacia = {}
+    for movimiento in movimientos:
+        if not movimiento.codigo:
+            por_farmacia.setdefault(movimiento.farmacia_origen_id, []).append(movimiento)
+    for farmacia_id, pendientes in por_farmacia.items():
+        clave = prefijo(farmacia_id, fecha)
+        inicio = reservar(clave, len(pendientes))
+        for numero, movimiento in enumerate(pendientes, start=inicio):
+            movimiento.codigo = formatear(clave, numero)
+
+
+class AsignadorCodigos:
+    """Entrega códigos desde bloques reservados; uno por proceso, seguro entre hilos"""
+
+    def __init__(self, bloque=None):
+        self._bloque = bloque
+        self._lock = threading.Lock()
+        self._bloques = {}
+
+    @property
+    def bloque(self):
+        return self._bloque or getattr(settings, 'CODIGOS_BLOQUE', 50)
+
+    def siguiente(self, farmacia_id, fecha=None):
+        fecha = fecha or timezone.localdate()
+        clave = prefijo(farmacia_id, fecha)
+        with self._lock:
+            actual = self._bloques.get(clave)
+            if actual and actual[0] < actual[1]:
+                numero = actual[0]
+                actual[0] += 1
+                return formatear(clave, numero)
+
+            if connection.in_atomic_block:
+                return formatear(clave, reservar(clave, 1))
+
+            inicio = reservar(clave, self.bloque)
+            # Solo se conservan los bloques del día, las secuencias viejas ya no se piden
+            sufijo = f"{fecha:%y%m%d}-"
+            self._bloques = {c: b for c, b in self._bloques.items() if c.startswith(sufijo)}
+            self._bloques[clave] = [inicio + 1, inicio + self.bloque]
+            return formatear(clave, inicio)
+
+    def limpiar(self):
+        with self._lock:
+            self._bloques.clear()
+
+
+asignador = AsignadorCodigos()
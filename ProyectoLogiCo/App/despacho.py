@@ -0,0 +1,202 @@
+"""
+Despacho: propone el motorista y la moto para un nuevo Movimiento.
+
+Cada proceso mantiene un índice en memoria con la disponibilidad:
+motoristas activos por farmacia (AsignacionFarmacia activa o
+Motorista.farmacia), sus motos (AsignacionMoto activa o Motorista.moto),
+Moto.disponible y quién tiene un movimiento EN_PROCESO. Las señales de
+App/signals.py refrescan solo las entradas afectadas después del commit,
+así una propuesta no consulta la base.
+
+El índice de un proceso no ve lo que escriben los demás hasta que se
+recarga (MAX_EDAD segundos). Lo que impide la doble reserva es la base:
+Movimiento tiene restricciones únicas parciales sobre motorista y moto
+con estado EN_PROCESO, y la vista traduce el IntegrityError a un error
+del formulario.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.db.models import OuterRef, Subquery
+
+from .models import AsignacionFarmacia, AsignacionMoto, Moto, Motorista, Movimiento
+
+MAX_EDAD = 60
+
+
+def _activo(estado):
+    return (estado or '').strip().lower() == 'activo'
+
+
+def _ultimo_despacho(motorista):
+    """fecha_registro del último movimiento del motorista, leída del índice (motorista, fecha_registro)"""
+    return Movimiento.objects.filter(motorista_id=motorista).order_by('-fecha_registro').values_list(
+        'fecha_registro', flat=True
+    )[:1]
+
+
+class IndiceDespacho:
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._cargado_en = None
+        self.motoristas = {}
+        self.motos = {}
+        self.por_farmacia = defaultdict(set)
+
+    # ----- carga -----
+
+    def cargar(self):
+        """Reconstruye el índice completo (cinco consultas)"""
+        farmacias = defaultdict(set)
+        for motorista_id, farmacia_id in AsignacionFarmacia.objects.filter(activa=True).values_list(
+            'motorista_id', 'farmacia_id'
+        ):
+            farmacias[motorista_id].add(farmacia_id)
+        motos_asignadas = defaultdict(set)
+        for motorista_id, moto_id in AsignacionMoto.objects.filter(activa=True).values_list(
+            'motorista_id', 'moto_id'
+        ):
+            motos_asignadas[motorista_id].add(moto_id)
+
+        ocupados = set()
+        ocupadas = set()
+        for motorista_id, moto_id in Movimiento.objects.filter(estado='EN_PROCESO').values_list(
+            'motorista_id', 'moto_id'
+        ):
+            ocupados.add(motorista_id)
+            ocupadas.add(moto_id)
+
+        # Un GROUP BY sobre Movimiento recorre la tabla entera; la subconsulta
+        # es una búsqueda por motorista en el índice mov_motorista_fecha_idx
+        motoristas = {}
+        for pk, nombre, estado, farmacia_id, moto_id, ultimo in Motorista.objects.annotate(
+            ultimo=Subquery(_ultimo_despacho(OuterRef('pk')))
+        ).values_list('pk', 'nombre', 'estado', 'farmacia_id', 'moto_id', 'ultimo'):
+            motoristas[pk] = self._entrada_motorista(
+                nombre, estado, farmacia_id, moto_id,
+                farmacias[pk], motos_asignadas[pk], pk in ocupados, ultimo,
+            )
+        motos = {
+            pk: {'patente': patente, 'disponible': disponible, 'ocupada': pk in ocupadas}
+            for pk, patente, disponible in Moto.objects.values_list('pk', 'patente', 'disponible')
+        }
+
+        with self._lock:
+            self.motoristas = motoristas
+            self.motos = motos
+            self.por_farmacia = defaultdict(set)
+            for pk, entrada in motoristas.items():
+                for farmacia_id in entrada['farmacias']:
+                    self.por_farmacia[farmacia_id].add(pk)
+            self._cargado_en = time.monotonic()
+
+    @staticmethod
+    def _entrada_motorista(nombre, estado, farmacia_id, moto_id, farmacias, motos, ocupado, ultimo):
+        farmacias = set(farmacias)
+        if farmacia_id:
+            farmacias.add(farmacia_id)
+        motos = set(motos)
+        if moto_id:
+            motos.add(moto_id)
+        return {
+            'nombre': nombre,
+            'activo': _activo(estado),
+            'farmacias': frozenset(farmacias),
+            'motos': frozenset(motos),
+            'ocupado': ocupado,
+            'ultimo': ultimo,
+        }
+
+    def _vigente(self):
+        if self._cargado_en is None or time.monotonic() - self._cargado_en > MAX_EDAD:
+            self.cargar()
+
+    def invalidar(self):
+        """Fuerza la recarga completa en la próxima propuesta (p. ej. tras un bulk_create)"""
+        self._cargado_en = None
+
+    # ----- refresco incremental (desde las señales) -----
+
+    def refrescar_motorista(self, pk):
+        if self._cargado_en is None or pk is None:
+            return
+        fila = Motorista.objects.filter(pk=pk).values_list('nombre', 'estado', 'farmacia_id', 'moto_id').first()
+        entrada = None
+        if fila:
+            movimientos = Movimiento.objects.filter(motorista_id=pk)
+            entrada = self._entrada_motorista(
+                *fila,
+                AsignacionFarmacia.objects.filter(motorista_id=pk, activa=True).values_list('farmacia_id', flat=True),
+                AsignacionMoto.objects.filter(motorista_id=pk, activa=True).values_list('moto_id', flat=True),
+                movimientos.filter(estado='EN_PROCESO').exists(),
+                _ultimo_despacho(pk).first(),
+            )
+        with self._lock:
+            anterior = self.motoristas.pop(pk, None)
+            if anterior:
+                for farmacia_id in anterior['farmacias']:
+                    self.por_farmacia[farmacia_id].discard(pk)
+            if entrada:
+                self.motoristas[pk] = entrada
+                for farmacia_id in entrada['farmacias']:
+                    self.por_farmacia[farmacia_id].add(pk)
+
+    def refrescar_moto(self, pk):
+        if self._cargado_en is None or pk is None:
+            return
+        fila = Moto.objects.filter(pk=pk).values_list('patente', 'disponible').first()
+        if fila is None:
+            with self._lock:
+                self.motos.pop(pk, None)
+            return
+        entrada = {
+            'patente': fila[0],
+            'disponible': fila[1],
+            'ocupada': Movimiento.objects.filter(moto_id=pk, estado='EN_PROCESO').exists(),
+        }
+        with self._lock:
+            self.motos[pk] = entrada
+
+    # ----- propuesta -----
+
+    def _moto_libre(self, moto_id):
+        moto = self.motos.get(moto_id)
+        return moto is not None and moto['disponible'] and not moto['ocupada']
+
+    def proponer(self, farmacia_id):
+        """
+        (motorista_id, moto_id) para la farmacia, o None. Prefiere al
+        motorista libre que lleva más tiempo sin despachos.
+        """
+        self._vigente()
+        mejor = None
+        with self._lock:
+            for pk in self.por_farmacia.get(farmacia_id, ()):
+                motorista = self.motoristas[pk]
+                if not motorista['activo'] or motorista['ocupado']:
+                    continue
+                motos = sorted(m for m in motorista['motos'] if self._moto_libre(m))
+                if not motos:
+                    continue
+                # Sin despachos previos va primero
+                orden = (motorista['ultimo'] is not None, motorista['ultimo'] or 0, pk)
+                if mejor is None or orden < mejor[0]:
+                    mejor = (orden, pk, motos[0])
+        return mejor and (mejor[1], mejor[2])
+
+    def describir(self, propuesta):
+        if not propuesta:
+            return {'motorista': None, 'moto': None}
+        motorista_id, moto_id = propuesta
+        with self._lock:
+            return {
+                'motorista': motorista_id,
+                'motorista_nombre': self.motoristas[motorista_id]['nombre'],
+                'moto': moto_id,
+                'moto_patente': self.motos[moto_id]['patente'],
+            }
+
+
+indice = IndiceDespacho()
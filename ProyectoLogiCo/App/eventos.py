@@ -0,0 +1,168 @@
+"""
+Eventos en vivo de Movimiento (Server-Sent Events).
+
+Las señales publican un evento por cada alta, cambio o baja de un
+Movimiento después del commit, y la vista /movimientos/eventos/ los
+entrega a los listados abiertos, que actualizan la fila sin recargar la
+página ni volver a consultar la base.
+
+La vista es asíncrona: cada conexión abierta es una corrutina esperando
+en su cola, no un hilo. Hay que servir el proyecto por ASGI
+(ProyectoLogiCo/asgi.py, p. ej. `uvicorn ProyectoLogiCo.asgi:application`)
+y activar settings.EVENTOS_EN_VIVO; sin eso la vista responde 404 y los
+listados no abren la conexión. Cada flujo se cierra a los
+EVENTOS_DURACION_MAXIMA segundos y el navegador reconecta solo.
+
+El backend se elige con settings.EVENTOS_BACKEND. BackendMemoria reparte
+los eventos dentro del proceso: con varios workers, cada uno ve solo lo
+que se publica en él. Otro backend (Redis, LISTEN/NOTIFY) solo tiene que
+implementar publicar / suscribir / desuscribir / desde.
+"""
+import asyncio
+import functools
+import itertools
+import json
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+BACKEND_POR_DEFECTO = 'App.eventos.BackendMemoria'
+TAMANO_HISTORIAL = 500
+TAMANO_COLA = 100
+LATIDO = 15
+
+# Evento que pide al cliente recargar la página: se perdió parte del flujo
+RECARGAR = {'id': None, 'evento': 'recargar', 'datos': {}}
+
+
+def _encolar(cola, evento):
+    """Corre en el loop del suscriptor. Si el cliente no da abasto, se le pide recargar"""
+    if cola.full():
+        while not cola.empty():
+            cola.get_nowait()
+        evento = RECARGAR
+    cola.put_nowait(evento)
+
+
+class BackendMemoria:
+    """Pub/sub dentro del proceso, con un historial corto para reconectar (Last-Event-ID)"""
+
+    def __init__(self, historial=TAMANO_HISTORIAL, tamano_cola=TAMANO_COLA):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._historial = deque(maxlen=historial)
+        self._suscriptores = {}
+        self._tamano_cola = tamano_cola
+
+    def publicar(self, evento, datos):
+        """Se puede llamar desde cualquier hilo (las señales corren en el hilo del request)"""
+        with self._lock:
+            evento = {'id': next(self._ids), 'evento': evento, 'datos': datos}
+            self._historial.append(evento)
+            suscriptores = list(self._suscriptores.items())
+        for cola, loop in suscriptores:
+            try:
+                loop.call_soon_threadsafe(_encolar, cola, evento)
+            except RuntimeError:
+                # El loop del suscriptor ya se cerró
+                self.desuscribir(cola)
+        return evento
+
+    def suscribir(self):
+        """Cola asyncio del loop actual que recibirá los eventos siguientes"""
+        cola = asyncio.Queue(maxsize=self._tamano_cola)
+        with self._lock:
+            self._suscriptores[cola] = asyncio.get_running_loop()
+        return cola
+
+    def desuscribir(self, cola):
+        with self._lock:
+            self._suscriptores.pop(cola, None)
+
+    def desde(self, ultimo_id):
+        """Eventos posteriores a ultimo_id, o None si ya no están en el historial"""
+        with self._lock:
+            if not self._historial:
+                return [] if ultimo_id == 0 else None
+            primero, ultimo = self._historial[0]['id'], self._historial[-1]['id']
+            if ultimo_id < primero - 1 or ultimo_id > ultimo:
+                return None
+            return [evento for evento in self._historial if evento['id'] > ultimo_id]
+
+
+@functools.cache
+def obtener_backend():
+    return import_string(getattr(settings, 'EVENTOS_BACKEND', BACKEND_POR_DEFECTO))()
+
+
+def publicar(evento, datos):
+    return obtener_backend().publicar(evento, datos)
+
+
+def datos_movimiento(movimiento, estado_anterior=None):
+    return {
+        'id': movimiento.pk,
+        'codigo': movimiento.codigo,
+        'tipo': movimiento.tipo,
+        'estado': movimiento.estado,
+        'estado_anterior': estado_anterior,
+        'version': movimiento.version,
+    }
+
+
+def formatear(evento):
+    """Un evento en formato text/event-stream"""
+    lineas = []
+    if evento['id'] is not None:
+        lineas.append(f"id: {evento['id']}")
+    lineas.append(f"event: {evento['evento']}")
+    lineas.append(f"data: {json.dumps(evento['datos'], ensure_ascii=False, separators=(',', ':'))}")
+    return '\n'.join(lineas) + '\n\n'
+
+
+async def flujo_eventos(ultimo_id=None, latido=LATIDO, duracion=None):
+    """
+    Generador asíncrono para StreamingHttpResponse. Con ultimo_id reenvía
+    lo que el cliente se perdió mientras estaba desconectado. Con duracion
+    (segundos) el flujo termina solo y el cliente reconecta.
+    """
+    backend = obtener_backend()
+    loop = asyncio.get_running_loop()
+    limite = None if duracion is None else loop.time() + duracion
+    # Se suscribe antes de leer el historial para no perder eventos entre medio
+    cola = backend.suscribir()
+    try:
+        yield "retry: 5000\n\n"
+        enviado = 0
+        if ultimo_id is not None:
+            pendientes = backend.desde(ultimo_id)
+            if pendientes is None:
+                yield formatear(RECARGAR)
+            else:
+                enviado = ultimo_id
+                for evento in pendientes:
+                    enviado = evento['id']
+                    yield formatear(evento)
+        while True:
+            espera = latido
+            if limite is not None:
+                espera = min(espera, limite - loop.time())
+                if espera <= 0:
+                    return
+            try:
+                evento = await asyncio.wait_for(cola.get(), espera)
+            except asyncio.TimeoutError:
+                if limite is not None and loop.time() >= limite:
+                    return
+                # Comentario SSE: mantiene viva la conexión en proxies
+                yield ": ping\n\n"
+                continue
+            if evento['id'] is not None:
+                if evento['id'] <= enviado:
+                    continue
+                enviado = evento['id']
+            yield formatear(evento)
+    finally:
+        backend.desuscribir(cola)
@@ -1,5 +1,34 @@
 from django import forms
+from django.urls import reverse_lazy
 from .models import Farmacia, Moto, Motorista, AsignacionMoto, AsignacionFarmacia, Movimiento
+from .territorio import comuna_valida
+
+
+class SelectAutocompletar(forms.Select):
+    """
+    Select que solo renderiza la opción elegida; las demás las busca el JS
+    de templates/autocompletar.html en /autocompletar/<modelo>/?q=
+    """
+
+    def __init__(self, modelo, attrs=None):
+        base = {'class': 'form-select autocompletar', 'data-url': reverse_lazy('autocompletar', args=[modelo])}
+        super().__init__(attrs={**base, **(attrs or {})})
+
+    def optgroups(self, name, value, attrs=None):
+        todas = self.choices
+        campo = todas.field
+        opciones = [('', campo.empty_label or '')]
+        elegidos = [v for v in value if v not in ('', None)]
+        if elegidos:
+            opciones += [
+                (campo.prepare_value(obj), campo.label_from_instance(obj))
+                for obj in campo.queryset.filter(pk__in=elegidos)
+            ]
+        self.choices = opciones
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = todas
 
 
 class FarmaciaForm(forms.ModelForm):
@@ -16,6 +45,15 @@ class FarmaciaForm(forms.ModelForm):
             'comuna': forms.Select(attrs={'class': 'form-select', 'id': 'comuna-select'}),
         }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        region = cleaned_data.get('region')
+        provincia = cleaned_data.get('provincia')
+        comuna = cleaned_data.get('comuna')
+        if region and provincia and comuna and not comuna_valida(region, provincia, comuna):
+            raise forms.ValidationError('La provincia y comuna no corresponden a la región seleccionada.')
+        return cleaned_data
+
 class MotoForm(forms.ModelForm):
     class Meta:
         model = Moto
@@ -56,8 +94,8 @@ class AsignacionMotoForm(forms.ModelForm):
         model = AsignacionMoto
         fields = ['motorista', 'moto', 'fecha_fin', 'activa']
         widgets = {
-            'motorista': forms.Select(attrs={'class': 'form-select'}),
-            'moto': forms.Select(attrs={'class': 'form-select'}),
+            'motorista': SelectAutocompletar('motorista'),
+            'moto': SelectAutocompletar('moto'),
             'fecha_fin': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'activa': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
@@ -68,8 +106,8 @@ class AsignacionFarmaciaForm(forms.ModelForm):
         model = AsignacionFarmacia
         fields = ['motorista', 'farmacia', 'fecha_fin', 'activa']
         widgets = {
-            'motorista': forms.Select(attrs={'class': 'form-select'}),
-            'farmacia': forms.Select(attrs={'class': 'form-select'}),
+            'motorista': SelectAutocompletar('motorista'),
+            'farmacia': SelectAutocompletar('farmacia'),
             'fecha_fin': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'activa': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
@@ -79,6 +117,9 @@ class AsignacionFarmaciaForm(forms.ModelForm):
 # FORMULARIO MOVIMIENTO
 # ===============================
 class MovimientoForm(forms.ModelForm):
+    # Versión leída al abrir el formulario; si otro la cambió, el guardado falla
+    version = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
     class Meta:
         model = Movimiento
         fields = [
@@ -89,15 +130,31 @@ class MovimientoForm(forms.ModelForm):
             'farmacia_origen',
             'destino',
             'motorista',
-            'moto'
+            'moto',
+            'version',
         ]
         widgets = {
-            'codigo': forms.TextInput(attrs={'class': 'form-control'}),
+            'codigo': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Vacío = se asigna automáticamente'}),
             'tipo': forms.Select(attrs={'class': 'form-select'}),
             'descripcion': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'estado': forms.Select(attrs={'class': 'form-select'}),
-            'farmacia_origen': forms.Select(attrs={'class': 'form-select'}),
+            'farmacia_origen': SelectAutocompletar('farmacia'),
             'destino': forms.TextInput(attrs={'placeholder': 'Ej: Calle 1234, Casa roja'}),
-            'motorista': forms.Select(attrs={'class': 'form-select'}),
-            'moto': forms.Select(attrs={'class': 'form-select'}),
-        }
\ No newline at end of file
+            'motorista': SelectAutocompletar('motorista'),
+            'moto': SelectAutocompletar('moto'),
+        }
+
+    def clean_version(self):
+        version = self.cleaned_data.get('version')
+        if not self.instance.pk or version is None:
+            return self.instance.version
+        return version
+
+    def clean_estado(self):
+        estado = self.cleaned_data['estado']
+        anterior = self.instance.estado
+        if self.instance.pk and estado != anterior and estado not in Movimiento.TRANSICIONES[anterior]:
+            raise forms.ValidationError(
+                f"No se puede pasar de {self.instance.get_estado_display()} a {dict(Movimiento.ESTADO_MOVIMIENTO)[estado]}."
+            )
+        return estado
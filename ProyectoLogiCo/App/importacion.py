@@ -0,0 +1,194 @@
+"""
+Importación masiva de Farmacia, Moto y Motorista desde CSV o JSON.
+
+Las filas se leen de a una (csv.DictReader / NDJSON) y se procesan en
+lotes: cada fila se valida con el ModelForm de la app y las válidas se
+escriben con un solo bulk_create por lote. Moto y Motorista hacen upsert
+sobre su clave natural (patente, rut) con update_conflicts; Farmacia no
+tiene clave natural y solo inserta.
+
+Los errores se informan por número de fila y no detienen el lote.
+bulk_create no dispara señales, así que al final se invalidan a mano el
+cache de reportes (los nombres de farmacia y motorista salen en el PDF) y
+el índice de despacho.
+"""
+import csv
+import io
+import json
+
+from django.db import DatabaseError, transaction
+
+from .cache_reportes import invalidar_todo
+from .despacho import indice
+from .forms import FarmaciaForm, MotoForm, MotoristaForm
+
+TAMANO_LOTE = 1000
+FORMATOS = ('csv', 'json', 'ndjson')
+
+
+class _SinUnicidad:
+    """El upsert resuelve los duplicados; evita un SELECT por fila y campo único"""
+
+    def validate_unique(self):
+        pass
+
+
+class _FarmaciaImportacion(_SinUnicidad, FarmaciaForm):
+    pass
+
+
+class _MotoImportacion(_SinUnicidad, MotoForm):
+    pass
+
+
+class _MotoristaImportacion(_SinUnicidad, MotoristaForm):
+    pass
+
+
+# modelo -> (formulario, clave natural o None)
+IMPORTABLES = {
+    'farmacia': (_FarmaciaImportacion, None),
+    'moto': (_MotoImportacion, 'patente'),
+    'motorista': (_MotoristaImportacion, 'rut'),
+}
+
+
+def formato_de(nombre_archivo, por_defecto='csv'):
+    extension = nombre_archivo.rsplit('.', 1)[-1].lower() if '.' in nombre_archivo else ''
+    return extension if extension in FORMATOS else por_defecto
+
+
+def leer_filas(archivo, formato):
+    """
+    Itera los registros de un archivo binario. CSV y NDJSON se leen línea a
+    línea; JSON (una lista) se carga completo.
+    """
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    if formato == 'csv':
+        yield from csv.DictReader(texto)
+    elif formato == 'ndjson':
+        for linea in texto:
+            if not linea.strip():
+                continue
+            try:
+                yield json.loads(linea)
+            except ValueError:
+                # La fila queda como texto y se informa como error
+                yield linea
+    elif formato == 'json':
+        yield from json.load(texto)
+    else:
+        raise ValueError(f"Formato no soportado: {formato}")
+
+
+def _limpiar(fila):
+    return {k.strip(): v.strip() if isinstance(v, str) else v for k, v in fila.items() if k}
+
+
+def _validar_lote(formulario, clave, filas):
+    """Devuelve ({clave o n° de fila: (n° de fila, instancia)}, errores)"""
+    validas = {}
+    errores = []
+    for numero, fila in filas:
+        if not isinstance(fila, dict):
+            errores.append({'fila': numero, 'errores': {'__all__': ['La fila no es un objeto válido.']}})
+            continue
+        form = formulario(data=_limpiar(fila))
+        if not form.is_valid():
+            errores.append({
+                'fila': numero,
+                'errores': {campo: [e['message'] for e in lista] for campo, lista in form.errors.get_json_data().items()},
+            })
+            continue
+        instancia = form.instance
+        # Una clave repetida dentro del lote rompe el ON CONFLICT; gana la última
+        validas[getattr(instancia, clave) if clave else numero] = (numero, instancia)
+    return validas, errores
+
+
+def _escribir(modelo, clave, campos, instancias):
+    opciones = {}
+    if clave:
+        opciones = {
+            'update_conflicts': True,
+            'unique_fields': [clave],
+            # El UPDATE del upsert no pasa por auto_now
+            'update_fields': [c for c in campos if c != clave] + [
+                f.name for f in modelo._meta.concrete_fields if getattr(f, 'auto_now', False)
+            ],
+        }
+    modelo.objects.bulk_create(instancias, **opciones)
+
+
+def _renombra(modelo, clave, validas):
+    """Si el upsert cambiará el nombre de algún registro existente"""
+    nuevos = {getattr(instancia, clave): instancia.nombre for _, instancia in validas.values()}
+    existentes = modelo.objects.filter(**{f'{clave}__in': list(nuevos)}).values_list(clave, 'nombre')
+    return any(nuevos[valor] != nombre for valor, nombre in existentes)
+
+
+def _escribir_lote(formulario, clave, validas):
+    """Escribe el lote completo; si la base lo rechaza, fila por fila"""
+    modelo = formulario._meta.model
+    campos = formulario._meta.fields
+    try:
+        with transaction.atomic():
+            _escribir(modelo, clave, campos, [instancia for _, instancia in validas.values()])
+        return len(validas), []
+    except DatabaseError:
+        pass
+
+    escritas = 0
+    errores = []
+    for numero, instancia in validas.values():
+        try:
+            with transaction.atomic():
+                _escribir(modelo, clave, campos, [instancia])
+            escritas += 1
+        except DatabaseError as e:
+            errores.append({'fila': numero, 'errores': {'__all__': [str(e)]}})
+    return escritas, errores
+
+
+def importar(modelo, filas, lote=TAMANO_LOTE):
+    """
+    Importa un iterable de dicts. Devuelve
+    {'procesadas': n, 'escritas': n, 'errores': [{'fila': n, 'errores': {campo: [...]}}]}
+    """
+    if modelo not in IMPORTABLES:
+        raise ValueError(f"Modelo no importable: {modelo}")
+    formulario, clave = IMPORTABLES[modelo]
+
+    resultado = {'procesadas': 0, 'escritas': 0, 'errores': []}
+    pendientes = []
+
+    renombrados = False
+
+    def procesar():
+        nonlocal renombrados
+        validas, errores = _validar_lote(formulario, clave, pendientes)
+        resultado['errores'].extend(errores)
+        if validas and clave and modelo in ('farmacia', 'motorista') and not renombrados:
+            renombrados = _renombra(formulario._meta.model, clave, validas)
+        if validas:
+            escritas, errores = _escribir_lote(formulario, clave, validas)
+            resultado['escritas'] += escritas
+            resultado['errores'].extend(errores)
+        pendientes.clear()
+
+    # Número de registro desde 1, sin contar el encabezado del CSV
+    for numero, fila in enumerate(filas, start=1):
+        resultado['procesadas'] += 1
+        pendientes.append((numero, fila))
+        if len(pendientes) >= lote:
+            procesar()
+    if pendientes:
+        procesar()
+
+    resultado['errores'].sort(key=lambda error: error['fila'])
+    # Los nombres salen en todos los PDF; altas y otros campos no tocan el cache
+    if resultado['escritas'] and renombrados:
+        invalidar_todo()
+    if resultado['escritas'] and modelo in ('moto', 'motorista'):
+        indice.invalidar()
+    return resultado
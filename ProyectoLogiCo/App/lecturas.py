@@ -0,0 +1,72 @@
+"""
+Lecturas JSON asíncronas de los catálogos y movimientos.
+
+Variante de solo lectura de /api_<modelo>/ para servir por ASGI: la vista
+es una corrutina y las consultas usan el ORM asíncrono (aiterator, acount),
+así una conexión esperando a la base no ocupa un hilo del threadpool.
+
+Mismos campos que los serializers de la API (las FK como id), ?fields=
+para proyectar columnas y paginación por keyset con ?despues=<cursor>.
+"""
+from .listados import ORDEN_MOVIMIENTO, _filtro_keyset, codificar_cursor, decodificar_cursor
+from .models import Farmacia, Moto, Motorista, Movimiento
+
+TAMANO = 50
+TAMANO_MAXIMO = 500
+
+# nombre -> (modelo, orden keyset; el último campo es único)
+LEGIBLES = {
+    'farmacias': (Farmacia, ('id',)),
+    'motos': (Moto, ('id',)),
+    'motoristas': (Motorista, ('id',)),
+    'movimientos': (Movimiento, ORDEN_MOVIMIENTO),
+}
+
+# Roles que pueden leer cada modelo, los mismos que en la API REST
+ROLES = {'movimientos': ('admin', 'recepcionista')}
+ROLES_POR_DEFECTO = ('admin',)
+
+
+def roles(modelo):
+    """Roles con acceso a /api_async/<modelo>/ (para @rol_requerido(roles_de=...))"""
+    return ROLES.get(modelo, ROLES_POR_DEFECTO)
+
+
+def _columnas(model, campos=None):
+    """{attname: nombre en la respuesta} de las columnas pedidas"""
+    columnas = {f.attname: f.name for f in model._meta.concrete_fields}
+    if campos:
+        pedidos = set(campos) | {'id'}
+        columnas = {attname: nombre for attname, nombre in columnas.items() if nombre in pedidos}
+    return columnas
+
+
+async def pagina(nombre, despues=None, tamano=TAMANO, campos=None, con_total=False):
+    """
+    {'resultados': [...], 'siguiente': cursor o None[, 'total': n]}.
+    Un cursor inválido se trata como primera página, igual que en los listados.
+    """
+    model, orden = LEGIBLES[nombre]
+    tamano = max(1, min(tamano, TAMANO_MAXIMO))
+    columnas = _columnas(model, campos)
+    claves_orden = [campo.lstrip('-') for campo in orden]
+
+    queryset = model.objects.order_by(*orden).values(*dict.fromkeys([*columnas, *claves_orden]))
+    valores = decodificar_cursor(despues, model, orden) if despues else None
+    if valores is not None:
+        queryset = queryset.filter(_filtro_keyset(orden, valores))
+
+    # Una fila extra indica si hay página siguiente
+    filas = [fila async for fila in queryset[:tamano + 1].aiterator()]
+    siguiente = None
+    if len(filas) > tamano:
+        filas = filas[:tamano]
+        siguiente = codificar_cursor([filas[-1][clave] for clave in claves_orden])
+
+    resultado = {
+        'resultados': [{nombre: fila[attname] for attname, nombre in columnas.items()} for fila in filas],
+        'siguiente': siguiente,
+    }
+    if con_total:
+        resultado['total'] = await model.objects.acount()
+    return resultado
@@ -0,0 +1,301 @@
+"""
+Listados paginados por keyset.
+
+En lugar de OFFSET se usa la última fila mostrada como cursor
+(por ejemplo fecha_registro, id), así la página N cuesta lo mismo que la
+página 1 y las filas nuevas no desplazan a las que el usuario está viendo.
+"""
+import base64
+import json
+from datetime import date, datetime
+
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import Q
+
+from .models import AsignacionFarmacia, AsignacionMoto, Farmacia, Moto, Motorista, Movimiento
+
+
+TAMANO_PAGINA = 50
+
+# Columnas que muestran movimiento_list / movimiento_list2
+CAMPOS_LISTADO_MOVIMIENTO = [
+    'codigo', 'tipo', 'estado', 'version', 'destino', 'descripcion', 'fecha_registro',
+    'farmacia_origen__nombre', 'motorista__nombre', 'moto__patente',
+]
+ORDEN_MOVIMIENTO = ('-fecha_registro', '-id')
+
+
+def movimientos_listado():
+    """Movimientos con sus relaciones en un solo JOIN y solo las columnas visibles"""
+    return (
+        Movimiento.objects
+        .select_related('farmacia_origen', 'motorista', 'moto')
+        .only(*CAMPOS_LISTADO_MOVIMIENTO)
+    )
+
+
+def _serializar(valor):
+    # isoformat completo: DjangoJSONEncoder recorta los microsegundos y el
+    # cursor dejaría de coincidir con la fila guardada
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    raise TypeError(f'No se puede serializar {type(valor).__name__}')
+
+
+def codificar_cursor(valores):
+    datos = json.dumps(valores, default=_serializar).encode()
+    return base64.urlsafe_b64encode(datos).decode()
+
+
+def decodificar_cursor(cursor, model, orden):
+    """Devuelve los valores del cursor ya convertidos, o None si no es válido"""
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(valores, list) or len(valores) != len(orden):
+            return None
+        return [
+            model._meta.get_field(campo.lstrip('-')).to_python(valor)
+            for campo, valor in zip(orden, valores)
+        ]
+    except Exception:
+        return None
+
+
+def _filtro_keyset(orden, valores, hacia_atras=False):
+    """
+    Construye (a = v1 AND b < v2) OR (a < v1) ... para el orden dado.
+    El último campo del orden debe ser único (normalmente id).
+    """
+    condicion = Q()
+    for i, campo in enumerate(orden):
+        nombre = campo.lstrip('-')
+        descendente = campo.startswith('-')
+        operador = 'lt' if descendente != hacia_atras else 'gt'
+        parcial = Q(**{f'{nombre}__{operador}': valores[i]})
+        for previo, valor in zip(orden[:i], valores[:i]):
+            parcial &= Q(**{previo.lstrip('-'): valor})
+        condicion |= parcial
+    return condicion
+
+
+def _invertir(orden):
+    return tuple(campo[1:] if campo.startswith('-') else f'-{campo}' for campo in orden)
+
+
+class PaginaKeyset:
+    def __init__(self, objetos, orden, request, hay_siguiente, hay_anterior):
+        self.objetos = objetos
+        self.orden = orden
+        self.request = request
+        self.hay_siguiente = hay_siguiente
+        self.hay_anterior = hay_anterior
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    def _cursor(self, obj):
+        return codificar_cursor([getattr(obj, campo.lstrip('-')) for campo in self.orden])
+
+    def _url(self, **params):
+        query = self.request.GET.copy()
+        for clave in ('despues', 'antes'):
+            query.pop(clave, None)
+        query.update(params)
+        return f'?{query.urlencode()}' if query else '?'
+
+    @property
+    def url_siguiente(self):
+        if self.hay_siguiente and self.objetos:
+            return self._url(despues=self._cursor(self.objetos[-1]))
+        return None
+
+    @property
+    def url_anterior(self):
+        if self.hay_anterior and self.objetos:
+            return self._url(antes=self._cursor(self.objetos[0]))
+        return None
+
+    @property
+    def url_primera(self):
+        return self._url()
+
+
+def paginar_keyset(request, queryset, orden=ORDEN_MOVIMIENTO, tamano=TAMANO_PAGINA):
+    """
+    Pagina `queryset` según `orden` usando los parámetros GET
+    `despues` (página siguiente) o `antes` (página anterior).
+    """
+    model = queryset.model
+    despues = request.GET.get('despues')
+    antes = request.GET.get('antes')
+
+    valores = None
+    hacia_atras = False
+    if despues:
+        valores = decodificar_cursor(despues, model, orden)
+    elif antes:
+        valores = decodificar_cursor(antes, model, orden)
+        hacia_atras = valores is not None
+
+    if hacia_atras:
+        qs = queryset.filter(_filtro_keyset(orden, valores, hacia_atras=True)).order_by(*_invertir(orden))
+    else:
+        qs = queryset.order_by(*orden)
+        if valores is not None:
+            qs = qs.filter(_filtro_keyset(orden, valores))
+
+    # Se pide una fila extra para saber si existe otra página
+    objetos = list(qs[:tamano + 1])
+    hay_mas = len(objetos) > tamano
+    objetos = objetos[:tamano]
+
+    if hacia_atras:
+        objetos.reverse()
+        return PaginaKeyset(objetos, orden, request, hay_siguiente=True, hay_anterior=hay_mas)
+    return PaginaKeyset(objetos, orden, request, hay_siguiente=hay_mas, hay_anterior=valores is not None)
+
+
+# =====================================================
+# FILTROS, ORDEN Y BÚSQUEDA DE LOS LISTADOS CRUD
+# =====================================================
+
+# Etiquetas con tildes para filtros y orden; el resto usa verbose_name
+ETIQUETAS = {
+    'region': 'Región', 'anio': 'Año', 'rut': 'RUT',
+    'fecha_asignacion': 'Fecha de asignación', 'fecha_ingreso': 'Fecha de ingreso',
+}
+
+
+def _etiqueta(modelo, campo):
+    return ETIQUETAS.get(campo) or str(modelo._meta.get_field(campo).verbose_name).capitalize()
+
+
+def _filtro_busqueda(campo, texto):
+    # Misma sintaxis que search_fields del admin: ^ prefijo, = exacto, @ texto completo
+    if campo.startswith('^'):
+        return Q(**{f'{campo[1:]}__istartswith': texto})
+    if campo.startswith('='):
+        return Q(**{f'{campo[1:]}__iexact': texto})
+    if campo.startswith('@'):
+        return Q(**{f'{campo[1:]}__search': texto})
+    return Q(**{f'{campo}__icontains': texto})
+
+
+class Listado:
+    """
+    Listado de un modelo con filtros por igualdad, búsqueda de texto y orden,
+    todo en la consulta y paginado por keyset. `filtros` y `busqueda` replican
+    list_filter y search_fields de App/admin.py; `ordenes` son columnas
+    propias no nulas, a las que se agrega id para que el cursor sea único.
+
+    Parámetros GET: q, orden (campo o -campo), uno por filtro, despues/antes.
+    """
+
+    def __init__(self, modelo, filtros, busqueda, ordenes, relacionados=()):
+        self.modelo = modelo
+        self.filtros = tuple(filtros)
+        self.busqueda = tuple(busqueda)
+        self.ordenes = tuple(ordenes)
+        self.relacionados = tuple(relacionados)
+
+    def _orden(self, valor):
+        if valor and valor.lstrip('-') in (o.lstrip('-') for o in self.ordenes):
+            campo = valor
+        else:
+            campo = self.ordenes[0]
+        return (campo, '-id' if campo.startswith('-') else 'id')
+
+    def _valores_filtro(self, params):
+        """{campo: valor ya convertido}; los valores inválidos se ignoran"""
+        valores = {}
+        for campo in self.filtros:
+            texto = (params.get(campo) or '').strip()
+            if not texto:
+                continue
+            try:
+                valores[campo] = self.modelo._meta.get_field(campo).to_python(texto)
+            except ValidationError:
+                continue
+        return valores
+
+    def consulta(self, params):
+        """(queryset filtrado, orden) según los parámetros GET"""
+        qs = self.modelo.objects.select_related(*self.relacionados).filter(**self._valores_filtro(params))
+        texto = (params.get('q') or '').strip()
+        if texto and self.busqueda:
+            condicion = Q()
+            for campo in self.busqueda:
+                condicion |= _filtro_busqueda(campo, texto)
+            qs = qs.filter(condicion)
+        return qs, self._orden(params.get('orden'))
+
+    def _campos_filtro(self, params):
+        campos = []
+        for campo in self.filtros:
+            field = self.modelo._meta.get_field(campo)
+            if isinstance(field, models.BooleanField):
+                tipo, opciones = 'select', [('1', 'Sí'), ('0', 'No')]
+            elif field.choices:
+                tipo, opciones = 'select', [(str(valor), texto) for valor, texto in field.choices]
+            elif isinstance(field, models.DateField):
+                tipo, opciones = 'date', []
+            elif isinstance(field, models.IntegerField):
+                tipo, opciones = 'number', []
+            else:
+                tipo, opciones = 'text', []
+            campos.append({
+                'nombre': campo,
+                'etiqueta': _etiqueta(self.modelo, campo),
+                'tipo': tipo,
+                'opciones': opciones,
+                'valor': params.get(campo, ''),
+            })
+        return campos
+
+    def contexto(self, request, tamano=TAMANO_PAGINA):
+        """Página actual y todo lo que necesita filtros_listado.html"""
+        qs, orden = self.consulta(request.GET)
+        pagina = paginar_keyset(request, qs, orden=orden, tamano=tamano)
+        opciones_orden = []
+        for campo in self.ordenes:
+            nombre = campo.lstrip('-')
+            etiqueta = _etiqueta(self.modelo, nombre)
+            opciones_orden += [(nombre, f'{etiqueta} ↑'), (f'-{nombre}', f'{etiqueta} ↓')]
+        return {
+            'pagina': pagina,
+            'listado': {
+                'q': request.GET.get('q', ''),
+                'busqueda': bool(self.busqueda),
+                'campos': self._campos_filtro(request.GET),
+                'orden': orden[0],
+                'opciones_orden': opciones_orden,
+            },
+        }
+
+
+LISTADOS = {
+    'farmacia': Listado(
+        Farmacia, filtros=('region', 'comuna'), busqueda=('nombre', 'correo'),
+        ordenes=('nombre', 'region', 'comuna'),
+    ),
+    'moto': Listado(
+        Moto, filtros=('disponible', 'anio'), busqueda=('patente', 'marca'),
+        ordenes=('patente', 'marca', '-anio'),
+    ),
+    'motorista': Listado(
+        Motorista, filtros=('estado', 'licencia'), busqueda=('nombre', 'rut', 'correo'),
+        ordenes=('nombre', 'rut', '-fecha_ingreso'),
+    ),
+    'asignacion_moto': Listado(
+        AsignacionMoto, filtros=('activa', 'fecha_asignacion'), busqueda=('motorista__nombre', 'moto__patente'),
+        ordenes=('-fecha_asignacion',), relacionados=('motorista', 'moto'),
+    ),
+    'asignacion_farmacia': Listado(
+        AsignacionFarmacia, filtros=('activa', 'fecha_asignacion'), busqueda=('motorista__nombre', 'farmacia__nombre'),
+        ordenes=('-fecha_asignacion',), relacionados=('motorista', 'farmacia'),
+    ),
+}
@@ -0,0 +1,456 @@
+"""
+Escrituras en lote de la API REST: /api_<modelo>/lote/
+
+    POST    [{...}, ...]                      altas
+    PATCH   [{"id": .., "campo": ..}, ...]    cambios parciales
+    DELETE  {"ids": [..]}                     bajas
+
+Los sistemas de los socios envían los movimientos por lotes; antes cada
+objeto era un request. Aquí cada ítem se valida con el serializer del
+ViewSet (las FK se resuelven con un solo IN y los campos únicos con una
+consulta por campo) y los válidos se escriben juntos en una transacción:
+bulk_create, bulk_update (un UPDATE ... CASE por lote) o un DELETE ... IN.
+Si la base rechaza el conjunto por una restricción, se reintenta ítem por
+ítem con savepoints para saber cuál chocó.
+
+La respuesta trae un resultado por ítem, en el orden recibido:
+{"indice", "estado" (código HTTP), "id" y "datos" | "errores"}. El código
+global es el de éxito si todos salieron bien, el común si todos fallaron
+igual y 207 si hay mezcla.
+
+bulk_create y bulk_update no disparan señales: las tablas derivadas
+(resumen, versiones del cache de reportes, índice de despacho, bitácora
+de estados y eventos en vivo) se actualizan aquí, en EFECTOS. Las bajas
+usan QuerySet.delete(), que sí las dispara.
+
+Con la cabecera Idempotency-Key la respuesta queda en
+SolicitudIdempotente, por usuario: un reintento con la misma clave y el
+mismo cuerpo la recibe tal cual (cabecera Idempotent-Replayed) sin volver
+a escribir. Las claves vencidas las borra `manage.py purgar_vencidos`.
+La clave se inserta en la misma transacción que el lote, así dos
+reintentos simultáneos se esperan en el índice único en lugar de escribir
+dos veces, y un lote que falla no deja la clave tomada.
+"""
+import copy
+import hashlib
+import json
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import ProtectedError, RestrictedError
+from django.db.models.functions import Now
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.validators import UniqueValidator
+
+from .api import RelacionPrecargada
+from .cache_reportes import incrementar_versiones, invalidar_todo
+from .codigos import asignar_lote
+from .eventos import datos_movimiento, publicar
+from .models import Farmacia, Moto, Motorista, Movimiento, SolicitudIdempotente, TransicionMovimiento
+from .resumen import ajustar_resumen, clave_de_movimiento
+from .signals import refrescar_despacho
+
+MENSAJE_UNICO = 'Ya existe otro registro con este valor.'
+MENSAJE_ID = 'Se esperaba un id entero.'
+MENSAJE_RESTRICCION = 'Choca con un registro existente (p. ej. motorista o moto con otro movimiento en proceso).'
+
+
+def _resultado_error(indice, estado, errores):
+    return {'indice': indice, 'estado': estado, 'errores': errores}
+
+
+def _responder(resultados, exito):
+    estados = {resultado['estado'] for resultado in resultados}
+    if estados <= {exito}:
+        codigo = exito
+    elif len(estados) == 1:
+        codigo = estados.pop()
+    else:
+        codigo = status.HTTP_207_MULTI_STATUS
+    return {'resultados': resultados}, codigo
+
+
+# =====================================================
+# EFECTOS (lo que harían las señales)
+# =====================================================
+
+def _efectos_movimientos(anteriores, actuales, usuario):
+    """anteriores: {pk: copia previa} (vacío en altas); actuales: instancias guardadas"""
+    deltas = Counter()
+    fechas, motoristas, motos, transiciones, eventos = [], [], [], [], []
+    for movimiento in actuales:
+        previo = anteriores.get(movimiento.pk)
+        deltas[clave_de_movimiento(movimiento)] += 1
+        fechas.append(movimiento.fecha_registro)
+        motoristas.append(movimiento.motorista_id)
+        motos.append(movimiento.moto_id)
+        if previo is None:
+            eventos.append(('creado', datos_movimiento(movimiento)))
+            continue
+        deltas[clave_de_movimiento(previo)] -= 1
+        motoristas.append(previo.motorista_id)
+        motos.append(previo.moto_id)
+        if previo.estado != movimiento.estado:
+            transiciones.append(TransicionMovimiento(
+                movimiento_id=movimiento.pk, estado_anterior=previo.estado, estado_nuevo=movimiento.estado,
+                version=movimiento.version, usuario=usuario, motivo='API lote',
+            ))
+            eventos.append(('estado', datos_movimiento(movimiento, previo.estado)))
+        else:
+            eventos.append(('actualizado', datos_movimiento(movimiento, previo.estado)))
+
+    ajustar_resumen(deltas)
+    incrementar_versiones(fechas)
+    refrescar_despacho([pk for pk in motoristas if pk], [pk for pk in motos if pk])
+    TransicionMovimiento.objects.bulk_create(transiciones)
+
+    def publicar_eventos():
+        for evento, datos in eventos:
+            publicar(evento, datos)
+    transaction.on_commit(publicar_eventos)
+
+
+def _invalidar_si_renombra(anteriores, actuales):
+    """Los nombres de farmacia y motorista salen en todos los PDF; las altas no tienen movimientos"""
+    if any(actual.pk in anteriores and anteriores[actual.pk].nombre != actual.nombre for actual in actuales):
+        invalidar_todo()
+
+
+def _efectos_farmacias(anteriores, actuales, usuario):
+    _invalidar_si_renombra(anteriores, actuales)
+
+
+def _efectos_motoristas(anteriores, actuales, usuario):
+    _invalidar_si_renombra(anteriores, actuales)
+    refrescar_despacho([motorista.pk for motorista in actuales])
+
+
+def _efectos_motos(anteriores, actuales, usuario):
+    refrescar_despacho(motos=[moto.pk for moto in actuales])
+
+
+EFECTOS = {
+    Movimiento: _efectos_movimientos,
+    Farmacia: _efectos_farmacias,
+    Motorista: _efectos_motoristas,
+    Moto: _efectos_motos,
+}
+
+
+def _preparar_altas(modelo, instancias):
+    if modelo is Movimiento:
+        asignar_lote(instancias)
+
+
+# =====================================================
+# VALIDACIÓN
+# =====================================================
+
+def _serializer_lote(vista, items, parcial=False):
+    """Un solo serializer para todo el lote, con las FK precargadas y sin UniqueValidator"""
+    serializer = vista.get_serializer()
+    serializer.partial = parcial
+    precargadas = {}
+    for nombre, campo in serializer.fields.items():
+        if campo.read_only or not isinstance(campo, RelacionPrecargada):
+            continue
+        ids = set()
+        for item in items:
+            try:
+                ids.add(int(item[nombre]))
+            except (KeyError, TypeError, ValueError):
+                pass
+        precargadas[nombre] = campo.get_queryset().in_bulk(ids) if ids else {}
+    serializer.context['precargadas'] = precargadas
+
+    unicos = []
+    for nombre, campo in serializer.fields.items():
+        validadores = [v for v in campo.validators if not isinstance(v, UniqueValidator)]
+        if len(validadores) != len(campo.validators):
+            unicos.append(campo.source)
+            campo.validators = validadores
+    return serializer, unicos
+
+
+def es_id(valor):
+    """Solo enteros: listas u objetos no sirven de clave y True sería el id 1"""
+    return isinstance(valor, int) and not isinstance(valor, bool)
+
+
+def _validar(serializer, items, instancias=None):
+    """{indice: datos validados} y {indice: errores}"""
+    validos, errores = {}, {}
+    for indice, item in enumerate(items):
+        if not isinstance(item, dict):
+            errores[indice] = {'non_field_errors': ['Se esperaba un objeto.']}
+            continue
+        if instancias is not None and not es_id(item.get('id')):
+            errores[indice] = {'id': [MENSAJE_ID]}
+            continue
+        serializer.instance = instancias.get(item['id']) if instancias is not None else None
+        try:
+            validos[indice] = serializer.run_validation(item)
+        except serializers.ValidationError as error:
+            errores[indice] = error.detail
+    serializer.instance = None
+    return validos, errores
+
+
+def _validar_unicos(modelo, campos, validos, errores, propios=None):
+    """Una consulta por campo único para todo el lote, más los duplicados dentro del lote"""
+    propios = propios or {}
+    for campo in campos:
+        valores = {}
+        for indice, datos in validos.items():
+            valor = datos.get(campo)
+            if valor not in (None, ''):
+                valores.setdefault(valor, []).append(indice)
+        if not valores:
+            continue
+        existentes = dict(modelo.objects.filter(**{f'{campo}__in': list(valores)}).values_list(campo, 'pk'))
+        for valor, indices in valores.items():
+            for posicion, indice in enumerate(indices):
+                ocupado = valor in existentes and existentes[valor] != propios.get(indice)
+                if ocupado or posicion > 0:
+                    errores.setdefault(indice, {})[campo] = [MENSAJE_UNICO]
+    for indice in errores:
+        validos.pop(indice, None)
+
+
+# =====================================================
+# ESCRITURA
+# =====================================================
+
+def _escribir(operacion, elementos):
+    """
+    Aplica operacion(lista) a todos; si la base rechaza el conjunto, a
+    cada uno en su savepoint. Devuelve las posiciones que fallaron.
+    """
+    try:
+        with transaction.atomic():
+            operacion(elementos)
+        return set()
+    except (IntegrityError, ProtectedError, RestrictedError):
+        pass
+    fallidas = set()
+    for posicion, elemento in enumerate(elementos):
+        try:
+            with transaction.atomic():
+                operacion([elemento])
+        except (IntegrityError, ProtectedError, RestrictedError):
+            fallidas.add(posicion)
+    return fallidas
+
+
+def crear_lote(vista, items):
+    modelo = vista.get_queryset().model
+    serializer, unicos = _serializer_lote(vista, items)
+    validos, errores = _validar(serializer, items)
+    _validar_unicos(modelo, unicos, validos, errores)
+
+    indices = list(validos)
+    instancias = [modelo(**validos[indice]) for indice in indices]
+    _preparar_altas(modelo, instancias)
+    fallidas = {indices[posicion] for posicion in _escribir(modelo.objects.bulk_create, instancias)}
+    instancias = dict(zip(indices, instancias))
+    creadas = [instancia for indice, instancia in instancias.items() if indice not in fallidas]
+    if creadas:
+        EFECTOS[modelo]({}, creadas, vista.request.user.username)
+
+    resultados = []
+    for indice in range(len(items)):
+        if indice in errores:
+            resultados.append(_resultado_error(indice, status.HTTP_400_BAD_REQUEST, errores[indice]))
+        elif indice in fallidas:
+            resultados.append(_resultado_error(indice, status.HTTP_409_CONFLICT, {'non_field_errors': [MENSAJE_RESTRICCION]}))
+        else:
+            instancia = instancias[indice]
+            datos = serializer.to_representation(instancia)
+            resultados.append({'indice': indice, 'estado': status.HTTP_201_CREATED, 'id': instancia.pk, 'datos': datos})
+    return _responder(resultados, status.HTTP_201_CREATED)
+
+
+def actualizar_lote(vista, items):
+    modelo = vista.get_queryset().model
+    ids = [item.get('id') for item in items if isinstance(item, dict)]
+    # Bloqueadas hasta el commit: la versión leída aquí es la que se compara
+    instancias = modelo.objects.select_for_update().in_bulk([pk for pk in ids if es_id(pk)])
+    serializer, unicos = _serializer_lote(vista, items, parcial=True)
+    validos, errores = _validar(serializer, items, instancias)
+
+    vistos = set()
+    for indice, item in enumerate(items):
+        pk = item.get('id') if isinstance(item, dict) else None
+        if indice in errores:
+            continue
+        if pk not in instancias:
+            errores[indice] = {'id': ['No existe.']}
+        elif pk in vistos:
+            errores[indice] = {'id': ['Repetido en el lote.']}
+        vistos.add(pk)
+    for indice in errores:
+        validos.pop(indice, None)
+    _validar_unicos(modelo, unicos, validos, errores, {i: items[i]['id'] for i in validos})
+
+    versionado = any(campo.name == 'version' for campo in modelo._meta.concrete_fields)
+    conflictos = set()
+    campos = set()
+    anteriores, cambiadas = {}, {}
+    for indice, datos in validos.items():
+        instancia = instancias[items[indice]['id']]
+        if versionado and datos.get('version', instancia.version) != instancia.version:
+            conflictos.add(indice)
+            continue
+        anteriores[instancia.pk] = copy.copy(instancia)
+        for campo, valor in datos.items():
+            setattr(instancia, campo, valor)
+            campos.add(campo)
+        if versionado:
+            instancia.version = anteriores[instancia.pk].version + 1
+        cambiadas[indice] = instancia
+
+    # bulk_update no llama a pre_save: auto_now y la versión se ponen a mano.
+    # auto_now con Now() de la base, para el feed de cambios (App/sincronizacion.py)
+    auto_now = [campo for campo in modelo._meta.concrete_fields if getattr(campo, 'auto_now', False)]
+    for campo in auto_now:
+        campos.add(campo.name)
+        for instancia in cambiadas.values():
+            setattr(instancia, campo.attname, Now())
+    if versionado:
+        campos.add('version')
+
+    fallidas = set()
+    if cambiadas and campos:
+        indices = list(cambiadas)
+        posiciones = _escribir(lambda lote: modelo.objects.bulk_update(lote, sorted(campos)), list(cambiadas.values()))
+        fallidas = {indices[posicion] for posicion in posiciones}
+        for indice in fallidas:
+            anteriores.pop(cambiadas.pop(indice).pk)
+        actualizadas = list(cambiadas.values())
+        if actualizadas and auto_now:
+            # La respuesta lleva las fechas que puso la base
+            fechas = modelo.objects.only(*[campo.attname for campo in auto_now]).in_bulk([i.pk for i in actualizadas])
+            for instancia in actualizadas:
+                for campo in auto_now:
+                    setattr(instancia, campo.attname, getattr(fechas[instancia.pk], campo.attname))
+        if actualizadas:
+            EFECTOS[modelo](anteriores, actualizadas, vista.request.user.username)
+
+    resultados = []
+    for indice in range(len(items)):
+        if indice in errores:
+            resultados.append(_resultado_error(indice, status.HTTP_400_BAD_REQUEST, errores[indice]))
+        elif indice in conflictos:
+            resultados.append(_resultado_error(indice, status.HTTP_409_CONFLICT, {'version': ['Otro usuario modificó el registro.']}))
+        elif indice in fallidas:
+            resultados.append(_resultado_error(indice, status.HTTP_409_CONFLICT, {'non_field_errors': [MENSAJE_RESTRICCION]}))
+        else:
+            instancia = cambiadas[indice]
+            datos = serializer.to_representation(instancia)
+            resultados.append({'indice': indice, 'estado': status.HTTP_200_OK, 'id': instancia.pk, 'datos': datos})
+    return _responder(resultados, status.HTTP_200_OK)
+
+
+def eliminar_lote(vista, ids):
+    modelo = vista.get_queryset().model
+    existentes = sorted(set(modelo.objects.filter(pk__in=[pk for pk in ids if es_id(pk)]).values_list('pk', flat=True)))
+    # QuerySet.delete() dispara las señales de baja y respeta on_delete
+    posiciones = _escribir(lambda lote: modelo.objects.filter(pk__in=lote).delete(), existentes)
+    fallidas = {existentes[posicion] for posicion in posiciones}
+
+    resultados = []
+    for indice, pk in enumerate(ids):
+        if not es_id(pk):
+            resultados.append(_resultado_error(indice, status.HTTP_400_BAD_REQUEST, {'id': [MENSAJE_ID]}))
+        elif pk not in existentes:
+            resultados.append(_resultado_error(indice, status.HTTP_404_NOT_FOUND, {'id': ['No existe.']}))
+        elif pk in fallidas:
+            resultados.append(_resultado_error(indice, status.HTTP_409_CONFLICT, {'id': ['Otros registros dependen de este.']}))
+        else:
+            resultados.append({'indice': indice, 'estado': status.HTTP_200_OK, 'id': pk})
+    return _responder(resultados, status.HTTP_200_OK)
+
+
+# =====================================================
+# IDEMPOTENCIA
+# =====================================================
+
+def huella(datos):
+    contenido = json.dumps(datos, sort_keys=True, separators=(',', ':'), cls=DjangoJSONEncoder)
+    return hashlib.sha256(contenido.encode()).hexdigest()
+
+
+def vencimiento_solicitudes():
+    return timezone.now() - timedelta(hours=settings.IDEMPOTENCIA_HORAS)
+
+
+def purgar_solicitudes():
+    """Borra las respuestas guardadas más viejas que IDEMPOTENCIA_HORAS (comando purgar_vencidos)"""
+    borradas, _ = SolicitudIdempotente.objects.filter(fecha_creacion__lt=vencimiento_solicitudes()).delete()
+    return borradas
+
+
+def ejecutar_idempotente(request, operacion):
+    """Corre operacion() -> (cuerpo, estado) en una transacción, una sola vez por usuario e Idempotency-Key"""
+    clave = request.headers.get('Idempotency-Key', '').strip()
+    if not clave:
+        with transaction.atomic():
+            cuerpo, estado = operacion()
+        return Response(cuerpo, status=estado)
+    if len(clave) > SolicitudIdempotente._meta.get_field('clave').max_length:
+        return Response({'detail': 'Idempotency-Key demasiado larga.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    firma = huella(request.data)
+    filtro = {'usuario': request.user, 'clave': clave, 'metodo': request.method, 'ruta': request.path}
+    with transaction.atomic():
+        # La misma clave vencida que el comando aún no purgó vale como nueva
+        SolicitudIdempotente.objects.filter(fecha_creacion__lt=vencimiento_solicitudes(), **filtro).delete()
+        try:
+            with transaction.atomic():
+                solicitud = SolicitudIdempotente.objects.create(huella=firma, **filtro)
+        except IntegrityError:
+            previa = SolicitudIdempotente.objects.get(**filtro)
+            if previa.huella != firma:
+                return Response(
+                    {'detail': 'Esta Idempotency-Key ya se usó con otro contenido.'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            respuesta = Response(previa.respuesta, status=previa.estado_http)
+            respuesta['Idempotent-Replayed'] = 'true'
+            return respuesta
+
+        cuerpo, estado = operacion()
+        # Ida y vuelta por JSON: el reintento recibe exactamente lo mismo
+        solicitud.respuesta = json.loads(json.dumps(cuerpo, cls=DjangoJSONEncoder))
+        solicitud.estado_http = estado
+        solicitud.save(update_fields=['respuesta', 'estado_http'])
+    return Response(cuerpo, status=estado)
+
+
+# =====================================================
+# MIXIN PARA LOS VIEWSETS
+# =====================================================
+
+class EscrituraLoteMixin:
+    """Agrega /lote/ (POST, PATCH y DELETE) a un ModelViewSet"""
+
+    @action(detail=False, methods=['post', 'patch', 'delete'])
+    def lote(self, request):
+        datos = request.data
+        if request.method == 'DELETE':
+            datos = datos.get('ids') if isinstance(datos, dict) else datos
+        if not isinstance(datos, list) or not datos:
+            return Response({'detail': 'Se esperaba una lista no vacía.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(datos) > settings.API_LOTE_MAXIMO:
+            return Response(
+                {'detail': f'Máximo {settings.API_LOTE_MAXIMO} ítems por lote.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        operacion = {'POST': crear_lote, 'PATCH': actualizar_lote, 'DELETE': eliminar_lote}[request.method]
+        return ejecutar_idempotente(request, lambda: operacion(self, datos))
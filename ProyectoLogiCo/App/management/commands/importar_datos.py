@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from App.importacion import FORMATOS, IMPORTABLES, TAMANO_LOTE, formato_de, importar, leer_filas
+
+
+class Command(BaseCommand):
+    help = "Importa farmacias, motos o motoristas desde un archivo CSV, JSON o NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('modelo', choices=sorted(IMPORTABLES))
+        parser.add_argument('archivo')
+        parser.add_argument('--formato', choices=FORMATOS, help='Por defecto según la extensión')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Filas por INSERT')
+        parser.add_argument('--max-errores', type=int, default=20, help='Errores a mostrar')
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or formato_de(options['archivo'])
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                resultado = importar(options['modelo'], leer_filas(archivo, formato), lote=options['lote'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f"❌ {e}")
+
+        for error in resultado['errores'][:options['max_errores']]:
+            detalle = '; '.join(f"{campo}: {' '.join(msgs)}" for campo, msgs in error['errores'].items())
+            self.stderr.write(f"Fila {error['fila']}: {detalle}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {resultado['escritas']} de {resultado['procesadas']} filas importadas, "
+            f"{len(resultado['errores'])} con errores"
+        ))
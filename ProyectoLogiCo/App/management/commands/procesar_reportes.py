@@ -0,0 +1,56 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from App.trabajos import ejecutar_trabajo, reencolar_colgados, renovar_latidos, tomar_trabajo
+
+
+class Command(BaseCommand):
+    help = "Worker que genera en segundo plano los reportes PDF encolados"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=2, help='Tamaño del pool de procesos')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos entre consultas a la cola')
+        parser.add_argument('--una-vez', action='store_true', help='Procesa la cola actual y termina')
+
+    def handle(self, *args, **options):
+        procesos = options['procesos']
+        intervalo = options['intervalo']
+
+        # 'spawn' para que los hijos no hereden la conexión abierta del padre
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto, initializer=django.setup) as pool:
+            en_curso = {}
+            while True:
+                close_old_connections()
+                # Latido de lo propio y rescate de lo de workers caídos (propios o de otra máquina)
+                renovar_latidos(en_curso.values())
+                reencolados = reencolar_colgados()
+                if reencolados:
+                    self.stdout.write(f"↩️ {reencolados} trabajos de un worker caído vuelven a la cola")
+                while len(en_curso) < procesos:
+                    trabajo = tomar_trabajo()
+                    if trabajo is None:
+                        break
+                    self.stdout.write(f"▶️ Trabajo {trabajo.pk} ({trabajo.reporte.tipo})")
+                    en_curso[pool.submit(ejecutar_trabajo, trabajo.pk)] = trabajo.pk
+
+                if not en_curso:
+                    if options['una_vez']:
+                        break
+                    time.sleep(intervalo)
+                    continue
+
+                terminados, _ = wait(en_curso, timeout=intervalo, return_when=FIRST_COMPLETED)
+                for futuro in terminados:
+                    trabajo_id = en_curso.pop(futuro)
+                    try:
+                        estado = futuro.result()
+                    except Exception as e:
+                        self.stderr.write(f"❌ Trabajo {trabajo_id}: {e}")
+                    else:
+                        self.stdout.write(f"✅ Trabajo {trabajo_id}: {estado}")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from App.asignaciones import cerrar_asignaciones_vencidas
+from App.lotes import purgar_solicitudes
+from App.sincronizacion import purgar_eliminados
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra las respuestas idempotentes y las lápidas del feed de cambios vencidas, y cierra "
+        "las asignaciones con fecha de fin cumplida (programar cada hora con cron)"
+    )
+
+    def handle(self, *args, **options):
+        solicitudes = purgar_solicitudes()
+        lapidas = purgar_eliminados()
+        asignaciones = cerrar_asignaciones_vencidas()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {solicitudes} solicitudes idempotentes y {lapidas} lápidas vencidas borradas, "
+            f"{asignaciones} asignaciones cerradas"
+        ))
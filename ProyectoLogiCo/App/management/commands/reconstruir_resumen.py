@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from App.resumen import reconstruir_resumen
+
+
+class Command(BaseCommand):
+    help = "Recalcula la tabla resumen de movimientos (día × farmacia × tipo × estado)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por INSERT')
+
+    def handle(self, *args, **options):
+        creadas = reconstruir_resumen(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"✅ Resumen reconstruido: {creadas} filas"))
@@ -0,0 +1,50 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from App.models import AsignacionFarmacia, AsignacionMoto, Movimiento
+from App.sembrado import HISTORIAL, LOTE, sembrar
+
+
+class Command(BaseCommand):
+    help = "Genera datos sintéticos (farmacias, motos, motoristas, asignaciones y movimientos) a partir de una semilla"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movimientos', type=int, default=100_000)
+        parser.add_argument('--farmacias', type=int, default=64, help='Se reparten entre todas las regiones')
+        parser.add_argument('--motoristas', type=int, default=200)
+        parser.add_argument('--motos', type=int, help='Por defecto un 10%% más que motoristas')
+        parser.add_argument('--dias', type=int, default=365, help='Días de historia que terminan en --hasta')
+        parser.add_argument('--hasta', type=date.fromisoformat, help='Último día (AAAA-MM-DD), por defecto hoy')
+        parser.add_argument('--historial', type=int, default=HISTORIAL, help='Asignaciones cerradas por motorista')
+        parser.add_argument('--semilla', type=int, default=0)
+        parser.add_argument('--lote', type=int, default=LOTE, help='Filas por INSERT')
+        parser.add_argument('--procesos', type=int, default=1, help='Procesos para los movimientos (no aplica a SQLite)')
+
+    def handle(self, *args, **options):
+        if options['dias'] < 1 or options['motoristas'] < 1 or options['farmacias'] < 1:
+            raise CommandError("❌ --dias, --motoristas y --farmacias deben ser mayores que cero")
+        semilla = options['semilla']
+        if Movimiento.objects.filter(codigo__startswith=f"S{semilla}-").exists():
+            raise CommandError(f"❌ Ya hay movimientos sembrados con la semilla {semilla}; use otra --semilla")
+
+        total = options['movimientos']
+        inicio = time.perf_counter()
+
+        def avance(creados):
+            self.stdout.write(f"⏳ {creados}/{total} movimientos ({time.perf_counter() - inicio:.0f} s)")
+
+        asignaciones = AsignacionFarmacia.objects.count() + AsignacionMoto.objects.count()
+        resultado = sembrar(
+            movimientos=total, farmacias=options['farmacias'], motoristas=options['motoristas'],
+            motos=options['motos'], dias=options['dias'], semilla=semilla, hasta=options['hasta'],
+            historial=options['historial'], lote=options['lote'], procesos=options['procesos'], avance=avance,
+        )
+        asignaciones = AsignacionFarmacia.objects.count() + AsignacionMoto.objects.count() - asignaciones
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {resultado['farmacias']} farmacias, {resultado['motos']} motos, "
+            f"{resultado['motoristas']} motoristas, {asignaciones} asignaciones y "
+            f"{resultado['movimientos']} movimientos en {time.perf_counter() - inicio:.1f} s"
+        ))
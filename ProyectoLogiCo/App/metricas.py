@@ -0,0 +1,282 @@
+"""
+Métricas por request: consultas SQL, tiempo en SQL, tiempo de render y
+tamaño de la respuesta, agrupadas por nombre de URL.
+
+- Cada conexión a la base recibe un execute_wrapper que suma al request en
+  curso (un ContextVar, así sirve igual para vistas síncronas y async).
+  Fuera de un request el wrapper solo consulta el ContextVar.
+- Las consultas sobre METRICAS_SQL_LENTA_MS se registran en el logger
+  'App.metricas' con la URL y la vista que las ejecutó.
+- /metrics entrega los agregados en formato de texto de Prometheus:
+  cuantiles sobre las últimas MUESTRAS respuestas de cada URL, más _sum y
+  _count acumulados. Cada proceso expone solo lo que atendió.
+
+"render" es el tiempo en plantillas: settings.TEMPLATES usa el backend
+PlantillasMedidas, que cronometra cada render() / render_to_string() de
+la vista (los {% include %} quedan dentro). En respuestas en streaming
+sin Content-Length (PDF, CSV, NDJSON, eventos) el contenido se envuelve
+para contar los bytes entregados, y la muestra se registra al cerrar la
+respuesta: la duración llega hasta el último byte.
+"""
+import logging
+import threading
+from collections import deque
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+MUESTRAS = 1024
+CUANTILES = (0.5, 0.9, 0.99)
+SIN_RUTA = '<sin_ruta>'
+
+# (nombre, ayuda) en el orden de cada muestra
+SERIES = (
+    ('logico_request_duracion_segundos', 'Duración total de la respuesta'),
+    ('logico_request_sql_segundos', 'Tiempo en consultas SQL'),
+    ('logico_request_render_segundos', 'Tiempo de render de plantillas'),
+    ('logico_request_consultas', 'Consultas SQL por request'),
+    ('logico_request_bytes', 'Tamaño de la respuesta'),
+)
+
+_actual = ContextVar('metricas_request', default=None)
+
+
+class _Medicion:
+    __slots__ = ('request', 'consultas', 'sql', 'render', 'renderizando', 'umbral')
+
+    def __init__(self, request):
+        self.request = request
+        self.consultas = 0
+        self.sql = 0.0
+        self.render = 0.0
+        self.renderizando = False
+        self.umbral = getattr(settings, 'METRICAS_SQL_LENTA_MS', 200) / 1000
+
+
+def _url(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else SIN_RUTA
+
+
+# =====================================================
+# REGISTRO DE CONSULTAS
+# =====================================================
+
+def _registrar_consulta(execute, sql, params, many, context):
+    medicion = _actual.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duracion = perf_counter() - inicio
+        medicion.consultas += 1
+        medicion.sql += duracion
+        if duracion >= medicion.umbral:
+            match = getattr(medicion.request, 'resolver_match', None)
+            logger.warning(
+                "SQL lenta %.1f ms en %s (%s): %s",
+                duracion * 1000, _url(medicion.request), match._func_path if match else '-', sql[:500],
+            )
+
+
+def _instalar(connection, **kwargs):
+    # El wrapper vive en el DatabaseWrapper, que sobrevive a las reconexiones
+    if _registrar_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_registrar_consulta)
+
+
+def instalar():
+    connection_created.connect(_instalar, dispatch_uid='App.metricas')
+    for connection in connections.all(initialized_only=True):
+        _instalar(connection)
+
+
+# =====================================================
+# TIEMPO DE PLANTILLAS
+# =====================================================
+
+class _PlantillaMedida(Template):
+
+    def render(self, context=None, request=None):
+        medicion = _actual.get()
+        # Un render_to_string dentro de otro ya se está midiendo
+        if medicion is None or medicion.renderizando:
+            return super().render(context, request)
+        medicion.renderizando = True
+        inicio = perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            medicion.render += perf_counter() - inicio
+            medicion.renderizando = False
+
+
+class PlantillasMedidas(DjangoTemplates):
+    """DjangoTemplates que suma el tiempo de render al request en curso"""
+
+    def from_string(self, template_code):
+        return _PlantillaMedida(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return _PlantillaMedida(super().get_template(template_name).template, self)
+
+
+# =====================================================
+# AGREGADOS
+# =====================================================
+
+class Registro:
+
+    def __init__(self, muestras=MUESTRAS):
+        self._lock = threading.Lock()
+        self._muestras = muestras
+        self._por_url = {}
+
+    def agregar(self, url, muestra):
+        with self._lock:
+            entrada = self._por_url.get(url)
+            if entrada is None:
+                entrada = self._por_url[url] = {
+                    'recientes': deque(maxlen=self._muestras),
+                    'sumas': [0.0] * len(SERIES),
+                    'total': 0,
+                }
+            entrada['recientes'].append(muestra)
+            entrada['total'] += 1
+            sumas = entrada['sumas']
+            for i, valor in enumerate(muestra):
+                sumas[i] += valor
+
+    def limpiar(self):
+        with self._lock:
+            self._por_url.clear()
+
+    def prometheus(self):
+        with self._lock:
+            copia = {
+                url: (list(e['recientes']), list(e['sumas']), e['total'])
+                for url, e in self._por_url.items()
+            }
+        lineas = []
+        for i, (nombre, ayuda) in enumerate(SERIES):
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} summary")
+            for url, (recientes, sumas, total) in sorted(copia.items()):
+                etiqueta = url.replace('\\', '\\\\').replace('"', '\\"')
+                valores = sorted(muestra[i] for muestra in recientes)
+                for q in CUANTILES:
+                    valor = valores[min(len(valores) - 1, int(q * len(valores)))]
+                    lineas.append(f'{nombre}{{url="{etiqueta}",quantile="{q}"}} {valor:.6g}')
+                lineas.append(f'{nombre}_sum{{url="{etiqueta}"}} {sumas[i]:.6g}')
+                lineas.append(f'{nombre}_count{{url="{etiqueta}"}} {total}')
+        return '\n'.join(lineas) + '\n'
+
+
+registro = Registro()
+
+
+# =====================================================
+# MIDDLEWARE
+# =====================================================
+
+class _Conteo:
+    """Bytes entregados de un streaming_content; registra la muestra una sola vez al cerrar"""
+
+    def __init__(self, contenido, al_cerrar):
+        self.contenido = contenido
+        self.bytes = 0
+        self._al_cerrar = al_cerrar
+
+    def close(self):
+        if self._al_cerrar:
+            al_cerrar, self._al_cerrar = self._al_cerrar, None
+            al_cerrar(self.bytes)
+
+
+class _ConteoSincrono(_Conteo):
+
+    def __iter__(self):
+        try:
+            for parte in self.contenido:
+                self.bytes += len(parte)
+                yield parte
+        finally:
+            self.close()
+
+
+class _ConteoAsincrono(_Conteo):
+
+    async def __aiter__(self):
+        try:
+            async for parte in self.contenido:
+                self.bytes += len(parte)
+                yield parte
+        finally:
+            self.close()
+
+
+def _registrar(medicion, inicio, tamano):
+    registro.agregar(_url(medicion.request), (
+        perf_counter() - inicio,
+        medicion.sql,
+        medicion.render,
+        medicion.consultas,
+        tamano,
+    ))
+
+
+def _cerrar(medicion, inicio, response):
+    if not response.streaming:
+        _registrar(medicion, inicio, len(response.content))
+    elif response.has_header('Content-Length'):
+        # FileResponse: se conserva el archivo para wsgi.file_wrapper
+        _registrar(medicion, inicio, int(response['Content-Length']))
+    else:
+        # close() de la respuesta llega también si el cliente corta antes del final
+        clase = _ConteoAsincrono if response.is_async else _ConteoSincrono
+        response.streaming_content = clase(
+            response.streaming_content, lambda tamano: _registrar(medicion, inicio, tamano),
+        )
+
+
+@sync_and_async_middleware
+def metricas_middleware(get_response):
+    """Va primero en MIDDLEWARE para contar también sesión y autenticación"""
+    if not getattr(settings, 'METRICAS_ACTIVAS', True):
+        raise MiddlewareNotUsed
+    instalar()
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            medicion = _Medicion(request)
+            token = _actual.set(medicion)
+            inicio = perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                _actual.reset(token)
+            _cerrar(medicion, inicio, response)
+            return response
+    else:
+        def middleware(request):
+            medicion = _Medicion(request)
+            token = _actual.set(medicion)
+            inicio = perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                _actual.reset(token)
+            _cerrar(medicion, inicio, response)
+            return response
+    return middleware
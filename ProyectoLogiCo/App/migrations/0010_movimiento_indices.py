@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0009_student'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['fecha_registro'], name='mov_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['estado', 'fecha_registro'], name='mov_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['motorista', 'fecha_registro'], name='mov_motorista_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['farmacia_origen', 'fecha_registro'], name='mov_farmacia_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def poblar_resumen(apps, schema_editor):
+    Movimiento = apps.get_model('App', 'Movimiento')
+    ResumenMovimientoDiario = apps.get_model('App', 'ResumenMovimientoDiario')
+    agregados = (
+        Movimiento.objects
+        .order_by()
+        .annotate(fecha=TruncDate('fecha_registro'))
+        .values('fecha', 'farmacia_origen_id', 'tipo', 'estado')
+        .annotate(total=Count('id'))
+    )
+    ResumenMovimientoDiario.objects.bulk_create(
+        [ResumenMovimientoDiario(**fila) for fila in agregados], batch_size=5000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0010_movimiento_indices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenMovimientoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo', models.CharField(choices=[('DIRECTO', 'Movimiento Directo'), ('RECETA', 'Movimiento con Receta'), ('TRASLADO', 'Movimiento con Traslado'), ('REENVIO', 'Movimiento con Reenvío')], max_length=20)),
+                ('estado', models.CharField(choices=[('EN_PROCESO', 'En proceso'), ('COMPLETADO', 'Completado'), ('ANULADO', 'Anulado')], max_length=20)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('farmacia_origen', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes', to='App.farmacia')),
+            ],
+            options={
+                'db_table': 'resumen_movimiento_diario',
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'farmacia_origen', 'tipo', 'estado'), name='resumen_clave_unica'), models.UniqueConstraint(condition=models.Q(('farmacia_origen__isnull', True)), fields=('fecha', 'tipo', 'estado'), name='resumen_clave_unica_sin_farmacia')],
+            },
+        ),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0011_resumenmovimientodiario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoReporte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.CharField(blank=True, max_length=10)),
+                ('mes', models.CharField(blank=True, max_length=2)),
+                ('anio', models.CharField(blank=True, max_length=4)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_CURSO', 'En curso'), ('LISTO', 'Listo'), ('ERROR', 'Error')], default='PENDIENTE', max_length=10)),
+                ('archivo', models.CharField(blank=True, max_length=255)),
+                ('error', models.TextField(blank=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('reporte', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='trabajo', to='App.reportemovimiento')),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'trabajo_reporte',
+                'indexes': [models.Index(fields=['estado', 'fecha_creacion'], name='trabajo_estado_idx')],
+            },
+        ),
+    ]
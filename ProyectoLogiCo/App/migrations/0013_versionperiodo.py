@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0012_trabajoreporte'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionPeriodo',
+            fields=[
+                ('clave', models.CharField(max_length=12, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'version_periodo',
+            },
+        ),
+    ]
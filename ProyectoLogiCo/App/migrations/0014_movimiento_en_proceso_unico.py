@@ -0,0 +1,67 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:26
+
+from django.db import migrations, models
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+
+NOTA = "[0014] Anulado al migrar: otro movimiento EN_PROCESO del mismo {campo} es más reciente."
+
+
+def anular_duplicados(apps, schema_editor):
+    """
+    Las restricciones fallarían con datos previos. Por motorista y por moto
+    se conserva el EN_PROCESO más reciente y los demás pasan a ANULADO con
+    una nota en la descripción, para revisarlos después del despliegue
+    (ver las notas de despliegue del README).
+    """
+    Movimiento = apps.get_model('App', 'Movimiento')
+    anulados = 0
+    for campo in ('motorista', 'moto'):
+        en_proceso = Movimiento.objects.filter(estado='EN_PROCESO', **{f'{campo}__isnull': False}).order_by()
+        repetidos = en_proceso.values(campo).annotate(n=Count('id')).filter(n__gt=1).values_list(campo, flat=True)
+        for valor in list(repetidos):
+            sobrantes = en_proceso.filter(**{campo: valor}).order_by('-fecha_registro', '-id')[1:]
+            for movimiento in sobrantes:
+                nota = NOTA.format(campo=campo)
+                movimiento.descripcion = f"{movimiento.descripcion}\n{nota}" if movimiento.descripcion else nota
+                movimiento.estado = 'ANULADO'
+                movimiento.save(update_fields=['estado', 'descripcion'])
+                anulados += 1
+    if not anulados:
+        return
+
+    # Los modelos históricos no disparan señales: resumen y cache de reportes a mano
+    ResumenMovimientoDiario = apps.get_model('App', 'ResumenMovimientoDiario')
+    agregados = (
+        Movimiento.objects
+        .order_by()
+        .annotate(fecha=TruncDate('fecha_registro'))
+        .values('fecha', 'farmacia_origen_id', 'tipo', 'estado')
+        .annotate(total=Count('id'))
+    )
+    ResumenMovimientoDiario.objects.all().delete()
+    ResumenMovimientoDiario.objects.bulk_create(
+        [ResumenMovimientoDiario(**fila) for fila in agregados], batch_size=5000
+    )
+    VersionPeriodo = apps.get_model('App', 'VersionPeriodo')
+    if not VersionPeriodo.objects.filter(clave='G').update(version=F('version') + 1):
+        VersionPeriodo.objects.create(clave='G', version=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0013_versionperiodo'),
+    ]
+
+    operations = [
+        migrations.RunPython(anular_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='movimiento',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 'EN_PROCESO')), fields=('motorista',), name='mov_motorista_en_proceso_uniq', violation_error_message='El motorista ya tiene un movimiento en proceso.'),
+        ),
+        migrations.AddConstraint(
+            model_name='movimiento',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 'EN_PROCESO')), fields=('moto',), name='mov_moto_en_proceso_uniq', violation_error_message='La moto ya tiene un movimiento en proceso.'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# (índice, tabla, columna). UPPER(col::text) es la expresión que genera
+# istartswith en PostgreSQL; text_pattern_ops permite LIKE 'prefijo%'.
+INDICES = [
+    ('motorista_nombre_prefijo_idx', 'motorista', 'nombre'),
+    ('motorista_rut_prefijo_idx', 'motorista', 'rut'),
+    ('moto_patente_prefijo_idx', 'moto', 'patente'),
+    ('farmacia_nombre_prefijo_idx', 'farmacia', 'nombre'),
+]
+
+
+def crear_indices(apps, schema_editor):
+    # Solo PostgreSQL: en SQLite (desarrollo) LIKE no distingue mayúsculas
+    # y no usaría estos índices
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nombre, tabla, columna in INDICES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{nombre}" ON "{tabla}" '
+            f'(UPPER("{columna}"::text) text_pattern_ops)'
+        )
+
+
+def borrar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nombre, _, _ in INDICES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{nombre}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0014_movimiento_en_proceso_unico'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, borrar_indices),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:30
+
+from django.db import migrations, models
+from django.db.models import F
+from django.utils import timezone
+
+
+def _normalizar(modelo, claves):
+    """
+    Deja los datos previos compatibles con las restricciones: por cada clave
+    (moto, motorista) queda activa solo la asignación activa más reciente,
+    las demás se cierran cuando empieza esa, y toda asignación inactiva
+    recibe fecha_fin.
+    """
+    hoy = timezone.localdate()
+    modelo.objects.filter(fecha_fin__lt=F('fecha_asignacion')).update(fecha_fin=F('fecha_asignacion'))
+    for clave in claves:
+        activas = modelo.objects.filter(activa=True).order_by(clave, '-fecha_asignacion', '-pk')
+        vigente = None
+        for pk, valor, inicio in activas.values_list('pk', clave, 'fecha_asignacion'):
+            if vigente and vigente[0] == valor:
+                modelo.objects.filter(pk=pk).update(activa=False, fecha_fin=max(inicio, vigente[1]))
+            else:
+                vigente = (valor, inicio)
+    modelo.objects.filter(activa=False, fecha_fin__isnull=True).update(fecha_fin=hoy)
+
+
+def normalizar_asignaciones(apps, schema_editor):
+    AsignacionMoto = apps.get_model('App', 'AsignacionMoto')
+    AsignacionFarmacia = apps.get_model('App', 'AsignacionFarmacia')
+    Motorista = apps.get_model('App', 'Motorista')
+    _normalizar(AsignacionMoto, ['moto', 'motorista'])
+    _normalizar(AsignacionFarmacia, ['motorista'])
+
+    # Motorista.moto / Motorista.farmacia pasan a reflejar la asignación activa
+    for motorista_id, moto_id in AsignacionMoto.objects.filter(activa=True).values_list('motorista_id', 'moto_id'):
+        Motorista.objects.filter(pk=motorista_id).update(moto_id=moto_id)
+    for motorista_id, farmacia_id in AsignacionFarmacia.objects.filter(activa=True).values_list(
+        'motorista_id', 'farmacia_id'
+    ):
+        Motorista.objects.filter(pk=motorista_id).update(farmacia_id=farmacia_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0015_indices_autocompletar'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalizar_asignaciones, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='asignacionfarmacia',
+            index=models.Index(fields=['farmacia', 'fecha_asignacion', 'fecha_fin'], name='asig_farm_farmacia_rango_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asignacionfarmacia',
+            index=models.Index(fields=['motorista', 'fecha_asignacion', 'fecha_fin'], name='asig_farm_motorista_rango_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asignacionmoto',
+            index=models.Index(fields=['moto', 'fecha_asignacion', 'fecha_fin'], name='asig_moto_moto_rango_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asignacionmoto',
+            index=models.Index(fields=['motorista', 'fecha_asignacion', 'fecha_fin'], name='asig_moto_motorista_rango_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='asignacionfarmacia',
+            constraint=models.UniqueConstraint(condition=models.Q(('activa', True)), fields=('motorista',), name='asig_farm_motorista_activa_uniq', violation_error_message='El motorista ya está asignado a una farmacia.'),
+        ),
+        migrations.AddConstraint(
+            model_name='asignacionfarmacia',
+            constraint=models.CheckConstraint(condition=models.Q(('fecha_fin__isnull', True), ('fecha_fin__gte', models.F('fecha_asignacion')), _connector='OR'), name='asig_farm_fechas_check', violation_error_message='La fecha de fin no puede ser anterior a la asignación.'),
+        ),
+        migrations.AddConstraint(
+            model_name='asignacionmoto',
+            constraint=models.UniqueConstraint(condition=models.Q(('activa', True)), fields=('moto',), name='asig_moto_moto_activa_uniq', violation_error_message='La moto ya tiene una asignación activa.'),
+        ),
+        migrations.AddConstraint(
+            model_name='asignacionmoto',
+            constraint=models.UniqueConstraint(condition=models.Q(('activa', True)), fields=('motorista',), name='asig_moto_motorista_activa_uniq', violation_error_message='El motorista ya tiene una moto asignada.'),
+        ),
+        migrations.AddConstraint(
+            model_name='asignacionmoto',
+            constraint=models.CheckConstraint(condition=models.Q(('fecha_fin__isnull', True), ('fecha_fin__gte', models.F('fecha_asignacion')), _connector='OR'), name='asig_moto_fechas_check', violation_error_message='La fecha de fin no puede ser anterior a la asignación.'),
+        ),
+    ]
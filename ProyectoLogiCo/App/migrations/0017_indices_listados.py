@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0016_asignaciones_temporales'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asignacionfarmacia',
+            index=models.Index(fields=['activa', '-fecha_asignacion'], name='asig_farm_activa_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asignacionmoto',
+            index=models.Index(fields=['activa', '-fecha_asignacion'], name='asig_moto_activa_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='farmacia',
+            index=models.Index(fields=['region', 'comuna'], name='farmacia_region_comuna_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='farmacia',
+            index=models.Index(fields=['comuna'], name='farmacia_comuna_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='farmacia',
+            index=models.Index(fields=['nombre', 'id'], name='farmacia_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moto',
+            index=models.Index(fields=['disponible', 'patente'], name='moto_disponible_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='motorista',
+            index=models.Index(fields=['estado', 'licencia'], name='motorista_estado_licencia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='motorista',
+            index=models.Index(fields=['licencia'], name='motorista_licencia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='motorista',
+            index=models.Index(fields=['nombre', 'id'], name='motorista_nombre_idx'),
+        ),
+    ]
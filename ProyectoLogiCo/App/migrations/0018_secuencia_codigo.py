@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0017_indices_listados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaCodigo',
+            fields=[
+                ('clave', models.CharField(max_length=16, primary_key=True, serialize=False)),
+                ('siguiente', models.PositiveBigIntegerField(default=1)),
+            ],
+            options={
+                'db_table': 'secuencia_codigo',
+            },
+        ),
+        migrations.AlterField(
+            model_name='movimiento',
+            name='codigo',
+            field=models.CharField(blank=True, max_length=20, unique=True),
+        ),
+    ]
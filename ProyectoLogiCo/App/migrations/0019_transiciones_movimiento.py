@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:12
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0018_secuencia_codigo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimiento',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='TransicionMovimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado_anterior', models.CharField(choices=[('EN_PROCESO', 'En proceso'), ('COMPLETADO', 'Completado'), ('ANULADO', 'Anulado')], max_length=20)),
+                ('estado_nuevo', models.CharField(choices=[('EN_PROCESO', 'En proceso'), ('COMPLETADO', 'Completado'), ('ANULADO', 'Anulado')], max_length=20)),
+                ('version', models.PositiveIntegerField()),
+                ('usuario', models.CharField(blank=True, max_length=150)),
+                ('motivo', models.CharField(blank=True, max_length=200)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('movimiento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transiciones', to='App.movimiento')),
+            ],
+            options={
+                'db_table': 'transicion_movimiento',
+                'indexes': [models.Index(fields=['movimiento', 'fecha'], name='transicion_movimiento_idx'), models.Index(fields=['fecha'], name='transicion_fecha_idx')],
+            },
+        ),
+    ]
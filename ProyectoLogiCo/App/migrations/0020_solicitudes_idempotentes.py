@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:21
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0019_transiciones_movimiento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolicitudIdempotente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=100)),
+                ('metodo', models.CharField(max_length=10)),
+                ('ruta', models.CharField(max_length=200)),
+                ('huella', models.CharField(max_length=64)),
+                ('estado_http', models.PositiveSmallIntegerField(null=True)),
+                ('respuesta', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'db_table': 'solicitud_idempotente',
+                'constraints': [models.UniqueConstraint(fields=('clave', 'metodo', 'ruta'), name='solicitud_idempotente_unica')],
+            },
+        ),
+    ]
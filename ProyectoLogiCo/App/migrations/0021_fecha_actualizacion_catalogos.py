@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0020_solicitudes_idempotentes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farmacia',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='moto',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='motorista',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='farmacia',
+            index=models.Index(fields=['fecha_actualizacion'], name='farmacia_actualizacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moto',
+            index=models.Index(fields=['fecha_actualizacion'], name='moto_actualizacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='motorista',
+            index=models.Index(fields=['fecha_actualizacion'], name='motorista_actualizacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['fecha_actualizacion'], name='mov_actualizacion_idx'),
+        ),
+    ]
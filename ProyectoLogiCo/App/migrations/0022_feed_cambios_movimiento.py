@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0021_fecha_actualizacion_catalogos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoEliminado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movimiento_id', models.PositiveBigIntegerField()),
+                ('codigo', models.CharField(blank=True, max_length=20)),
+                ('fecha_eliminacion', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'movimiento_eliminado',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='movimiento',
+            name='mov_actualizacion_idx',
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['fecha_actualizacion', 'id'], name='mov_actualizacion_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientoeliminado',
+            index=models.Index(fields=['fecha_eliminacion', 'id'], name='mov_eliminado_fecha_idx'),
+        ),
+    ]
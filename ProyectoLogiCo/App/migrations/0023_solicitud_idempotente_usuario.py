@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def vaciar_solicitudes(apps, schema_editor):
+    # Respuestas guardadas por IDEMPOTENCIA_HORAS: sin dueño conocido no se pueden
+    # asignar a un usuario, así que el próximo reintento se ejecuta de nuevo
+    apps.get_model('App', 'SolicitudIdempotente').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0022_feed_cambios_movimiento'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(vaciar_solicitudes, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='solicitudidempotente',
+            name='solicitud_idempotente_unica',
+        ),
+        migrations.AddField(
+            model_name='solicitudidempotente',
+            name='usuario',
+            field=models.ForeignKey(
+                default=None, on_delete=django.db.models.deletion.CASCADE, related_name='+',
+                to=settings.AUTH_USER_MODEL,
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddConstraint(
+            model_name='solicitudidempotente',
+            constraint=models.UniqueConstraint(
+                fields=('usuario', 'clave', 'metodo', 'ruta'), name='solicitud_idempotente_usuario_unica',
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:55
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def latido_desde_inicio(apps, schema_editor):
+    # Los trabajos en curso al migrar se juzgan por su hora de inicio
+    TrabajoReporte = apps.get_model('App', 'TrabajoReporte')
+    TrabajoReporte.objects.filter(estado='EN_CURSO').update(latido=F('fecha_inicio'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0023_solicitud_idempotente_usuario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoreporte',
+            name='latido',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(latido_desde_inicio, migrations.RunPython.noop),
+    ]
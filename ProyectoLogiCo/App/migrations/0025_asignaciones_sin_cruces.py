@@ -0,0 +1,63 @@
+from datetime import date
+
+from django.db import migrations
+
+# (restricción, modelo, tabla, columna). Dos asignaciones de la misma moto o
+# del mismo motorista no pueden cruzar sus [fecha_asignacion, fecha_fin);
+# un daterange con fin nulo queda abierto.
+RESTRICCIONES = [
+    ('asig_moto_moto_excl', 'AsignacionMoto', 'asignacion_moto', 'moto_id'),
+    ('asig_moto_motorista_excl', 'AsignacionMoto', 'asignacion_moto', 'motorista_id'),
+    ('asig_farm_motorista_excl', 'AsignacionFarmacia', 'asignacion_farmacia', 'motorista_id'),
+]
+
+
+def recortar_cruces(modelo, columna):
+    """
+    Deja el historial sin cruces para que la restricción se pueda crear:
+    una asignación cerrada termina donde empieza la siguiente, y una que
+    cae dentro de la activa queda vacía ([inicio, inicio)).
+    """
+    anterior = None
+    filas = modelo.objects.order_by(columna, 'fecha_asignacion', 'pk').values_list(
+        'pk', columna, 'fecha_asignacion', 'fecha_fin', 'activa'
+    )
+    for fila in filas.iterator():
+        pk, valor, inicio, fin, activa = fila
+        if anterior and anterior[1] == valor and (anterior[3] or date.max) > inicio:
+            if anterior[4]:
+                modelo.objects.filter(pk=pk).update(fecha_fin=inicio)
+                continue
+            modelo.objects.filter(pk=anterior[0]).update(fecha_fin=inicio)
+        anterior = fila
+
+
+def crear_restricciones(apps, schema_editor):
+    # Solo PostgreSQL (btree_gist); en SQLite lo revisa validate_constraints
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for nombre, modelo, tabla, columna in RESTRICCIONES:
+        recortar_cruces(apps.get_model('App', modelo), columna)
+        schema_editor.execute(
+            f'ALTER TABLE "{tabla}" ADD CONSTRAINT "{nombre}" EXCLUDE USING gist '
+            f'("{columna}" WITH =, daterange("fecha_asignacion", "fecha_fin", \'[)\') WITH &&)'
+        )
+
+
+def borrar_restricciones(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nombre, _, tabla, _ in RESTRICCIONES:
+        schema_editor.execute(f'ALTER TABLE "{tabla}" DROP CONSTRAINT IF EXISTS "{nombre}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0024_latido_trabajo_reporte'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_restricciones, borrar_restricciones),
+    ]
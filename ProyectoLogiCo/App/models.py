@@ -1,32 +1,35 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 from datetime import timedelta
 import secrets
 
 
-def es_admin(user):
-    """Verifica si el usuario es admin"""
+def rol_de(user):
+    """Rol del usuario o None. Con RolBackend user.rol ya viene cargado"""
+    if not user.is_authenticated:
+        return None
     try:
-        return user.rol.rol == 'admin'
+        return user.rol.rol
     except UsuarioRol.DoesNotExist:
-        return False
+        return None
+
+
+def es_admin(user):
+    """Verifica si el usuario es admin"""
+    return rol_de(user) == 'admin'
 
 
 def es_recepcionista(user):
     """Verifica si el usuario es recepcionista"""
-    try:
-        return user.rol.rol == 'recepcionista'
-    except UsuarioRol.DoesNotExist:
-        return False
+    return rol_de(user) == 'recepcionista'
 
 
 def es_admin_o_recepcionista(user):
     """Verifica si es admin o recepcionista"""
-    try:
-        return user.rol.rol in ['admin', 'recepcionista']
-    except UsuarioRol.DoesNotExist:
-        return False
+    return rol_de(user) in ['admin', 'recepcionista']
 
 
 # =====================================================
@@ -110,6 +113,8 @@ class Farmacia(models.Model):
     region = models.CharField(max_length=100, choices=REGIONES)
     provincia = models.CharField(max_length=100)
     comuna = models.CharField(max_length=100)
+    # ETag / Last-Modified de la API (App/api.py)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.nombre} ({self.comuna})"
@@ -118,6 +123,13 @@ class Farmacia(models.Model):
         db_table = 'farmacia'
         verbose_name = 'Farmacia'
         verbose_name_plural = 'Farmacias'
+        # Filtros y orden de farmacia_list (App/listados.py)
+        indexes = [
+            models.Index(fields=['region', 'comuna'], name='farmacia_region_comuna_idx'),
+            models.Index(fields=['comuna'], name='farmacia_comuna_idx'),
+            models.Index(fields=['nombre', 'id'], name='farmacia_nombre_idx'),
+            models.Index(fields=['fecha_actualizacion'], name='farmacia_actualizacion_idx'),
+        ]
 
 
 class Moto(models.Model):
@@ -126,12 +138,17 @@ class Moto(models.Model):
     modelo = models.CharField(max_length=50)
     anio = models.PositiveIntegerField(db_column="anio", verbose_name="año")
     disponible = models.BooleanField(default=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.marca} {self.modelo} - {self.patente}"
 
     class Meta:
         db_table = 'moto'
+        indexes = [
+            models.Index(fields=['disponible', 'patente'], name='moto_disponible_idx'),
+            models.Index(fields=['fecha_actualizacion'], name='moto_actualizacion_idx'),
+        ]
 
 
 class Motorista(models.Model):
@@ -150,49 +167,173 @@ class Motorista(models.Model):
     fecha_ingreso = models.DateField()
     farmacia = models.ForeignKey('Farmacia', on_delete=models.SET_NULL, null=True, blank=True)
     moto = models.ForeignKey('Moto', on_delete=models.SET_NULL, null=True, blank=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.nombre} ({self.licencia})"
 
     class Meta:
         db_table = 'motorista'
+        indexes = [
+            models.Index(fields=['estado', 'licencia'], name='motorista_estado_licencia_idx'),
+            models.Index(fields=['licencia'], name='motorista_licencia_idx'),
+            models.Index(fields=['nombre', 'id'], name='motorista_nombre_idx'),
+            models.Index(fields=['fecha_actualizacion'], name='motorista_actualizacion_idx'),
+        ]
 
 
 # ==========================
 # ASIGNACIONES
 # ==========================
 
-class AsignacionMoto(models.Model):
+class CierreAsignacionMixin:
+    """
+    Una asignación inactiva siempre tiene fecha_fin, y una con fecha_fin
+    vencida deja de estar activa; las consultas temporales de
+    App/asignaciones.py leen solo las fechas.
+
+    Las restricciones únicas parciales miran solo `activa`: una asignación
+    cuya fecha_fin ya pasó sin que nadie la guardara seguiría bloqueando a
+    la siguiente. Por eso antes de validar o guardar una asignación activa
+    se cierran las vencidas de la misma moto / motorista (y
+    `manage.py purgar_vencidos` cierra el resto). Los cruces de fechas con
+    el historial los rechaza la restricción de exclusión en PostgreSQL
+    (migración 0025) y validate_constraints en SQLite.
+    """
+    # {campo: mensaje} de los campos que no pueden tener dos asignaciones a la vez
+    exclusivos = {}
+
+    @classmethod
+    def cerrar_vencidas(cls, filtro=models.Q()):
+        """Desactiva las asignaciones activas con fecha_fin cumplida; devuelve cuántas"""
+        cerradas = 0
+        for asignacion in cls.objects.filter(filtro, activa=True, fecha_fin__lte=timezone.localdate()):
+            # save() la desactiva y las señales actualizan Motorista y el despacho
+            asignacion.save(update_fields=['activa'])
+            cerradas += 1
+        return cerradas
+
+    def _campos_exclusivos(self, exclude=None):
+        return [campo for campo in self.exclusivos if not exclude or campo not in exclude]
+
+    def _cerrar_vencidas_relacionadas(self, exclude=None):
+        filtro = models.Q()
+        for campo in self._campos_exclusivos(exclude):
+            filtro |= models.Q(**{f'{campo}_id': getattr(self, f'{campo}_id')})
+        if filtro:
+            self.cerrar_vencidas(filtro & ~models.Q(pk=self.pk))
+
+    def validate_constraints(self, exclude=None):
+        if self.activa:
+            self._cerrar_vencidas_relacionadas(exclude)
+        super().validate_constraints(exclude)
+
+        inicio = self.fecha_asignacion or timezone.localdate()
+        if self.fecha_fin is not None and self.fecha_fin <= inicio:
+            return
+        cruza = models.Q(fecha_fin__isnull=True) | models.Q(fecha_fin__gt=inicio)
+        if self.fecha_fin is not None:
+            cruza &= models.Q(fecha_asignacion__lt=self.fecha_fin)
+        otras = type(self).objects.filter(cruza).exclude(pk=self.pk)
+        errores = [
+            self.exclusivos[campo] for campo in self._campos_exclusivos(exclude)
+            if otras.filter(**{f'{campo}_id': getattr(self, f'{campo}_id')}).exists()
+        ]
+        if errores:
+            raise ValidationError(errores)
+
+    def save(self, *args, **kwargs):
+        hoy = timezone.localdate()
+        if not self.activa and self.fecha_fin is None:
+            self.fecha_fin = hoy
+        elif self.fecha_fin is not None and self.fecha_fin <= hoy:
+            self.activa = False
+        if self.activa:
+            self._cerrar_vencidas_relacionadas()
+        super().save(*args, **kwargs)
+
+
+class AsignacionMoto(CierreAsignacionMixin, models.Model):
     motorista = models.ForeignKey(Motorista, on_delete=models.CASCADE)
     moto = models.ForeignKey(Moto, on_delete=models.CASCADE)
     fecha_asignacion = models.DateField(auto_now_add=True)
     fecha_fin = models.DateField(null=True, blank=True)
     activa = models.BooleanField(default=True)
 
+    exclusivos = {
+        'moto': 'La moto ya estaba asignada en esas fechas.',
+        'motorista': 'El motorista ya tenía una moto asignada en esas fechas.',
+    }
+
     def __str__(self):
         return f"{self.motorista} ↔ {self.moto}"
 
     class Meta:
         db_table = 'asignacion_moto'
-
-
-class AsignacionFarmacia(models.Model):
+        indexes = [
+            # Rango [fecha_asignacion, fecha_fin) por moto y por motorista
+            models.Index(fields=['moto', 'fecha_asignacion', 'fecha_fin'], name='asig_moto_moto_rango_idx'),
+            models.Index(fields=['motorista', 'fecha_asignacion', 'fecha_fin'], name='asig_moto_motorista_rango_idx'),
+            models.Index(fields=['activa', '-fecha_asignacion'], name='asig_moto_activa_fecha_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['moto'], condition=models.Q(activa=True), name='asig_moto_moto_activa_uniq',
+                violation_error_message='La moto ya tiene una asignación activa.',
+            ),
+            models.UniqueConstraint(
+                fields=['motorista'], condition=models.Q(activa=True), name='asig_moto_motorista_activa_uniq',
+                violation_error_message='El motorista ya tiene una moto asignada.',
+            ),
+            models.CheckConstraint(
+                condition=models.Q(fecha_fin__isnull=True) | models.Q(fecha_fin__gte=models.F('fecha_asignacion')),
+                name='asig_moto_fechas_check',
+                violation_error_message='La fecha de fin no puede ser anterior a la asignación.',
+            ),
+        ]
+
+
+class AsignacionFarmacia(CierreAsignacionMixin, models.Model):
     motorista = models.ForeignKey(Motorista, on_delete=models.CASCADE)
     farmacia = models.ForeignKey(Farmacia, on_delete=models.CASCADE)
     fecha_asignacion = models.DateField(auto_now_add=True)
     fecha_fin = models.DateField(null=True, blank=True)
     activa = models.BooleanField(default=True)
 
+    exclusivos = {
+        'motorista': 'El motorista ya estaba asignado a una farmacia en esas fechas.',
+    }
+
     def __str__(self):
         return f"{self.motorista} ↔ {self.farmacia}"
 
     class Meta:
         db_table = 'asignacion_farmacia'
+        indexes = [
+            models.Index(fields=['farmacia', 'fecha_asignacion', 'fecha_fin'], name='asig_farm_farmacia_rango_idx'),
+            models.Index(fields=['motorista', 'fecha_asignacion', 'fecha_fin'], name='asig_farm_motorista_rango_idx'),
+            models.Index(fields=['activa', '-fecha_asignacion'], name='asig_farm_activa_fecha_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['motorista'], condition=models.Q(activa=True), name='asig_farm_motorista_activa_uniq',
+                violation_error_message='El motorista ya está asignado a una farmacia.',
+            ),
+            models.CheckConstraint(
+                condition=models.Q(fecha_fin__isnull=True) | models.Q(fecha_fin__gte=models.F('fecha_asignacion')),
+                name='asig_farm_fechas_check',
+                violation_error_message='La fecha de fin no puede ser anterior a la asignación.',
+            ),
+        ]
 
 # ==========================
 # MOVIMIENTOS (Release 2)
 # ==========================
 
+class VersionDesactualizada(Exception):
+    """Otro usuario guardó el movimiento después de que se leyó esta versión"""
+
+
 class Movimiento(models.Model):
     TIPO_MOVIMIENTO = [
         ('DIRECTO', 'Movimiento Directo'),
@@ -207,7 +348,15 @@ class Movimiento(models.Model):
         ('ANULADO', 'Anulado'),
     ]
 
-    codigo = models.CharField(max_length=20, unique=True)
+    # Cambios de estado permitidos (App/transiciones.py)
+    TRANSICIONES = {
+        'EN_PROCESO': ('COMPLETADO', 'ANULADO'),
+        'COMPLETADO': ('ANULADO',),
+        'ANULADO': (),
+    }
+
+    # En blanco se asigna uno al guardar (App/codigos.py)
+    codigo = models.CharField(max_length=20, unique=True, blank=True)
     tipo = models.CharField(max_length=20, choices=TIPO_MOVIMIENTO)
     descripcion = models.TextField(blank=True, null=True)
     fecha_registro = models.DateTimeField(auto_now_add=True)
@@ -217,18 +366,105 @@ class Movimiento(models.Model):
     destino = models.CharField(max_length=200)
     motorista = models.ForeignKey(Motorista, on_delete=models.SET_NULL, null=True)
     moto = models.ForeignKey(Moto, on_delete=models.SET_NULL, null=True)
+    # Bloqueo optimista: cada UPDATE exige la versión leída y la incrementa
+    version = models.PositiveIntegerField(default=1)
 
     def __str__(self):
         return f"{self.codigo} - {self.tipo}"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        self._version_leida = self.version
+        self.version += 1
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        try:
+            # Savepoint propio: el conflicto no deja rota la transacción de quien llama
+            with transaction.atomic(using=kwargs.get('using')):
+                super().save(*args, **kwargs)
+        except VersionDesactualizada:
+            self.version = self._version_leida
+            raise
+        finally:
+            self._version_leida = None
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        leida = getattr(self, '_version_leida', None)
+        if leida is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        if super()._do_update(base_qs.filter(version=leida), using, pk_val, values, update_fields, forced_update):
+            return True
+        if base_qs.filter(pk=pk_val).exists():
+            raise VersionDesactualizada(f"El movimiento {pk_val} ya no está en la versión {leida}")
+        return False
+
     class Meta:
         db_table = 'movimiento'
         ordering = ['-fecha_registro']
+        indexes = [
+            models.Index(fields=['fecha_registro'], name='mov_fecha_idx'),
+            models.Index(fields=['estado', 'fecha_registro'], name='mov_estado_fecha_idx'),
+            models.Index(fields=['motorista', 'fecha_registro'], name='mov_motorista_fecha_idx'),
+            models.Index(fields=['farmacia_origen', 'fecha_registro'], name='mov_farmacia_fecha_idx'),
+            # Feed de cambios (App/sincronizacion.py) y validadores del CondicionalMixin
+            models.Index(fields=['fecha_actualizacion', 'id'], name='mov_actualizacion_id_idx'),
+        ]
+        constraints = [
+            # Un motorista o una moto no pueden tener dos movimientos en curso
+            models.UniqueConstraint(
+                fields=['motorista'], condition=models.Q(estado='EN_PROCESO'),
+                name='mov_motorista_en_proceso_uniq',
+                violation_error_message='El motorista ya tiene un movimiento en proceso.',
+            ),
+            models.UniqueConstraint(
+                fields=['moto'], condition=models.Q(estado='EN_PROCESO'),
+                name='mov_moto_en_proceso_uniq',
+                violation_error_message='La moto ya tiene un movimiento en proceso.',
+            ),
+        ]
 
 # ==========================
 # REPORTES
 # ==========================
 
+class TransicionMovimiento(models.Model):
+    """Bitácora de cambios de estado de Movimiento (formularios, API y lotes)"""
+    movimiento = models.ForeignKey(Movimiento, on_delete=models.CASCADE, related_name='transiciones')
+    estado_anterior = models.CharField(max_length=20, choices=Movimiento.ESTADO_MOVIMIENTO)
+    estado_nuevo = models.CharField(max_length=20, choices=Movimiento.ESTADO_MOVIMIENTO)
+    version = models.PositiveIntegerField()
+    usuario = models.CharField(max_length=150, blank=True)
+    motivo = models.CharField(max_length=200, blank=True)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.movimiento_id}: {self.estado_anterior} → {self.estado_nuevo}"
+
+    class Meta:
+        db_table = 'transicion_movimiento'
+        indexes = [
+            models.Index(fields=['movimiento', 'fecha'], name='transicion_movimiento_idx'),
+            models.Index(fields=['fecha'], name='transicion_fecha_idx'),
+        ]
+
+
+class MovimientoEliminado(models.Model):
+    """Lápida de un Movimiento borrado, para el feed de cambios (ver App/sincronizacion.py)"""
+    movimiento_id = models.PositiveBigIntegerField()
+    codigo = models.CharField(max_length=20, blank=True)
+    fecha_eliminacion = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.movimiento_id} ({self.codigo}) eliminado"
+
+    class Meta:
+        db_table = 'movimiento_eliminado'
+        indexes = [
+            models.Index(fields=['fecha_eliminacion', 'id'], name='mov_eliminado_fecha_idx'),
+        ]
+
+
 class ReporteMovimiento(models.Model):
     TIPO_REPORTE = [
         ('DIARIO', 'Reporte Diario'),
@@ -246,6 +482,125 @@ class ReporteMovimiento(models.Model):
 
     class Meta:
         db_table = 'reporte_movimiento'
+
+
+class TrabajoReporte(models.Model):
+    """Generación de un reporte PDF en segundo plano (ver App/trabajos.py)"""
+
+    ESTADOS = [
+        ('PENDIENTE', 'Pendiente'),
+        ('EN_CURSO', 'En curso'),
+        ('LISTO', 'Listo'),
+        ('ERROR', 'Error'),
+    ]
+
+    reporte = models.OneToOneField(ReporteMovimiento, on_delete=models.CASCADE, related_name='trabajo')
+    solicitado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha = models.CharField(max_length=10, blank=True)
+    mes = models.CharField(max_length=2, blank=True)
+    anio = models.CharField(max_length=4, blank=True)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='PENDIENTE')
+    archivo = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    # El worker lo renueva mientras genera el PDF; si se detiene, el trabajo quedó huérfano
+    latido = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Trabajo {self.pk} - {self.reporte.tipo} ({self.estado})"
+
+    class Meta:
+        db_table = 'trabajo_reporte'
+        indexes = [
+            models.Index(fields=['estado', 'fecha_creacion'], name='trabajo_estado_idx'),
+        ]
+
+
+class VersionPeriodo(models.Model):
+    """
+    Contador de cambios por periodo (D2025-03-14, M2025-03) más la clave
+    global G. Cada escritura de Movimiento incrementa su día y su mes; el
+    año y el total suman sus meses. Forma parte de la clave del cache de
+    reportes (ver App/cache_reportes.py).
+    """
+    clave = models.CharField(max_length=12, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.clave} v{self.version}"
+
+    class Meta:
+        db_table = 'version_periodo'
+
+
+class SecuenciaCodigo(models.Model):
+    """
+    Siguiente número libre de cada secuencia de códigos de Movimiento
+    (AAMMDD-<farmacia>). Los procesos reservan bloques, ver App/codigos.py.
+    """
+    clave = models.CharField(max_length=16, primary_key=True)
+    siguiente = models.PositiveBigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.clave} → {self.siguiente}"
+
+    class Meta:
+        db_table = 'secuencia_codigo'
+
+
+class SolicitudIdempotente(models.Model):
+    """
+    Respuesta de una escritura en lote de la API guardada bajo su
+    Idempotency-Key, para devolverla tal cual si el cliente reintenta
+    (ver App/lotes.py). La clave es por usuario: dos clientes que eligen
+    la misma no se pisan.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    clave = models.CharField(max_length=100)
+    metodo = models.CharField(max_length=10)
+    ruta = models.CharField(max_length=200)
+    huella = models.CharField(max_length=64)
+    estado_http = models.PositiveSmallIntegerField(null=True)
+    respuesta = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    fecha_creacion = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.metodo} {self.ruta} [{self.clave}]"
+
+    class Meta:
+        db_table = 'solicitud_idempotente'
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'clave', 'metodo', 'ruta'], name='solicitud_idempotente_usuario_unica'),
+        ]
+
+
+class ResumenMovimientoDiario(models.Model):
+    """Totales de movimientos por día × farmacia de origen × tipo × estado"""
+    fecha = models.DateField()
+    farmacia_origen = models.ForeignKey(Farmacia, on_delete=models.CASCADE, null=True, related_name='resumenes')
+    tipo = models.CharField(max_length=20, choices=Movimiento.TIPO_MOVIMIENTO)
+    estado = models.CharField(max_length=20, choices=Movimiento.ESTADO_MOVIMIENTO)
+    total = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.fecha} {self.tipo}/{self.estado}: {self.total}"
+
+    class Meta:
+        db_table = 'resumen_movimiento_diario'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'farmacia_origen', 'tipo', 'estado'],
+                name='resumen_clave_unica',
+            ),
+            # Los NULL no chocan en un UNIQUE normal
+            models.UniqueConstraint(
+                fields=['fecha', 'tipo', 'estado'],
+                condition=models.Q(farmacia_origen__isnull=True),
+                name='resumen_clave_unica_sin_farmacia',
+            ),
+        ]
         
         
         
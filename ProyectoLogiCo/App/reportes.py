@@ -0,0 +1,309 @@
+"""
+Reportes de movimientos.
+
+Los periodos se traducen a rangos semiabiertos [inicio, fin) sobre
+fecha_registro. A diferencia de __date, __year o __month, que envuelven la
+columna en una función, un rango sí puede usar los índices de Movimiento.
+
+El PDF se genera de forma incremental: las filas se leen por bloques con
+los nombres relacionados ya unidos en el SQL y cada página se entrega en
+cuanto se completa, así la memoria no depende del número de movimientos.
+Las exportaciones CSV y NDJSON siguen el mismo esquema.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+
+from django.utils import timezone
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+
+def rango_periodo(tipo, fecha=None, mes=None, anio=None):
+    """
+    Devuelve (inicio, fin) como datetimes con zona horaria para el periodo,
+    o None si faltan parámetros. Lanza ValueError si vienen mal formados.
+    """
+    if tipo == "DIARIO" and fecha:
+        desde = date.fromisoformat(fecha)
+        hasta = desde + timedelta(days=1)
+    elif tipo == "MENSUAL" and mes and anio:
+        desde = date(int(anio), int(mes), 1)
+        hasta = date(desde.year + desde.month // 12, desde.month % 12 + 1, 1)
+    elif tipo == "ANUAL" and anio:
+        desde = date(int(anio), 1, 1)
+        hasta = date(desde.year + 1, 1, 1)
+    else:
+        return None
+
+    zona = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(desde, time.min), zona),
+        timezone.make_aware(datetime.combine(hasta, time.min), zona),
+    )
+
+
+def normalizar_periodo(tipo, fecha=None, mes=None, anio=None):
+    """
+    Forma canónica de los parámetros del reporte (mes '03' -> '3', descarta
+    los que el tipo no usa). Devuelve None si vienen mal formados.
+    """
+    try:
+        rango = rango_periodo(tipo, fecha, mes, anio)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if rango is None:
+        # Sin periodo completo el reporte abarca todo: los demás valores no se usan
+        return (tipo, None, None, None)
+    inicio = timezone.localdate(rango[0])
+    if tipo == "DIARIO":
+        return (tipo, inicio.isoformat(), None, None)
+    if tipo == "MENSUAL":
+        return (tipo, None, str(inicio.month), str(inicio.year))
+    return (tipo, None, None, str(inicio.year))
+
+
+def filtrar_periodo(movimientos, tipo, fecha=None, mes=None, anio=None):
+    try:
+        rango = rango_periodo(tipo, fecha, mes, anio)
+    except (TypeError, ValueError, OverflowError):
+        return movimientos.none()
+    if rango is None:
+        return movimientos
+    inicio, fin = rango
+    return movimientos.filter(fecha_registro__gte=inicio, fecha_registro__lt=fin)
+
+
+# =====================================================
+# PDF INCREMENTAL
+# =====================================================
+
+class PDFIncremental:
+    """
+    Escritor PDF mínimo (solo texto, fuentes Helvetica estándar).
+    Cada método devuelve los bytes a enviar; la tabla xref se arma al final
+    con los offsets acumulados, por eso las páginas no quedan en memoria.
+    """
+
+    CATALOGO, PAGINAS, FUENTE, FUENTE_NEGRITA = 1, 2, 3, 4
+
+    def __init__(self, pagesize=letter):
+        self.ancho, self.alto = pagesize
+        self.offsets = {}
+        self.posicion = 0
+        self.paginas = []
+        self.siguiente_objeto = 5
+
+    def _emitir(self, datos):
+        self.posicion += len(datos)
+        return datos
+
+    def _objeto(self, numero, cuerpo):
+        self.offsets[numero] = self.posicion
+        return self._emitir(b'%d 0 obj\n' % numero + cuerpo + b'\nendobj\n')
+
+    def inicio(self):
+        datos = self._emitir(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        for numero, nombre in ((self.FUENTE, b'Helvetica'), (self.FUENTE_NEGRITA, b'Helvetica-Bold')):
+            datos += self._objeto(
+                numero,
+                b'<< /Type /Font /Subtype /Type1 /BaseFont /' + nombre
+                + b' /Encoding /WinAnsiEncoding >>'
+            )
+        return datos
+
+    def pagina(self, contenido):
+        comprimido = zlib.compress(contenido)
+        contenido_num, pagina_num = self.siguiente_objeto, self.siguiente_objeto + 1
+        self.siguiente_objeto += 2
+        self.paginas.append(pagina_num)
+        datos = self._objeto(
+            contenido_num,
+            b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(comprimido)
+            + comprimido + b'\nendstream'
+        )
+        datos += self._objeto(
+            pagina_num,
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] '
+            b'/Resources << /Font << /F1 %d 0 R /F2 %d 0 R >> >> /Contents %d 0 R >>'
+            % (self.PAGINAS, self.ancho, self.alto, self.FUENTE, self.FUENTE_NEGRITA, contenido_num)
+        )
+        return datos
+
+    def fin(self):
+        hijos = b' '.join(b'%d 0 R' % numero for numero in self.paginas)
+        datos = self._objeto(
+            self.PAGINAS,
+            b'<< /Type /Pages /Kids [' + hijos + b'] /Count %d >>' % len(self.paginas)
+        )
+        datos += self._objeto(self.CATALOGO, b'<< /Type /Catalog /Pages %d 0 R >>' % self.PAGINAS)
+
+        total = self.siguiente_objeto
+        inicio_xref = self.posicion
+        xref = [b'xref\n0 %d\n' % total, b'0000000000 65535 f \n']
+        for numero in range(1, total):
+            xref.append(b'%010d 00000 n \n' % self.offsets[numero])
+        xref.append(
+            b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+            % (total, self.CATALOGO, inicio_xref)
+        )
+        return datos + self._emitir(b''.join(xref))
+
+
+def _texto_pdf(texto):
+    datos = str(texto).encode('cp1252', errors='replace')
+    return datos.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+class Pagina:
+    """Acumula los operadores de una página"""
+
+    def __init__(self):
+        self.operadores = []
+
+    def texto(self, x, y, texto, negrita=False, tamano=9):
+        fuente = b'F2' if negrita else b'F1'
+        self.operadores.append(
+            b'BT /%s %d Tf %d %d Td (%s) Tj ET' % (fuente, tamano, x, y, _texto_pdf(texto))
+        )
+
+    def contenido(self):
+        return b'\n'.join(self.operadores)
+
+
+# (x, ancho, título) de cada columna del reporte
+COLUMNAS_REPORTE = [
+    (40, 56, "Código"),
+    (100, 56, "Tipo"),
+    (160, 66, "Estado"),
+    (230, 66, "Fecha"),
+    (300, 76, "Motorista"),
+    (380, 86, "Origen"),
+    (470, 102, "Destino"),
+]
+CAMPOS_REPORTE = [
+    'codigo', 'tipo', 'estado', 'fecha_registro',
+    'motorista__nombre', 'farmacia_origen__nombre', 'destino',
+]
+FILAS_POR_BLOQUE = 2000
+
+
+@lru_cache(maxsize=4096)
+def _recortar(texto, ancho, fuente='Helvetica', tamano=9):
+    """Recorta el texto al ancho de la columna para que no se superponga"""
+    texto = str(texto or '')
+    if stringWidth(texto, fuente, tamano) <= ancho:
+        return texto
+    while texto and stringWidth(texto + '…', fuente, tamano) > ancho:
+        texto = texto[:-1]
+    return texto + '…'
+
+
+def _encabezado_columnas(pagina, y):
+    for x, _, titulo in COLUMNAS_REPORTE:
+        pagina.texto(x, y, titulo, negrita=True, tamano=10)
+
+
+def generar_pdf_movimientos(movimientos, tipo, fecha=None, mes=None, anio=None):
+    """
+    Generador de bytes del PDF del reporte. Lee los movimientos por bloques
+    con .iterator() (cursor del lado del servidor en PostgreSQL).
+    """
+    pdf = PDFIncremental()
+    alto = pdf.alto
+    yield pdf.inicio()
+
+    pagina = Pagina()
+    y = alto - 50
+    pagina.texto(50, y, f"Reporte de Movimientos - {tipo}", negrita=True, tamano=16)
+    y -= 30
+
+    if tipo == "DIARIO":
+        pagina.texto(50, y, f"Fecha: {fecha}", tamano=12)
+    elif tipo == "MENSUAL":
+        pagina.texto(50, y, f"Mes: {mes} / Año: {anio}", tamano=12)
+    elif tipo == "ANUAL":
+        pagina.texto(50, y, f"Año: {anio}", tamano=12)
+    y -= 30
+
+    _encabezado_columnas(pagina, y)
+    y -= 18
+
+    filas = movimientos.values_list(*CAMPOS_REPORTE).iterator(chunk_size=FILAS_POR_BLOQUE)
+    for fila in filas:
+        if y < 60:
+            yield pdf.pagina(pagina.contenido())
+            pagina = Pagina()
+            y = alto - 50
+            _encabezado_columnas(pagina, y)
+            y -= 18
+
+        codigo, tipo_mov, estado, fecha_registro, motorista, origen, destino = fila
+        valores = [
+            codigo, tipo_mov, estado, timezone.localtime(fecha_registro).strftime("%Y-%m-%d"),
+            motorista, origen, destino,
+        ]
+        for (x, ancho_col, _), valor in zip(COLUMNAS_REPORTE, valores):
+            pagina.texto(x, y, _recortar(valor, ancho_col))
+        y -= 15
+
+    yield pdf.pagina(pagina.contenido())
+    yield pdf.fin()
+
+
+# =====================================================
+# EXPORTACIÓN CSV / NDJSON
+# =====================================================
+
+CAMPOS_EXPORTACION = [
+    'id', 'codigo', 'tipo', 'estado', 'descripcion', 'destino',
+    'fecha_registro', 'fecha_actualizacion',
+    'farmacia_origen_id', 'farmacia_origen__nombre',
+    'motorista_id', 'motorista__nombre', 'motorista__rut',
+    'moto_id', 'moto__patente',
+]
+COLUMNAS_EXPORTACION = [campo.replace('__', '_') for campo in CAMPOS_EXPORTACION]
+FILAS_POR_ESCRITURA = 500
+
+
+def _filas_exportacion(movimientos):
+    for fila in movimientos.values_list(*CAMPOS_EXPORTACION).iterator(chunk_size=FILAS_POR_BLOQUE):
+        yield [valor.isoformat() if isinstance(valor, datetime) else valor for valor in fila]
+
+
+def generar_csv_movimientos(movimientos):
+    """Generador de bytes CSV; escribe de a FILAS_POR_ESCRITURA filas"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUMNAS_EXPORTACION)
+    # El encabezado sale antes de la consulta: primer byte inmediato
+    yield buffer.getvalue().encode()
+    buffer.seek(0)
+    buffer.truncate()
+
+    pendientes = 0
+    for fila in _filas_exportacion(movimientos):
+        escritor.writerow(fila)
+        pendientes += 1
+        if pendientes >= FILAS_POR_ESCRITURA:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            pendientes = 0
+    if pendientes:
+        yield buffer.getvalue().encode()
+
+
+def generar_ndjson_movimientos(movimientos):
+    """Generador de bytes NDJSON, un objeto por movimiento"""
+    lineas = []
+    for fila in _filas_exportacion(movimientos):
+        lineas.append(json.dumps(dict(zip(COLUMNAS_EXPORTACION, fila)), ensure_ascii=False))
+        if len(lineas) >= FILAS_POR_ESCRITURA:
+            yield ("\n".join(lineas) + "\n").encode()
+            lineas = []
+    if lineas:
+        yield ("\n".join(lineas) + "\n").encode()
@@ -0,0 +1,120 @@
+"""
+Tabla resumen de movimientos (ResumenMovimientoDiario).
+
+Los reportes leen totales por día en lugar de contar sobre Movimiento, así
+su costo depende del número de días del periodo y no del número de
+movimientos. La tabla se mantiene al día con las señales de App/signals.py
+y se puede reconstruir con `python manage.py reconstruir_resumen`.
+
+Las operaciones masivas que no disparan señales (QuerySet.update,
+bulk_create) deben llamar a ajustar_resumen() con sus propios deltas.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Movimiento, ResumenMovimientoDiario
+from .reportes import rango_periodo
+
+
+def clave_resumen(fecha_registro, farmacia_origen_id, tipo, estado):
+    return (timezone.localdate(fecha_registro), farmacia_origen_id, tipo, estado)
+
+
+def clave_de_movimiento(movimiento):
+    return clave_resumen(
+        movimiento.fecha_registro, movimiento.farmacia_origen_id,
+        movimiento.tipo, movimiento.estado,
+    )
+
+
+def ajustar_resumen(deltas):
+    """Aplica {clave: delta} sobre la tabla resumen con UPDATE atómicos"""
+    for (fecha, farmacia_id, tipo, estado), delta in deltas.items():
+        if not delta:
+            continue
+        filas = ResumenMovimientoDiario.objects.filter(
+            fecha=fecha, farmacia_origen_id=farmacia_id, tipo=tipo, estado=estado
+        )
+        if filas.update(total=F('total') + delta) or delta < 0:
+            continue
+        try:
+            with transaction.atomic():
+                ResumenMovimientoDiario.objects.create(
+                    fecha=fecha, farmacia_origen_id=farmacia_id, tipo=tipo, estado=estado, total=delta
+                )
+        except IntegrityError:
+            # Otro proceso creó la fila entre el UPDATE y el INSERT
+            filas.update(total=F('total') + delta)
+
+
+def mover_resumen_farmacia(farmacia_id):
+    """
+    Antes de borrar una farmacia sus movimientos pasan a farmacia_origen NULL
+    (SET_NULL, sin señales); sus totales se trasladan a la fila sin farmacia.
+    """
+    filas = ResumenMovimientoDiario.objects.filter(farmacia_origen_id=farmacia_id)
+    deltas = Counter()
+    for fecha, tipo, estado, total in filas.values_list('fecha', 'tipo', 'estado', 'total'):
+        deltas[(fecha, None, tipo, estado)] += total
+    filas.delete()
+    ajustar_resumen(deltas)
+
+
+def reconstruir_resumen(lote=5000):
+    """Recalcula toda la tabla resumen desde Movimiento. Devuelve las filas creadas"""
+    agregados = (
+        Movimiento.objects
+        .order_by()
+        .annotate(fecha=TruncDate('fecha_registro'))
+        .values('fecha', 'farmacia_origen_id', 'tipo', 'estado')
+        .annotate(total=Count('id'))
+    )
+    creadas = 0
+    with transaction.atomic():
+        ResumenMovimientoDiario.objects.all().delete()
+        pendientes = []
+        for fila in agregados.iterator(chunk_size=lote):
+            pendientes.append(ResumenMovimientoDiario(**fila))
+            if len(pendientes) >= lote:
+                ResumenMovimientoDiario.objects.bulk_create(pendientes)
+                creadas += len(pendientes)
+                pendientes = []
+        ResumenMovimientoDiario.objects.bulk_create(pendientes)
+        creadas += len(pendientes)
+    return creadas
+
+
+def resumen_periodo(tipo, fecha=None, mes=None, anio=None):
+    """
+    Totales del periodo leídos desde la tabla resumen:
+    {'total': n, 'por_tipo': [(nombre, n), ...], 'por_estado': [(nombre, n), ...]}
+    """
+    filas = ResumenMovimientoDiario.objects.all()
+    try:
+        rango = rango_periodo(tipo, fecha, mes, anio)
+    except (TypeError, ValueError, OverflowError):
+        filas = filas.none()
+    else:
+        if rango is not None:
+            inicio, fin = (timezone.localdate(valor) for valor in rango)
+            filas = filas.filter(fecha__gte=inicio, fecha__lt=fin)
+
+    por_tipo = Counter()
+    por_estado = Counter()
+    for tipo_mov, estado, total in (
+        filas.order_by().values_list('tipo', 'estado').annotate(n=Sum('total'))
+    ):
+        por_tipo[tipo_mov] += total
+        por_estado[estado] += total
+
+    nombres_tipo = dict(Movimiento.TIPO_MOVIMIENTO)
+    nombres_estado = dict(Movimiento.ESTADO_MOVIMIENTO)
+    return {
+        'total': sum(por_tipo.values()),
+        'por_tipo': [(nombres_tipo.get(k, k), n) for k, n in sorted(por_tipo.items())],
+        'por_estado': [(nombres_estado.get(k, k), n) for k, n in sorted(por_estado.items())],
+    }
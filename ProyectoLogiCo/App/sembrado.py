@@ -0,0 +1,398 @@
+"""
+Datos sintéticos deterministas para benchmarks, pruebas de carga y el
+comando `manage.py seed_logico`.
+
+La misma semilla produce los mismos registros (nombres, RUT, patentes,
+historial de asignaciones, fechas y estados) en cualquier base vacía, así
+los resultados de benchmarks/benchmark_flujos.py se pueden comparar entre
+commits.
+
+- Las farmacias se reparten entre todas las Farmacia.REGIONES, en comunas
+  reales de App/territorio.py.
+- Cada motorista tiene un historial de asignaciones cerradas antes de la
+  activa. Los cortes son comunes a todos y en cada tramo las motos rotan
+  entre motoristas, así una moto nunca queda con dos asignaciones cruzadas.
+- Los movimientos siguen una distribución por hora del día y día de la
+  semana, con un crecimiento leve a lo largo del periodo, y usan la moto y
+  la farmacia que el motorista tenía asignadas en esa fecha.
+- Los movimientos se generan por tramos de TRAMO_DIAS días, cada uno con su
+  propio generador aleatorio: el resultado no depende de cuántos procesos
+  se usen, solo el orden de las pk.
+
+Todo se escribe con bulk_create por lotes. Como bulk_create no dispara
+señales, al final se reconstruye la tabla resumen y se invalidan el cache
+de reportes y el índice de despacho.
+"""
+import random
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from itertools import accumulate
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.utils import timezone
+
+from . import territorio
+from .cache_reportes import invalidar_todo
+from .despacho import indice
+from .models import AsignacionFarmacia, AsignacionMoto, Farmacia, Moto, Motorista, Movimiento, UsuarioRol
+from .resumen import reconstruir_resumen
+
+LOTE = 5000
+TRAMO_DIAS = 7
+HISTORIAL = 3
+
+# Usuarios con los que entran los benchmarks
+CLAVE_USUARIOS = 'Bench123@'
+USUARIOS = (('bench_admin', 'admin'), ('bench_recep', 'recepcionista'))
+
+NOMBRES = (
+    'Camila', 'Benjamín', 'Valentina', 'Matías', 'Francisca', 'Vicente', 'Javiera', 'Joaquín',
+    'Catalina', 'Tomás', 'Fernanda', 'Diego', 'Constanza', 'Sebastián', 'Antonia', 'Cristóbal',
+)
+APELLIDOS = (
+    'González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez',
+    'Sepúlveda', 'Morales', 'Rodríguez', 'López', 'Fuentes', 'Hernández', 'Torres', 'Araya',
+)
+CALLES = (
+    'Av. Libertador Bernardo O\'Higgins', 'Av. Providencia', 'Los Carrera', 'Arturo Prat',
+    'Manuel Rodríguez', 'Colón', 'San Martín', 'Independencia', 'Baquedano', 'Freire',
+)
+MOTOS = {
+    'Honda': ('CB190R', 'XR150L', 'Wave 110S'),
+    'Yamaha': ('FZ 2.0', 'YBR125', 'XTZ125'),
+    'Suzuki': ('GN125', 'AX100'),
+    'Bajaj': ('Pulsar NS200', 'Boxer 150'),
+}
+# Letras de las patentes chilenas (sin vocales ni M, N, Ñ, Q)
+LETRAS_PATENTE = 'BCDFGHJKLPRSTVWXYZ'
+
+PESOS_TIPO = {'DIRECTO': 50, 'RECETA': 30, 'TRASLADO': 15, 'REENVIO': 5}
+# EN_PROCESO solo aparece el último día, a lo más una vez por motorista,
+# para respetar las restricciones únicas de Movimiento
+PESOS_ESTADO = {'COMPLETADO': 90, 'ANULADO': 10}
+
+# Despachos entre las 8:00 y las 22:00, con peaks a mediodía y al salir del trabajo
+PESOS_HORA = {
+    8: 4, 9: 6, 10: 8, 11: 10, 12: 11, 13: 9, 14: 7,
+    15: 7, 16: 8, 17: 10, 18: 11, 19: 9, 20: 6, 21: 3,
+}
+# Lunes a domingo
+PESOS_DIA_SEMANA = (1.0, 1.0, 1.0, 1.0, 1.1, 0.8, 0.4)
+# El último día tiene un 30% más de volumen que el primero
+CRECIMIENTO = 0.3
+
+
+def digito_verificador(numero):
+    """Dígito verificador del RUT (módulo 11)"""
+    suma, factor = 0, 2
+    while numero:
+        suma += (numero % 10) * factor
+        numero //= 10
+        factor = factor + 1 if factor < 7 else 2
+    resto = 11 - suma % 11
+    return {11: '0', 10: 'K'}.get(resto, str(resto))
+
+
+def rut(numero):
+    return f"{numero}-{digito_verificador(numero)}"
+
+
+def patente(indice_moto):
+    """Patente única BBBB12 a partir de un índice (hasta 10 millones)"""
+    numero, letras = indice_moto % 100, indice_moto // 100
+    texto = ''
+    for _ in range(4):
+        letras, resto = divmod(letras, len(LETRAS_PATENTE))
+        texto = LETRAS_PATENTE[resto] + texto
+    return f"{texto}{numero:02d}"
+
+
+def _elegir(rng, pesos):
+    return rng.choices(list(pesos), weights=list(pesos.values()))[0]
+
+
+def _persona(rng):
+    return f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}"
+
+
+def _direccion(rng):
+    return f"{rng.choice(CALLES)} {rng.randint(100, 9999)}"
+
+
+def _moto(rng, patente_moto):
+    marca = rng.choice(list(MOTOS))
+    return Moto(patente=patente_moto, marca=marca, modelo=rng.choice(MOTOS[marca]), anio=rng.randint(2015, 2025))
+
+
+@contextmanager
+def fechas_manuales(modelo, *campos):
+    """Desactiva auto_now / auto_now_add para escribir fechas históricas"""
+    fields = [modelo._meta.get_field(campo) for campo in campos]
+    previos = [(f.auto_now, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, (auto_now, auto_now_add) in zip(fields, previos):
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+def _crear_por_lotes(modelo, objetos, lote):
+    pendientes = []
+    total = 0
+    for objeto in objetos:
+        pendientes.append(objeto)
+        if len(pendientes) >= lote:
+            modelo.objects.bulk_create(pendientes)
+            total += len(pendientes)
+            pendientes = []
+    if pendientes:
+        modelo.objects.bulk_create(pendientes)
+        total += len(pendientes)
+    return total
+
+
+# =====================================================
+# CATÁLOGOS E HISTORIAL DE ASIGNACIONES
+# =====================================================
+
+def sembrar_usuarios():
+    for username, rol in USUARIOS:
+        if not User.objects.filter(username=username).exists():
+            user = User.objects.create_user(username=username, password=CLAVE_USUARIOS)
+            UsuarioRol.objects.create(usuario=user, rol=rol)
+
+
+def sembrar_farmacias(rng, cantidad):
+    """Farmacias repartidas por turno entre todas las regiones"""
+    regiones = [region for region, _ in Farmacia.REGIONES]
+    base = Farmacia.objects.count()
+    farmacias = []
+    for i in range(cantidad):
+        region = regiones[i % len(regiones)]
+        provincia = rng.choice(territorio.PROVINCIAS_POR_REGION[region])
+        comuna = rng.choice(territorio.COMUNAS_POR_PROVINCIA[provincia])
+        numero = base + i + 1
+        farmacias.append(Farmacia(
+            nombre=f"Farmacia {comuna} {numero}", direccion=_direccion(rng),
+            telefono=f"+569{rng.randint(10000000, 99999999)}", correo=f"farmacia{numero}@logico.cl",
+            region=region, provincia=provincia, comuna=comuna,
+        ))
+    Farmacia.objects.bulk_create(farmacias)
+    return list(Farmacia.objects.order_by('pk').values_list('pk', flat=True))[base:]
+
+
+def cortes_historial(inicio, dias, historial):
+    """Fechas en que todos los motoristas cambian de asignación dentro del periodo"""
+    return [inicio + timedelta(days=dias * (j + 1) // (historial + 1)) for j in range(historial)]
+
+
+def sembrar_catalogos(rng, farmacias, motoristas, motos, inicio, dias, historial=HISTORIAL):
+    """
+    Farmacias, motos, motoristas y su historial de asignaciones. Devuelve la
+    plantilla que usan los movimientos:
+    {'cortes': [fecha, ...], 'motoristas': [(pk, peso, [(farmacia_id, moto_id) por tramo]), ...]}
+    """
+    farmacia_ids = sembrar_farmacias(rng, farmacias)
+    base_moto = Moto.objects.count()
+    Moto.objects.bulk_create([_moto(rng, patente(base_moto + i)) for i in range(motos)])
+    # Cada motorista recibe una moto propia; las motos que sobran quedan libres
+    moto_ids = list(Moto.objects.order_by('pk').values_list('pk', flat=True))[base_moto:base_moto + motoristas]
+
+    cortes = cortes_historial(inicio, dias, historial)
+    historias = []
+    for i in range(motoristas):
+        # En el tramo j (el último es el actual) las motos rotan j posiciones
+        historia = [
+            (rng.choice(farmacia_ids), moto_ids[(i + historial - j) % len(moto_ids)] if i < len(moto_ids) else None)
+            for j in range(historial + 1)
+        ]
+        historias.append(historia)
+
+    base_rut = 10_000_000 + Motorista.objects.count()
+    ruts = [rut(base_rut + i) for i in range(motoristas)]
+    Motorista.objects.bulk_create([
+        Motorista(
+            nombre=_persona(rng), rut=ruts[i], telefono=f"+569{rng.randint(10000000, 99999999)}",
+            correo=f"motorista{base_rut + i}@logico.cl", licencia=rng.choice(('C1', 'C2', 'C3')),
+            fecha_ingreso=inicio - timedelta(days=rng.randint(0, 1500)),
+            farmacia_id=historia[-1][0], moto_id=historia[-1][1],
+        )
+        for i, historia in enumerate(historias)
+    ])
+    filas = list(Motorista.objects.filter(rut__in=ruts).order_by('pk').values_list('pk', 'fecha_ingreso'))
+
+    asignaciones_farmacia, asignaciones_moto = [], []
+    for (pk, ingreso), historia in zip(filas, historias):
+        desdes = [ingreso, *cortes]
+        for j, (farmacia_id, moto_id) in enumerate(historia):
+            actual = j == historial
+            fechas = {
+                'fecha_asignacion': desdes[j],
+                'fecha_fin': None if actual else cortes[j],
+                'activa': actual,
+            }
+            asignaciones_farmacia.append(AsignacionFarmacia(motorista_id=pk, farmacia_id=farmacia_id, **fechas))
+            if moto_id:
+                asignaciones_moto.append(AsignacionMoto(motorista_id=pk, moto_id=moto_id, **fechas))
+    with fechas_manuales(AsignacionFarmacia, 'fecha_asignacion'), fechas_manuales(AsignacionMoto, 'fecha_asignacion'):
+        AsignacionFarmacia.objects.bulk_create(asignaciones_farmacia, batch_size=LOTE)
+        AsignacionMoto.objects.bulk_create(asignaciones_moto, batch_size=LOTE)
+
+    return {
+        'cortes': cortes,
+        # Algunos motoristas despachan bastante más que otros
+        'motoristas': [(pk, rng.uniform(0.5, 1.5), historia) for (pk, _), historia in zip(filas, historias)],
+    }
+
+
+# =====================================================
+# MOVIMIENTOS
+# =====================================================
+
+def conteos_por_dia(cantidad, dias, hasta):
+    """[(fecha, movimientos)] que suman exactamente `cantidad`"""
+    fechas = [hasta - timedelta(days=dias - 1 - d) for d in range(dias)]
+    pesos = [
+        PESOS_DIA_SEMANA[fecha.weekday()] * (1 + CRECIMIENTO * d / max(dias - 1, 1))
+        for d, fecha in enumerate(fechas)
+    ]
+    total = sum(pesos)
+    conteos, previo = [], 0
+    for fecha, acumulado in zip(fechas, accumulate(pesos)):
+        hasta_aqui = round(acumulado * cantidad / total)
+        conteos.append((fecha, hasta_aqui - previo))
+        previo = hasta_aqui
+    return conteos
+
+
+def tramos(cantidad, dias, hasta):
+    """Trabajos de TRAMO_DIAS días: (número, primer índice de código, [(fecha, movimientos)])"""
+    conteos = conteos_por_dia(cantidad, dias, hasta)
+    resultado, indice_codigo = [], 0
+    for numero, desde in enumerate(range(0, dias, TRAMO_DIAS)):
+        dias_tramo = conteos[desde:desde + TRAMO_DIAS]
+        resultado.append((numero, indice_codigo, dias_tramo))
+        indice_codigo += sum(n for _, n in dias_tramo)
+    return resultado
+
+
+def _generar_tramo(plantilla, semilla, numero, indice_codigo, dias_tramo, ultimo_dia):
+    rng = random.Random(f"{semilla}:{numero}")
+    zona = timezone.get_current_timezone()
+    motoristas = plantilla['motoristas']
+    cortes = plantilla['cortes']
+    acumulados = list(accumulate(peso for _, peso, _ in motoristas))
+    horas = list(PESOS_HORA)
+    pesos_hora = list(accumulate(PESOS_HORA.values()))
+    en_proceso = set()
+
+    i = indice_codigo
+    for fecha, cantidad in dias_tramo:
+        medianoche = timezone.make_aware(datetime.combine(fecha, time.min), zona)
+        segundos = sorted(
+            hora * 3600 + rng.randrange(3600) for hora in rng.choices(horas, cum_weights=pesos_hora, k=cantidad)
+        )
+        tramo_historial = bisect_right(cortes, fecha)
+        for segundo in segundos:
+            motorista_id, _, historia = rng.choices(motoristas, cum_weights=acumulados)[0]
+            farmacia_id, moto_id = historia[tramo_historial]
+            registro = medianoche + timedelta(seconds=segundo)
+            estado = _elegir(rng, PESOS_ESTADO)
+            if fecha == ultimo_dia and moto_id and motorista_id not in en_proceso and rng.random() < 0.5:
+                en_proceso.add(motorista_id)
+                estado = 'EN_PROCESO'
+            yield Movimiento(
+                codigo=f"S{semilla}-{i:010d}", tipo=_elegir(rng, PESOS_TIPO), estado=estado,
+                descripcion=None if rng.random() < 0.6 else f"Pedido {rng.randint(1000, 99999)}",
+                fecha_registro=registro, fecha_actualizacion=registro,
+                farmacia_origen_id=farmacia_id, destino=_direccion(rng),
+                motorista_id=motorista_id, moto_id=moto_id,
+            )
+            i += 1
+
+
+def sembrar_tramo(plantilla, semilla, tramo, ultimo_dia, lote=LOTE):
+    numero, indice_codigo, dias_tramo = tramo
+    with fechas_manuales(Movimiento, 'fecha_registro', 'fecha_actualizacion'):
+        return _crear_por_lotes(
+            Movimiento, _generar_tramo(plantilla, semilla, numero, indice_codigo, dias_tramo, ultimo_dia), lote,
+        )
+
+
+# Estado de cada proceso del pool (se recibe una vez, no con cada tramo)
+_proceso = {}
+
+
+def _iniciar_proceso(plantilla, semilla, ultimo_dia, lote):
+    import django
+    django.setup()
+    _proceso.update(plantilla=plantilla, semilla=semilla, ultimo_dia=ultimo_dia, lote=lote)
+
+
+def _sembrar_tramo_en_proceso(tramo):
+    return sembrar_tramo(_proceso['plantilla'], _proceso['semilla'], tramo, _proceso['ultimo_dia'], _proceso['lote'])
+
+
+def sembrar_movimientos(plantilla, cantidad, dias, hasta, semilla, lote=LOTE, procesos=1, avance=None):
+    """
+    `cantidad` movimientos en los `dias` que terminan en `hasta`. Con
+    procesos > 1 los tramos se reparten en un multiprocessing.Pool; en
+    SQLite se usa siempre un proceso porque la base admite un solo escritor.
+    `avance(creados)` se llama al terminar cada tramo.
+    """
+    trabajos = tramos(cantidad, dias, hasta)
+    if connection.vendor == 'sqlite':
+        procesos = 1
+
+    creados = 0
+    if procesos <= 1:
+        for tramo in trabajos:
+            creados += sembrar_tramo(plantilla, semilla, tramo, hasta, lote)
+            if avance:
+                avance(creados)
+        return creados
+
+    import multiprocessing
+
+    # 'spawn' para que los hijos no hereden la conexión abierta del padre
+    contexto = multiprocessing.get_context('spawn')
+    with contexto.Pool(procesos, _iniciar_proceso, (plantilla, semilla, hasta, lote)) as pool:
+        for escritos in pool.imap_unordered(_sembrar_tramo_en_proceso, trabajos):
+            creados += escritos
+            if avance:
+                avance(creados)
+    return creados
+
+
+def sembrar(
+    movimientos=1000, farmacias=20, motoristas=50, motos=None, dias=365, semilla=0, hasta=None,
+    historial=HISTORIAL, lote=LOTE, procesos=1, avance=None,
+):
+    """
+    Siembra usuarios, catálogos, historial de asignaciones y movimientos.
+    Devuelve los totales creados. Los códigos de movimiento dependen solo
+    de la semilla (S<semilla>-0000000000), así que cada semilla se puede
+    sembrar una sola vez por base.
+    """
+    rng = random.Random(semilla)
+    hasta = hasta or timezone.localdate()
+    inicio = hasta - timedelta(days=dias - 1)
+    motos = motoristas + max(1, motoristas // 10) if motos is None else motos
+
+    sembrar_usuarios()
+    plantilla = sembrar_catalogos(rng, farmacias, motoristas, motos, inicio, dias, historial)
+    creados = sembrar_movimientos(plantilla, movimientos, dias, hasta, semilla, lote, procesos, avance)
+
+    reconstruir_resumen()
+    invalidar_todo()
+    indice.invalidar()
+    return {
+        'farmacias': farmacias,
+        'motos': motos,
+        'motoristas': motoristas,
+        'movimientos': creados,
+    }
@@ -1,40 +1,247 @@
-from django.db.models.signals import post_migrate
-from django.contrib.auth.models import User
+"""
+Señales de la app.
+
+Mantienen la tabla resumen de movimientos (ResumenMovimientoDiario), las
+versiones de periodo del cache de reportes (VersionPeriodo), la moto y
+farmacia vigentes de cada motorista y el índice de despacho al día con
+cada alta, cambio o baja hecha a través del ORM, publican esos cambios
+a los listados en vivo y dejan las lápidas del feed de cambios.
+Los usuarios por defecto se crean en App.apps.create_default_users.
+"""
+from collections import Counter
+
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
-from App.models import UsuarioRol
-
-@receiver(post_migrate)
-def crear_usuarios_por_defecto(sender, **kwargs):
-    if sender.name != 'App':
-        return
-
-    usuarios_por_defecto = [
-        {
-            'username': 'root',
-            'email': 'root@logico.com',
-            'password': 'Root123@',
-            'rol': 'admin',
-        },
-        {
-            'username': 'admin',
-            'email': 'admin@logico.com',
-            'password': 'Admin123@',
-            'rol': 'admin',
-        },
-        {
-            'username': 'recepcionista',
-            'email': 'recep@logico.com',
-            'password': 'Recep123@',
-            'rol': 'recepcionista',
-        },
-    ]
-
-    for u in usuarios_por_defecto:
-        if not User.objects.filter(username=u['username']).exists():
-            user = User.objects.create_user(
-                username=u['username'],
-                email=u['email'],
-                password=u['password']
-            )
-            UsuarioRol.objects.create(user=user, rol=u['rol'])
-            print(f"✔ Usuario creado: {u['username']}")
+from django.utils import timezone
+
+from App.cache_reportes import incrementar_versiones, invalidar_todo
+from App.codigos import asignador
+from App.despacho import indice
+from App.eventos import datos_movimiento, publicar
+from App.models import (
+    AsignacionFarmacia, AsignacionMoto, Farmacia, Moto, Motorista, Movimiento, MovimientoEliminado,
+    TransicionMovimiento,
+)
+from App.resumen import ajustar_resumen, clave_de_movimiento, clave_resumen, mover_resumen_farmacia
+
+
+CAMPOS_CLAVE = ('fecha_registro', 'farmacia_origen_id', 'tipo', 'estado')
+
+
+@receiver(pre_save, sender=Movimiento)
+def asignar_codigo(sender, instance, raw=False, **kwargs):
+    """Movimientos sin código (API, admin, scripts) reciben uno de la secuencia"""
+    if not raw and not instance.codigo:
+        instance.codigo = asignador.siguiente(instance.farmacia_origen_id)
+
+
+@receiver(pre_save, sender=Movimiento)
+def recordar_clave_anterior(sender, instance, raw=False, **kwargs):
+    """Guarda la clave del resumen antes del cambio para poder descontarla"""
+    instance._clave_resumen_anterior = None
+    instance._asignados_anteriores = (None, None)
+    if raw or instance.pk is None:
+        return
+    anterior = sender.objects.filter(pk=instance.pk).values_list(*CAMPOS_CLAVE, 'motorista_id', 'moto_id').first()
+    if anterior:
+        instance._clave_resumen_anterior = clave_resumen(*anterior[:4])
+        instance._asignados_anteriores = anterior[4:]
+
+
+@receiver(post_save, sender=Movimiento)
+def actualizar_resumen_al_guardar(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = Counter()
+    deltas[clave_de_movimiento(instance)] += 1
+    anterior = getattr(instance, '_clave_resumen_anterior', None)
+    if anterior is not None:
+        deltas[anterior] -= 1
+    ajustar_resumen(deltas)
+    incrementar_versiones([instance.fecha_registro])
+
+
+@receiver(post_save, sender=Movimiento)
+def registrar_transicion(sender, instance, created, raw=False, **kwargs):
+    """Bitácora de estados para los guardados uno a uno (los lotes la escriben en App/transiciones.py)"""
+    anterior = getattr(instance, '_clave_resumen_anterior', None)
+    if raw or created or anterior is None or anterior[3] == instance.estado:
+        return
+    TransicionMovimiento.objects.create(
+        movimiento=instance, estado_anterior=anterior[3], estado_nuevo=instance.estado,
+        version=instance.version, usuario=getattr(instance, '_usuario', ''),
+    )
+
+
+@receiver(pre_delete, sender=Movimiento)
+def recordar_clave_al_borrar(sender, instance, **kwargs):
+    instance._clave_resumen_anterior = clave_de_movimiento(instance)
+
+
+@receiver(post_delete, sender=Movimiento)
+def actualizar_resumen_al_borrar(sender, instance, **kwargs):
+    ajustar_resumen({instance._clave_resumen_anterior: -1})
+    incrementar_versiones([instance.fecha_registro])
+
+
+@receiver(post_delete, sender=Movimiento)
+def registrar_lapida(sender, instance, **kwargs):
+    """Deja la baja en MovimientoEliminado para el feed de cambios (App/sincronizacion.py)"""
+    MovimientoEliminado.objects.create(movimiento_id=instance.pk, codigo=instance.codigo)
+
+
+@receiver(pre_delete, sender=Farmacia)
+def trasladar_resumen_farmacia(sender, instance, **kwargs):
+    mover_resumen_farmacia(instance.pk)
+
+
+@receiver(pre_save, sender=Farmacia)
+@receiver(pre_save, sender=Motorista)
+def recordar_nombre_anterior(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._nombre_anterior = None
+    if raw or instance._state.adding or (update_fields is not None and 'nombre' not in update_fields):
+        return
+    instance._nombre_anterior = sender.objects.filter(pk=instance.pk).values_list('nombre', flat=True).first()
+
+
+@receiver(post_save, sender=Farmacia)
+@receiver(post_save, sender=Motorista)
+def invalidar_cache_reportes(sender, instance, created, raw=False, **kwargs):
+    """
+    Los nombres de farmacia y motorista salen en todos los PDF: solo un
+    cambio de nombre invalida el cache. Las altas aún no tienen movimientos.
+    """
+    anterior = getattr(instance, '_nombre_anterior', None)
+    if not raw and not created and anterior is not None and anterior != instance.nombre:
+        invalidar_todo()
+
+
+@receiver(post_delete, sender=Farmacia)
+@receiver(post_delete, sender=Motorista)
+def invalidar_cache_reportes_al_borrar(sender, instance, **kwargs):
+    # Sus movimientos quedan sin nombre en el PDF
+    invalidar_todo()
+
+
+# =====================================================
+# ASIGNACIONES -> MOTORISTA
+# =====================================================
+# Motorista.moto y Motorista.farmacia reflejan la asignación activa. La
+# sincronización va en un solo sentido: editar el motorista no crea ni
+# cierra asignaciones.
+
+@receiver(post_save, sender=AsignacionMoto)
+@receiver(post_delete, sender=AsignacionMoto)
+def sincronizar_moto_motorista(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    activa = AsignacionMoto.objects.filter(motorista_id=instance.motorista_id, activa=True)
+    Motorista.objects.filter(pk=instance.motorista_id).update(
+        moto_id=activa.values_list('moto_id', flat=True).first(), fecha_actualizacion=timezone.now(),
+    )
+
+
+@receiver(post_save, sender=AsignacionFarmacia)
+@receiver(post_delete, sender=AsignacionFarmacia)
+def sincronizar_farmacia_motorista(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    activa = AsignacionFarmacia.objects.filter(motorista_id=instance.motorista_id, activa=True)
+    Motorista.objects.filter(pk=instance.motorista_id).update(
+        farmacia_id=activa.values_list('farmacia_id', flat=True).first(), fecha_actualizacion=timezone.now(),
+    )
+
+
+# =====================================================
+# FECHA DE ACTUALIZACIÓN (ETag de la API)
+# =====================================================
+# on_delete=SET_NULL se aplica con un UPDATE que no pasa por auto_now: las
+# filas que apuntaban al borrado cambian y su ETag también debe cambiar.
+
+@receiver(pre_delete, sender=Farmacia)
+@receiver(pre_delete, sender=Moto)
+@receiver(pre_delete, sender=Motorista)
+def tocar_dependientes(sender, instance, **kwargs):
+    ahora = timezone.now()
+    for relacion in sender._meta.related_objects:
+        dependiente = relacion.related_model
+        if relacion.on_delete is not models.SET_NULL or not hasattr(dependiente, 'fecha_actualizacion'):
+            continue
+        dependiente._base_manager.filter(**{relacion.field.name: instance}).update(fecha_actualizacion=ahora)
+
+
+# =====================================================
+# ÍNDICE DE DESPACHO
+# =====================================================
+
+def refrescar_despacho(motoristas=(), motos=()):
+    """Refresca el índice cuando la transacción se confirma"""
+    def refrescar():
+        for pk in set(motoristas):
+            indice.refrescar_motorista(pk)
+        for pk in set(motos):
+            indice.refrescar_moto(pk)
+    transaction.on_commit(refrescar)
+
+
+@receiver(post_save, sender=Movimiento)
+@receiver(post_delete, sender=Movimiento)
+def despacho_movimiento(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    motorista_anterior, moto_anterior = getattr(instance, '_asignados_anteriores', (None, None))
+    refrescar_despacho(
+        [instance.motorista_id, motorista_anterior],
+        [instance.moto_id, moto_anterior],
+    )
+
+
+@receiver(post_save, sender=Motorista)
+@receiver(post_delete, sender=Motorista)
+def despacho_motorista(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refrescar_despacho([instance.pk])
+
+
+@receiver(post_save, sender=Moto)
+@receiver(post_delete, sender=Moto)
+def despacho_moto(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refrescar_despacho(motos=[instance.pk])
+
+
+@receiver(post_save, sender=AsignacionFarmacia)
+@receiver(post_delete, sender=AsignacionFarmacia)
+@receiver(post_save, sender=AsignacionMoto)
+@receiver(post_delete, sender=AsignacionMoto)
+def despacho_asignacion(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refrescar_despacho([instance.motorista_id])
+
+
+# =====================================================
+# EVENTOS EN VIVO (App/eventos.py)
+# =====================================================
+
+@receiver(post_save, sender=Movimiento)
+def publicar_movimiento_guardado(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_clave_resumen_anterior', None)
+    estado_anterior = anterior[3] if anterior else None
+    if created:
+        evento = 'creado'
+    elif estado_anterior != instance.estado:
+        evento = 'estado'
+    else:
+        evento = 'actualizado'
+    datos = datos_movimiento(instance, estado_anterior)
+    transaction.on_commit(lambda: publicar(evento, datos))
+
+
+@receiver(post_delete, sender=Movimiento)
+def publicar_movimiento_eliminado(sender, instance, **kwargs):
+    datos = datos_movimiento(instance)
+    transaction.on_commit(lambda: publicar('eliminado', datos))
+
@@ -0,0 +1,149 @@
+"""
+Feed de cambios de Movimiento para los clientes que sincronizan (app
+móvil, integraciones): GET /api_movimientos/cambios/?since=<cursor>
+
+En vez de descargar todo /api_movimientos/ para ver qué cambió, el
+cliente guarda el cursor 'siguiente' de cada respuesta y en la próxima
+llamada recibe solo lo posterior:
+
+- 'cambios': altas y modificaciones, por (fecha_actualizacion, id) con el
+  índice mov_actualizacion_id_idx.
+- 'eliminados': ids de MovimientoEliminado (lápidas que deja la señal
+  post_delete), por (fecha_eliminacion, id).
+
+Sin since se parte desde el principio, y con 'hay_mas' el cliente sigue
+pidiendo hasta ponerse al día. El cursor lleva la posición de ambas
+colas.
+
+Una transacción que tomó su fecha_actualizacion antes del cursor pero
+hizo commit después quedaría saltada para siempre. Por eso solo se lee
+hasta el inicio de la transacción abierta más antigua (PostgreSQL,
+pg_stat_activity) menos SINCRONIZACION_RETRASO_SEGUNDOS, que cubre la
+distancia entre el reloj de la app y el de la base. Las escrituras
+masivas (transiciones, lotes) ponen la fecha con Now() de la base, el
+inicio de su transacción.
+
+Las lápidas duran SINCRONIZACION_DIAS_ELIMINADOS y las borra
+`manage.py purgar_vencidos`; un cursor más viejo recibe 410 y el cliente
+debe volver a sincronizar desde cero.
+"""
+import base64
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .listados import _filtro_keyset, codificar_cursor
+from .models import Movimiento, MovimientoEliminado
+
+TAMANO = 200
+TAMANO_MAXIMO = 1000
+
+ORDEN_CAMBIOS = ('fecha_actualizacion', 'id')
+ORDEN_ELIMINADOS = ('fecha_eliminacion', 'id')
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+class CursorVencido(Exception):
+    """Las lápidas posteriores al cursor ya se purgaron"""
+
+
+def _posicion(fecha, pk):
+    if fecha is None:
+        return None
+    fecha = parse_datetime(fecha)
+    # codificar() siempre escribe la zona horaria: sin ella el cursor no es nuestro
+    if fecha is None or timezone.is_naive(fecha):
+        raise CursorInvalido('Fecha inválida en el cursor')
+    return fecha, int(pk)
+
+
+def decodificar(cursor):
+    """(posición en cambios, posición en eliminados); cada una (fecha, id) o None, no ambas"""
+    try:
+        cambios_fecha, cambios_id, eliminados_fecha, eliminados_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        posiciones = _posicion(cambios_fecha, cambios_id), _posicion(eliminados_fecha, eliminados_id)
+    except CursorInvalido:
+        raise
+    except Exception as error:
+        raise CursorInvalido('Cursor inválido') from error
+    if posiciones == (None, None):
+        raise CursorInvalido('Cursor sin posición')
+    return posiciones
+
+
+def codificar(cambios, eliminados):
+    return codificar_cursor([*(cambios or (None, None)), *(eliminados or (None, None))])
+
+
+def _despues(queryset, orden, posicion, tamano):
+    if posicion is not None:
+        queryset = queryset.filter(_filtro_keyset(orden, posicion))
+    # Una fila extra indica si quedan más
+    filas = list(queryset.order_by(*orden)[:tamano + 1])
+    return filas[:tamano], len(filas) > tamano
+
+
+def vencimiento_eliminados():
+    return timezone.now() - timedelta(days=settings.SINCRONIZACION_DIAS_ELIMINADOS)
+
+
+def purgar_eliminados():
+    """Borra las lápidas más viejas que SINCRONIZACION_DIAS_ELIMINADOS (comando purgar_vencidos)"""
+    borradas, _ = MovimientoEliminado.objects.filter(fecha_eliminacion__lt=vencimiento_eliminados()).delete()
+    return borradas
+
+
+def corte():
+    """Hasta qué fecha se puede leer sin saltarse transacciones que aún no hacen commit"""
+    hasta = timezone.now()
+    if connection.vendor == 'postgresql':
+        # Solo ve las sesiones del mismo usuario de base (o con pg_read_all_stats)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT min(xact_start) FROM pg_stat_activity "
+                "WHERE datname = current_database() AND pid <> pg_backend_pid()"
+            )
+            inicio = cursor.fetchone()[0]
+        if inicio is not None:
+            hasta = min(hasta, inicio)
+    return hasta - timedelta(seconds=settings.SINCRONIZACION_RETRASO_SEGUNDOS)
+
+
+def pagina(since=None, tamano=TAMANO, queryset=None):
+    """
+    {'cambios': [Movimiento], 'eliminados': [id], 'siguiente': cursor, 'hay_mas': bool}.
+    Lanza CursorInvalido o CursorVencido.
+    """
+    tamano = max(1, min(tamano, TAMANO_MAXIMO))
+    pos_cambios, pos_eliminados = decodificar(since) if since else (None, None)
+    if since and (pos_eliminados or pos_cambios)[0] < vencimiento_eliminados():
+        raise CursorVencido()
+
+    hasta = corte()
+    queryset = Movimiento.objects.all() if queryset is None else queryset
+    cambios, mas_cambios = _despues(queryset.filter(fecha_actualizacion__lte=hasta), ORDEN_CAMBIOS, pos_cambios, tamano)
+    eliminados, mas_eliminados = _despues(
+        MovimientoEliminado.objects.filter(fecha_eliminacion__lte=hasta), ORDEN_ELIMINADOS, pos_eliminados, tamano,
+    )
+
+    if cambios:
+        pos_cambios = (cambios[-1].fecha_actualizacion, cambios[-1].pk)
+    if eliminados:
+        pos_eliminados = (eliminados[-1].fecha_eliminacion, eliminados[-1].pk)
+    # Al día con las lápidas el cursor avanza igual hasta 'hasta': un cliente
+    # que sincroniza seguido no se vence solo porque no hubo eliminaciones
+    if not mas_eliminados and (pos_eliminados is None or pos_eliminados < (hasta, 0)):
+        pos_eliminados = (hasta, 0)
+    return {
+        'cambios': cambios,
+        'eliminados': [eliminado.movimiento_id for eliminado in eliminados],
+        'siguiente': codificar(pos_cambios, pos_eliminados),
+        'hay_mas': mas_cambios or mas_eliminados,
+    }
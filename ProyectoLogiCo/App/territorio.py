@@ -0,0 +1,81 @@
+"""
+División político-administrativa de Chile (región → provincia → comuna).
+
+El dataset (App/data/division_politica.json) se carga una sola vez al
+importar el módulo en estructuras inmutables con los nombres internados.
+Las respuestas JSON de los combos también se serializan aquí una vez, y
+su ETag es el hash del dataset: cambia solo si cambia el archivo.
+"""
+import hashlib
+import json
+import sys
+from pathlib import Path
+from types import MappingProxyType
+
+ARCHIVO = Path(__file__).resolve().parent / 'data' / 'division_politica.json'
+
+
+def _cargar():
+    contenido = ARCHIVO.read_bytes()
+    datos = json.loads(contenido)
+    provincias = {}
+    comunas = {}
+    for region, por_provincia in datos.items():
+        region = sys.intern(region)
+        provincias[region] = tuple(sys.intern(p) for p in por_provincia)
+        for provincia, lista in por_provincia.items():
+            comunas[sys.intern(provincia)] = tuple(sys.intern(c) for c in lista)
+    etag = hashlib.sha256(contenido).hexdigest()[:32]
+    return MappingProxyType(provincias), MappingProxyType(comunas), etag
+
+
+PROVINCIAS_POR_REGION, COMUNAS_POR_PROVINCIA, ETAG = _cargar()
+
+
+def _json(datos):
+    return json.dumps(datos, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+# Cuerpos de respuesta ya serializados
+_VACIO = MappingProxyType({
+    'provincias': _json({'provincias': []}),
+    'comunas': _json({'comunas': []}),
+    'division': _json({}),
+})
+_ARBOL = {
+    region: {p: list(COMUNAS_POR_PROVINCIA[p]) for p in provincias}
+    for region, provincias in PROVINCIAS_POR_REGION.items()
+}
+_PROVINCIAS = MappingProxyType({
+    region: _json({'provincias': list(provincias)})
+    for region, provincias in PROVINCIAS_POR_REGION.items()
+})
+_COMUNAS = MappingProxyType({
+    provincia: _json({'comunas': list(comunas)})
+    for provincia, comunas in COMUNAS_POR_PROVINCIA.items()
+})
+_DIVISION = MappingProxyType({region: _json({region: arbol}) for region, arbol in _ARBOL.items()})
+_DIVISION_COMPLETA = _json(_ARBOL)
+del _ARBOL
+
+
+def json_provincias(region):
+    return _PROVINCIAS.get(region, _VACIO['provincias'])
+
+
+def json_comunas(provincia):
+    return _COMUNAS.get(provincia, _VACIO['comunas'])
+
+
+def json_division(region=None):
+    """{región: {provincia: [comunas]}} de una región, o de todas sin región"""
+    if not region:
+        return _DIVISION_COMPLETA
+    return _DIVISION.get(region, _VACIO['division'])
+
+
+def comuna_valida(region, provincia, comuna):
+    return (
+        provincia in PROVINCIAS_POR_REGION.get(region, ())
+        and comuna in COMUNAS_POR_PROVINCIA.get(provincia, ())
+    )
@@ -1,3 +1,1545 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import re
+import tempfile
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Max
+from django.http import FileResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from .asignaciones import asignaciones_entre, motoristas_de_motos_en, solapamientos
+from .cache_reportes import CacheReportes, claves_periodo
+from .codigos import AsignadorCodigos, asignador as asignador_codigos
+from .despacho import indice as indice_despacho
+from .eventos import BackendMemoria, flujo_eventos
+from .forms import AsignacionMotoForm, FarmaciaForm
+from .importacion import importar, leer_filas
+from .listados import LISTADOS, TAMANO_PAGINA, codificar_cursor
+from .metricas import registro as registro_metricas
+from .models import (
+    AsignacionFarmacia, AsignacionMoto, Farmacia, Moto, Motorista, Movimiento, MovimientoEliminado,
+    ReporteMovimiento, ResumenMovimientoDiario, SecuenciaCodigo, SolicitudIdempotente, TrabajoReporte,
+    TransicionMovimiento, UsuarioRol, VersionDesactualizada, VersionPeriodo,
+)
+from .reportes import filtrar_periodo, generar_pdf_movimientos
+from .resumen import reconstruir_resumen, resumen_periodo
+from .sembrado import patente, rut, sembrar
+from .trabajos import ejecutar_trabajo, reencolar_colgados, renovar_latidos, tomar_trabajo
+from .transiciones import transicionar
+
+
+def crear_usuario(username, rol):
+    user = User.objects.create_user(username=username, password='Clave123@')
+    UsuarioRol.objects.create(usuario=user, rol=rol)
+    return user
+
+
+def directorios_temporales(test):
+    """Apunta REPORTES_DIR y REPORTES_CACHE_DIR a carpetas temporales del test"""
+    directorio = tempfile.TemporaryDirectory()
+    test.addCleanup(directorio.cleanup)
+    configuracion = override_settings(
+        REPORTES_DIR=directorio.name, REPORTES_CACHE_DIR=f"{directorio.name}/cache"
+    )
+    configuracion.enable()
+    test.addCleanup(configuracion.disable)
+    return directorio.name
+
+
+def crear_movimientos(cantidad, inicio=0):
+    farmacia = Farmacia.objects.create(
+        nombre=f'Farmacia {inicio}', direccion='Calle 1', telefono='123',
+        correo='f@logico.com', region='Metropolitana de Santiago',
+        provincia='Santiago', comuna='Santiago',
+    )
+    moto = Moto.objects.create(patente=f'AB{inicio:04d}', marca='Honda', modelo='CB', anio=2020)
+    motorista = Motorista.objects.create(
+        nombre=f'Motorista {inicio}', rut=f'{inicio}-K', telefono='123', correo='m@logico.com',
+        licencia='C1', fecha_ingreso=date(2024, 1, 1), farmacia=farmacia, moto=moto,
+    )
+    # COMPLETADO: un motorista solo puede tener un movimiento EN_PROCESO
+    Movimiento.objects.bulk_create([
+        Movimiento(
+            codigo=f'MOV-{inicio + i}', tipo='DIRECTO', estado='COMPLETADO', destino='Destino',
+            farmacia_origen=farmacia, motorista=motorista, moto=moto,
+        )
+        for i in range(cantidad)
+    ])
+
+
+class MovimientoListTests(TestCase):
+    """Las vistas de listado hacen un número fijo de consultas por página"""
+
+    def setUp(self):
+        crear_usuario('admin_test', 'admin')
+        crear_usuario('recep_test', 'recepcionista')
+
+    def contar_consultas(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertConsultasConstantes(self, username, url_name):
+        self.client.login(username=username, password='Clave123@')
+        url = reverse(url_name)
+        crear_movimientos(3)
+        pocas = self.contar_consultas(url)
+        crear_movimientos(TAMANO_PAGINA, inicio=100)
+        muchas = self.contar_consultas(url)
+        self.assertEqual(pocas, muchas)
+
+    def test_movimiento_list_sin_n_mas_1(self):
+        self.assertConsultasConstantes('admin_test', 'movimiento_list')
+
+    def test_movimiento_list2_sin_n_mas_1(self):
+        self.assertConsultasConstantes('recep_test', 'movimiento_list2')
+
+    def test_paginacion_keyset_recorre_todo_sin_repetir(self):
+        self.client.login(username='admin_test', password='Clave123@')
+        crear_movimientos(TAMANO_PAGINA + 10)
+
+        primera = self.client.get(reverse('movimiento_list')).context['pagina']
+        self.assertEqual(len(primera), TAMANO_PAGINA)
+        self.assertIsNone(primera.url_anterior)
+
+        segunda = self.client.get(reverse('movimiento_list') + primera.url_siguiente).context['pagina']
+        self.assertEqual(len(segunda), 10)
+        self.assertIsNone(segunda.url_siguiente)
+
+        codigos = {m.codigo for m in primera} | {m.codigo for m in segunda}
+        self.assertEqual(len(codigos), TAMANO_PAGINA + 10)
+
+        volver = self.client.get(reverse('movimiento_list') + segunda.url_anterior).context['pagina']
+        self.assertEqual([m.pk for m in volver], [m.pk for m in primera])
+
+
+class ListadosCrudTests(TestCase):
+    """Filtros, búsqueda y orden de los listados CRUD se resuelven en la consulta"""
+
+    def setUp(self):
+        crear_usuario('admin_test', 'admin')
+        self.client.login(username='admin_test', password='Clave123@')
+        for i in range(TAMANO_PAGINA + 5):
+            crear_movimientos(0, inicio=i)
+        Farmacia.objects.filter(pk__in=Farmacia.objects.order_by('pk')[:3].values('pk')).update(
+            region='Biobío', comuna='Concepción',
+        )
+        Moto.objects.filter(patente='AB0004').update(disponible=False)
+
+    def test_listados_replican_el_admin(self):
+        for nombre, listado in LISTADOS.items():
+            modelo_admin = admin.site._registry[listado.modelo]
+            self.assertEqual(list(listado.filtros), list(modelo_admin.list_filter), nombre)
+            self.assertEqual(list(listado.busqueda), list(modelo_admin.search_fields), nombre)
+
+    def test_filtro_busqueda_y_orden(self):
+        url = reverse('farmacia_list')
+        pagina = self.client.get(url, {'region': 'Biobío', 'orden': '-nombre'}).context['pagina']
+        self.assertEqual([f.nombre for f in pagina], ['Farmacia 2', 'Farmacia 1', 'Farmacia 0'])
+
+        pagina = self.client.get(url, {'region': 'Biobío', 'q': 'farmacia 1'}).context['pagina']
+        self.assertEqual([f.nombre for f in pagina], ['Farmacia 1'])
+
+        pagina = self.client.get(reverse('moto_list'), {'disponible': '0'}).context['pagina']
+        self.assertEqual([m.patente for m in pagina], ['AB0004'])
+        # Un valor inválido se ignora en vez de fallar
+        pagina = self.client.get(reverse('moto_list'), {'disponible': 'talvez'}).context['pagina']
+        self.assertEqual(len(pagina), TAMANO_PAGINA)
+
+    def test_paginas_conservan_filtros(self):
+        url = reverse('motorista_list')
+        primera = self.client.get(url, {'licencia': 'C1', 'orden': 'rut'}).context['pagina']
+        self.assertEqual(len(primera), TAMANO_PAGINA)
+        self.assertIn('licencia=C1', primera.url_siguiente)
+        segunda = self.client.get(url + primera.url_siguiente).context['pagina']
+        self.assertEqual(len(segunda), 5)
+        ruts = [m.rut for m in primera] + [m.rut for m in segunda]
+        self.assertEqual(ruts, sorted(ruts))
+        self.assertEqual(len(set(ruts)), TAMANO_PAGINA + 5)
+
+    def test_asignaciones_sin_n_mas_1(self):
+        for motorista in Motorista.objects.all()[:5]:
+            AsignacionFarmacia.objects.create(motorista=motorista, farmacia=motorista.farmacia)
+        with CaptureQueriesContext(connection) as pocas:
+            self.client.get(reverse('asignacion_farmacia_list'), {'activa': '1'})
+        for motorista in Motorista.objects.all()[5:20]:
+            AsignacionFarmacia.objects.create(motorista=motorista, farmacia=motorista.farmacia)
+        with CaptureQueriesContext(connection) as muchas:
+            response = self.client.get(reverse('asignacion_farmacia_list'), {'activa': '1', 'q': 'motorista'})
+        self.assertEqual(len(response.context['pagina']), 20)
+        self.assertEqual(len(pocas), len(muchas))
+
+
+class MovimientoApiTests(TestCase):
+    """Paginación por cursor, ?fields= y ?expand= en /api_movimientos/"""
+
+    def setUp(self):
+        self.client.force_login(crear_usuario('api_test', 'admin'))
+        crear_movimientos(60)
+
+    def test_paginacion_por_cursor(self):
+        response = self.client.get('/api_movimientos/')
+        self.assertEqual(len(response.data['results']), 50)
+        self.assertIsNotNone(response.data['next'])
+
+        siguiente = self.client.get(response.data['next'])
+        self.assertEqual(len(siguiente.data['results']), 10)
+        self.assertIsNone(siguiente.data['next'])
+
+    def test_fields_proyecta_en_sql(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api_movimientos/?fields=codigo,estado')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'codigo', 'estado'})
+        sql = ctx.captured_queries[-1]['sql']
+        self.assertIn('"codigo"', sql)
+        self.assertNotIn('"descripcion"', sql)
+
+    def test_expand_en_un_solo_join(self):
+        # Sesión y usuario, más la consulta de agregados del ETag (CondicionalMixin)
+        with self.assertNumQueries(4):
+            response = self.client.get('/api_movimientos/?expand=motorista,moto')
+        fila = response.data['results'][0]
+        self.assertEqual(fila['motorista']['nombre'], 'Motorista 0')
+        self.assertEqual(fila['moto']['patente'], 'AB0000')
+
+
+class ReportePeriodoIndiceTests(TestCase):
+    """Los filtros de periodo usan los índices de fecha_registro"""
+
+    def setUp(self):
+        crear_movimientos(200)
+        hoy = timezone.localdate()
+        self.periodos = {
+            'DIARIO': {'fecha': hoy.isoformat()},
+            'MENSUAL': {'mes': str(hoy.month), 'anio': str(hoy.year)},
+            'ANUAL': {'anio': str(hoy.year)},
+        }
+
+    def plan(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Con pocas filas PostgreSQL prefiere un seq scan; se desactiva
+            # para comprobar que el predicado es indexable
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def test_cada_tipo_de_reporte_usa_indice(self):
+        for tipo, params in self.periodos.items():
+            with self.subTest(tipo=tipo):
+                movimientos = filtrar_periodo(Movimiento.objects.all(), tipo, **params)
+                self.assertEqual(movimientos.count(), 200)
+                plan = self.plan(movimientos)
+                self.assertRegex(plan, r'mov_\w*fecha_idx')
+                self.assertNotRegex(plan, r'(?m)SCAN movimiento$|Seq Scan')
+
+    def test_estado_y_periodo_usan_indice_compuesto(self):
+        movimientos = filtrar_periodo(
+            Movimiento.objects.filter(estado='EN_PROCESO'), 'ANUAL', **self.periodos['ANUAL']
+        )
+        self.assertRegex(self.plan(movimientos), r'mov_(estado_)?fecha_idx')
+
+    def test_periodo_invalido_no_devuelve_filas(self):
+        self.assertFalse(filtrar_periodo(Movimiento.objects.all(), 'DIARIO', fecha='no-es-fecha').exists())
+        self.assertFalse(filtrar_periodo(Movimiento.objects.all(), 'MENSUAL', mes='13', anio='2025').exists())
+
+
+class ReportePdfTests(TestCase):
+    """El PDF se entrega por partes y su tabla xref es consistente"""
+
+    def setUp(self):
+        directorios_temporales(self)
+        crear_usuario('admin_test', 'admin')
+        self.client.login(username='admin_test', password='Clave123@')
+        crear_movimientos(120)
+
+    def test_descarga_en_streaming(self):
+        anio = str(timezone.localdate().year)
+        response = self.client.get(reverse('descargar_reporte_pdf'), {'tipo': 'ANUAL', 'anio': anio})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        pdf = b''.join(response.streaming_content)
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        self.assertTrue(pdf.endswith(b'%%EOF\n'))
+
+    def test_xref_apunta_a_cada_objeto(self):
+        partes = list(generar_pdf_movimientos(Movimiento.objects.all(), 'ANUAL', anio='2025'))
+        self.assertGreater(len(partes), 3)
+        pdf = b''.join(partes)
+
+        inicio_xref = int(re.search(rb'startxref\n(\d+)', pdf).group(1))
+        self.assertTrue(pdf[inicio_xref:].startswith(b'xref'))
+        offsets = re.findall(rb'(\d{10}) 00000 n', pdf[inicio_xref:])
+        for numero, offset in enumerate(offsets, start=1):
+            self.assertTrue(pdf[int(offset):].startswith(b'%d 0 obj' % numero))
+
+        # 120 filas a 15 puntos por fila ocupan 3 páginas
+        self.assertIn(b'/Count 3', pdf)
+
+
+class ResumenMovimientoTests(TestCase):
+    """La tabla resumen sigue a Movimiento y coincide con una reconstrucción"""
+
+    def crear_movimientos(self, cantidad):
+        # bulk_create no dispara señales: se reconstruye como haría un import
+        crear_movimientos(cantidad)
+        reconstruir_resumen()
+
+    def totales(self):
+        return sorted(
+            ResumenMovimientoDiario.objects.filter(total__gt=0)
+            .values_list('fecha', 'farmacia_origen_id', 'tipo', 'estado', 'total')
+        )
+
+    def assertIgualAReconstruir(self):
+        incremental = self.totales()
+        call_command('reconstruir_resumen', stdout=io.StringIO())
+        self.assertEqual(incremental, self.totales())
+
+    def test_alta_cambio_y_baja(self):
+        self.crear_movimientos(1)
+        movimiento = Movimiento.objects.get()
+        for i in range(4):
+            Movimiento.objects.create(
+                codigo=f'X{i}', tipo='RECETA', destino='D', farmacia_origen=movimiento.farmacia_origen
+            )
+        self.assertIgualAReconstruir()
+
+        movimiento.estado = 'ANULADO'
+        movimiento.save()
+        self.assertIgualAReconstruir()
+
+        Movimiento.objects.filter(codigo__in=['X0', 'X1']).delete()
+        self.assertIgualAReconstruir()
+        self.assertEqual(resumen_periodo(None)['total'], 3)
+
+    def test_borrar_farmacia_traslada_totales(self):
+        self.crear_movimientos(5)
+        Farmacia.objects.get().delete()
+        self.assertIgualAReconstruir()
+        self.assertEqual(resumen_periodo(None)['total'], 5)
+
+    def test_reporte_lee_el_resumen(self):
+        crear_usuario('admin_test', 'admin')
+        self.client.login(username='admin_test', password='Clave123@')
+        self.crear_movimientos(TAMANO_PAGINA + 5)
+        hoy = timezone.localdate()
+
+        response = self.client.get(reverse('reporte_movimientos'), {'tipo': 'MENSUAL', 'mes': hoy.month, 'anio': hoy.year})
+        self.assertEqual(response.context['resumen']['total'], TAMANO_PAGINA + 5)
+        self.assertEqual(len(response.context['movimientos']), TAMANO_PAGINA)
+        self.assertEqual(ReporteMovimiento.objects.get().total_movimientos, TAMANO_PAGINA + 5)
+
+        # Avanzar de página no vuelve a registrar el reporte
+        self.client.get(reverse('reporte_movimientos') + response.context['pagina'].url_siguiente)
+        self.assertEqual(ReporteMovimiento.objects.count(), 1)
+
+
+class TrabajoReporteTests(TestCase):
+    """Los reportes se encolan, un worker los toma una sola vez y se descargan"""
+
+    def setUp(self):
+        directorios_temporales(self)
+        crear_usuario('admin_test', 'admin')
+        self.client.login(username='admin_test', password='Clave123@')
+        crear_movimientos(20)
+
+    def test_encolar_procesar_y_descargar(self):
+        anio = str(timezone.localdate().year)
+        response = self.client.post(reverse('reporte_encolar'), {'tipo': 'ANUAL', 'anio': anio})
+        self.assertEqual(response.status_code, 202)
+        data = response.json()
+        self.assertEqual(data['estado'], 'PENDIENTE')
+        trabajo = TrabajoReporte.objects.get(pk=data['id'])
+        self.assertEqual(trabajo.reporte.generado_por, 'admin_test')
+
+        pendiente = self.client.get(data['url_estado'])
+        self.assertNotIn('url_descarga', pendiente.json())
+        self.assertEqual(self.client.get(reverse('reporte_trabajo_descargar', args=[trabajo.pk])).status_code, 409)
+
+        tomado = tomar_trabajo()
+        self.assertEqual(tomado.pk, trabajo.pk)
+        self.assertIsNone(tomar_trabajo())
+        self.assertEqual(ejecutar_trabajo(tomado.pk), 'LISTO')
+
+        listo = self.client.get(data['url_estado']).json()
+        self.assertEqual(listo['estado'], 'LISTO')
+        descarga = self.client.get(listo['url_descarga'])
+        pdf = b''.join(descarga.streaming_content)
+        self.assertTrue(pdf.startswith(b'%PDF'))
+
+    def test_otro_usuario_no_ve_el_trabajo(self):
+        trabajo_id = self.client.post(reverse('reporte_encolar'), {'tipo': 'ANUAL', 'anio': '2025'}).json()['id']
+        crear_usuario('recep_test', 'recepcionista')
+        self.client.login(username='recep_test', password='Clave123@')
+        self.assertEqual(self.client.get(reverse('reporte_trabajo_estado', args=[trabajo_id])).status_code, 404)
+
+    def test_tipo_invalido(self):
+        response = self.client.post(reverse('reporte_encolar'), {'tipo': 'SEMANAL'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_periodo_invalido_no_se_encola(self):
+        for datos in ({'tipo': 'DIARIO', 'fecha': '2025-13-45'}, {'tipo': 'MENSUAL', 'mes': '123', 'anio': '2025'},
+                      {'tipo': 'ANUAL', 'anio': '2025' * 10}):
+            self.assertEqual(self.client.post(reverse('reporte_encolar'), datos).status_code, 400)
+        self.assertFalse(TrabajoReporte.objects.exists())
+
+    def test_solo_se_reencola_sin_latido(self):
+        trabajo_id = self.client.post(reverse('reporte_encolar'), {'tipo': 'ANUAL', 'anio': '2025'}).json()['id']
+        tomar_trabajo()
+        # Lleva una hora generando pero su worker sigue vivo
+        hace_una_hora = timezone.now() - timedelta(hours=1)
+        TrabajoReporte.objects.filter(pk=trabajo_id).update(fecha_inicio=hace_una_hora)
+        renovar_latidos([trabajo_id])
+        self.assertEqual(reencolar_colgados(), 0)
+        TrabajoReporte.objects.filter(pk=trabajo_id).update(latido=hace_una_hora)
+        self.assertEqual(reencolar_colgados(), 1)
+        self.assertEqual(TrabajoReporte.objects.get(pk=trabajo_id).estado, 'PENDIENTE')
+
+    def test_descarga_sin_archivo_da_404(self):
+        trabajo_id = self.client.post(reverse('reporte_encolar'), {'tipo': 'ANUAL', 'anio': '2025'}).json()['id']
+        TrabajoReporte.objects.filter(pk=trabajo_id).update(estado='LISTO', archivo='no_existe.pdf')
+        self.assertEqual(self.client.get(reverse('reporte_trabajo_descargar', args=[trabajo_id])).status_code, 404)
+
+
+class CacheReportesTests(TestCase):
+    """Los PDF de un periodo sin cambios se sirven desde disco"""
+
+    def setUp(self):
+        self.directorio = directorios_temporales(self)
+        crear_usuario('admin_test', 'admin')
+        self.client.login(username='admin_test', password='Clave123@')
+        crear_movimientos(30)
+        self.anio = str(timezone.localdate().year)
+
+    def descargar(self, **params):
+        response = self.client.get(reverse('descargar_reporte_pdf'), {'tipo': 'ANUAL', 'anio': self.anio, **params})
+        return response, b''.join(response.streaming_content)
+
+    def test_segunda_descarga_no_consulta_movimientos(self):
+        _, primero = self.descargar()
+        with CaptureQueriesContext(connection) as consultas:
+            response, segundo = self.descargar(anio=f' {self.anio}')
+        self.assertIsInstance(response, FileResponse)
+        self.assertEqual(primero, segundo)
+        tabla = Movimiento._meta.db_table
+        self.assertFalse([q for q in consultas.captured_queries if tabla in q['sql']])
+
+    def test_guardar_movimiento_invalida_el_periodo(self):
+        _, primero = self.descargar()
+        movimiento = Movimiento.objects.first()
+        mes = claves_periodo(movimiento.fecha_registro)[1]
+        antes = VersionPeriodo.objects.filter(clave=mes).values_list('version', flat=True).first() or 0
+        with self.captureOnCommitCallbacks(execute=True):
+            movimiento.estado = 'ANULADO'
+            movimiento.save()
+            # Dentro de la transacción del escritor no se toca VersionPeriodo
+            self.assertEqual(VersionPeriodo.objects.filter(clave=mes).values_list('version', flat=True).first() or 0, antes)
+        self.assertEqual(VersionPeriodo.objects.get(clave=mes).version, antes + 1)
+        # El año y el total salen de los meses: no hay fila caliente
+        self.assertFalse(VersionPeriodo.objects.filter(clave__in=[f'A{self.anio}', 'T']).exists())
+
+        response, segundo = self.descargar()
+        self.assertNotIsInstance(response, FileResponse)
+        self.assertNotEqual(primero, segundo)
+
+    def test_expulsa_los_menos_usados(self):
+        cache = CacheReportes(directorio=self.directorio, max_bytes=25)
+        for clave in ('a', 'b', 'c'):
+            list(cache.guardar_stream(clave, [b'0123456789']))
+        self.assertIsNone(cache.obtener('a'))
+        self.assertIsNotNone(cache.obtener('b'))
+        self.assertIsNotNone(cache.obtener('c'))
+
+    def test_solo_el_cambio_de_nombre_invalida_todo(self):
+        motorista = Motorista.objects.get()
+        global_inicial = VersionPeriodo.objects.filter(clave='G').values_list('version', flat=True).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            motorista.telefono = '999'
+            motorista.save()
+            AsignacionMoto.objects.filter(motorista=motorista).update(activa=False)
+        self.assertEqual(VersionPeriodo.objects.filter(clave='G').values_list('version', flat=True).first(), global_inicial)
+        with self.captureOnCommitCallbacks(execute=True):
+            motorista.nombre = 'Otro nombre'
+            motorista.save()
+        self.assertEqual(VersionPeriodo.objects.get(clave='G').version, (global_inicial or 0) + 1)
+
+    def test_archivo_expulsado_entre_obtener_y_abrir(self):
+        _, primero = self.descargar()
+        with mock.patch('App.cache_reportes.open', side_effect=FileNotFoundError, create=True):
+            response, segundo = self.descargar()
+        self.assertNotIsInstance(response, FileResponse)
+        self.assertEqual(primero[:4], segundo[:4])
+
+
+class RolUsuarioTests(TestCase):
+    """El rol llega con el usuario y no cuesta una consulta por vista"""
+
+    def test_dashboard_sin_consulta_de_rol(self):
+        crear_usuario('admin_test', 'admin')
+        self.client.login(username='admin_test', password='Clave123@')
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('index'))
+        self.assertEqual(response.status_code, 200)
+        # sesión + usuario con JOIN a usuario_rol
+        self.assertEqual(len(consultas), 2)
+        self.assertIn(UsuarioRol._meta.db_table, consultas.captured_queries[1]['sql'])
+
+    def test_rol_equivocado_redirige_al_login(self):
+        crear_usuario('recep_test', 'recepcionista')
+        self.client.login(username='recep_test', password='Clave123@')
+        response = self.client.get(reverse('index'))
+        self.assertRedirects(response, f"{reverse('login')}?next={reverse('index')}", fetch_redirect_response=False)
+        self.assertEqual(self.client.get(reverse('index2')).status_code, 200)
+
+    def test_cambio_de_rol_se_ve_en_el_siguiente_request(self):
+        user = crear_usuario('recep_test', 'recepcionista')
+        self.client.login(username='recep_test', password='Clave123@')
+        UsuarioRol.objects.filter(usuario=user).update(rol='admin')
+        self.assertEqual(self.client.get(reverse('index')).status_code, 200)
+
+    def test_registro_inicia_sesion(self):
+        response = self.client.post(reverse('registrar'), {
+            'username': 'nuevo', 'email': 'nuevo@logico.com', 'password1': 'Clave123@', 'password2': 'Clave123@',
+        })
+        self.assertRedirects(response, reverse('index2'), fetch_redirect_response=False)
+        self.assertEqual(self.client.session['_auth_user_backend'], 'App.backends.RolBackend')
+        self.assertEqual(self.client.get(reverse('index2')).status_code, 200)
+
+    def test_cambio_de_password_mantiene_la_sesion(self):
+        crear_usuario('admin_test', 'admin')
+        self.client.login(username='admin_test', password='Clave123@')
+        response = self.client.post(reverse('cambiar_password'), {
+            'old_password': 'Clave123@', 'new_password1': 'Nueva123@', 'new_password2': 'Nueva123@',
+        })
+        self.assertRedirects(response, reverse('index'), fetch_redirect_response=False)
+        self.assertEqual(self.client.get(reverse('index')).status_code, 200)
+        self.assertTrue(User.objects.get(username='admin_test').check_password('Nueva123@'))
+
+
+class ImportacionTests(TestCase):
+    """Importación por lotes con upsert por clave natural y errores por fila"""
+
+    def test_csv_de_motos_hace_upsert(self):
+        Moto.objects.create(patente='AA1111', marca='Honda', modelo='CB', anio=2020)
+        archivo = io.BytesIO(
+            "patente,marca,modelo,anio,disponible\n"
+            "AA1111,Yamaha,FZ,2023,true\n"
+            "BB2222,Suzuki,GN,2021,false\n"
+            "CC3333,Suzuki,GN,no-es-año,true\n"
+            "BB2222,Suzuki,GN,2022,true\n".encode()
+        )
+        resultado = importar('moto', leer_filas(archivo, 'csv'), lote=2)
+
+        self.assertEqual(resultado['procesadas'], 4)
+        self.assertEqual(resultado['escritas'], 3)
+        self.assertEqual([e['fila'] for e in resultado['errores']], [3])
+        self.assertIn('anio', resultado['errores'][0]['errores'])
+        self.assertEqual(Moto.objects.count(), 2)
+        self.assertEqual(Moto.objects.get(patente='AA1111').marca, 'Yamaha')
+        self.assertEqual(Moto.objects.get(patente='BB2222').anio, 2022)
+
+    def test_endpoint_ndjson_de_motoristas(self):
+        crear_usuario('admin_test', 'admin')
+        self.client.login(username='admin_test', password='Clave123@')
+        lineas = [
+            {'nombre': 'Ana', 'rut': '11111111-1', 'telefono': '1', 'correo': 'a@logico.com',
+             'licencia': 'C1', 'estado': 'Activo', 'fecha_ingreso': '2024-01-01'},
+            {'nombre': 'Beto', 'rut': '22222222-2', 'telefono': '2', 'correo': 'no-es-correo',
+             'licencia': 'C1', 'estado': 'Activo', 'fecha_ingreso': '2024-01-01'},
+        ]
+        contenido = '\n'.join(json.dumps(linea) for linea in lineas) + '\n{roto\n'
+        archivo = SimpleUploadedFile('motoristas.ndjson', contenido.encode())
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.post(reverse('importar_datos', args=['motorista']), {'archivo': archivo})
+        data = response.json()
+        # Ni validate_unique por fila ni un INSERT por fila; solo la consulta de
+        # nombres del lote, para saber si el upsert invalida el cache de reportes
+        tabla = Motorista._meta.db_table
+        lecturas = [q['sql'] for q in consultas.captured_queries if f'FROM "{tabla}"' in q['sql']]
+        self.assertEqual(len(lecturas), 1)
+        self.assertIn('IN (', lecturas[0])
+        self.assertEqual(len([q for q in consultas.captured_queries if f'INTO "{tabla}"' in q['sql']]), 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['escritas'], 1)
+        self.assertEqual([e['fila'] for e in data['errores']], [2, 3])
+        self.assertTrue(Motorista.objects.filter(rut='11111111-1').exists())
+
+    def test_solo_admin(self):
+        crear_usuario('recep_test', 'recepcionista')
+        self.client.login(username='recep_test', password='Clave123@')
+        response = self.client.post(reverse('importar_datos', args=['moto']))
+        self.assertEqual(response.status_code, 302)
+
+
+class ExportacionMovimientosTests(TestCase):
+    """CSV y NDJSON se entregan por partes con los filtros del reporte"""
+
+    def setUp(self):
+        crear_usuario('admin_test', 'admin')
+        self.client.login(username='admin_test', password='Clave123@')
+        crear_movimientos(1200)
+        self.anio = str(timezone.localdate().year)
+
+    def exportar(self, formato, **params):
+        response = self.client.get(reverse('exportar_movimientos', args=[formato]), params)
+        self.assertTrue(response.streaming)
+        return response, list(response.streaming_content)
+
+    def test_csv(self):
+        response, partes = self.exportar('csv', tipo='ANUAL', anio=self.anio)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertGreater(len(partes), 2)
+        filas = list(csv.DictReader(io.StringIO(b''.join(partes).decode())))
+        self.assertEqual(len(filas), 1200)
+        self.assertEqual(filas[0]['motorista_nombre'], 'Motorista 0')
+        self.assertEqual(filas[0]['moto_patente'], 'AB0000')
+
+    def test_ndjson_con_periodo_vacio(self):
+        _, partes = self.exportar('ndjson', tipo='ANUAL', anio='1999')
+        self.assertEqual(b''.join(partes), b'')
+        _, partes = self.exportar('ndjson', tipo='MENSUAL', mes=str(timezone.localdate().month), anio=self.anio)
+        lineas = b''.join(partes).decode().splitlines()
+        self.assertEqual(len(lineas), 1200)
+        self.assertEqual(json.loads(lineas[0])['farmacia_origen_nombre'], 'Farmacia 0')
+
+    def test_formato_desconocido(self):
+        response = self.client.get(reverse('exportar_movimientos', args=['xml']))
+        self.assertEqual(response.status_code, 404)
+
+
+class TerritorioTests(TestCase):
+    """Combos de región/provincia/comuna servidos desde memoria con ETag"""
+
+    def test_division_completa_y_revalidacion(self):
+        response = self.client.get(reverse('cargar_division'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('max-age=86400', response['Cache-Control'])
+        division = response.json()
+        self.assertEqual(set(division), {region for region, _ in Farmacia.REGIONES})
+        self.assertEqual(sum(len(comunas) for r in division.values() for comunas in r.values()), 346)
+
+        with self.assertNumQueries(0):
+            revalidado = self.client.get(reverse('cargar_division'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidado.status_code, 304)
+        self.assertIn('max-age=86400', revalidado['Cache-Control'])
+
+    def test_endpoints_por_nivel(self):
+        provincias = self.client.get(reverse('cargar_provincias'), {'region': 'Ñuble'}).json()
+        self.assertEqual(provincias, {'provincias': ['Diguillín', 'Itata', 'Punilla']})
+        comunas = self.client.get(reverse('cargar_comunas'), {'provincia': 'Cordillera'}).json()
+        self.assertIn('Puente Alto', comunas['comunas'])
+        self.assertEqual(self.client.get(reverse('cargar_comunas'), {'provincia': 'X'}).json(), {'comunas': []})
+
+    def test_formulario_valida_la_comuna(self):
+        datos = {
+            'nombre': 'Farmacia', 'direccion': 'Calle 1', 'telefono': '123', 'correo': 'f@logico.com',
+            'region': 'Valparaíso', 'provincia': 'Marga Marga', 'comuna': 'Quilpué',
+        }
+        self.assertTrue(FarmaciaForm(data=datos).is_valid())
+        self.assertFalse(FarmaciaForm(data={**datos, 'comuna': 'Maipú'}).is_valid())
+
+
+class DespachoTests(TestCase):
+    """El índice propone motorista y moto libres y la base impide la doble reserva"""
+
+    def setUp(self):
+        indice_despacho.invalidar()
+        self.farmacia = Farmacia.objects.create(
+            nombre='Farmacia Centro', direccion='Calle 1', telefono='123', correo='f@logico.com',
+            region='Metropolitana de Santiago', provincia='Santiago', comuna='Santiago',
+        )
+        self.motoristas = []
+        for i in range(2):
+            moto = Moto.objects.create(patente=f'DS{i:04d}', marca='Honda', modelo='CB', anio=2022)
+            motorista = Motorista.objects.create(
+                nombre=f'Motorista {i}', rut=f'{i}-1', telefono='1', correo='m@logico.com',
+                licencia='C1', fecha_ingreso=date(2024, 1, 1),
+            )
+            AsignacionFarmacia.objects.create(motorista=motorista, farmacia=self.farmacia)
+            AsignacionMoto.objects.create(motorista=motorista, moto=moto)
+            self.motoristas.append((motorista, moto))
+
+    def crear(self, motorista, moto, codigo):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Movimiento.objects.create(
+                codigo=codigo, tipo='DIRECTO', destino='D', farmacia_origen=self.farmacia,
+                motorista=motorista, moto=moto,
+            )
+
+    def test_propuesta_sin_consultas_y_sigue_las_senales(self):
+        indice_despacho.cargar()
+        with self.assertNumQueries(0):
+            propuesta = indice_despacho.proponer(self.farmacia.pk)
+        motorista, moto = self.motoristas[0]
+        self.assertEqual(propuesta, (motorista.pk, moto.pk))
+
+        movimiento = self.crear(motorista, moto, 'D1')
+        otro, otra_moto = self.motoristas[1]
+        self.assertEqual(indice_despacho.proponer(self.farmacia.pk), (otro.pk, otra_moto.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            otra_moto.disponible = False
+            otra_moto.save()
+        self.assertIsNone(indice_despacho.proponer(self.farmacia.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            movimiento.estado = 'COMPLETADO'
+            movimiento.save()
+        self.assertEqual(indice_despacho.proponer(self.farmacia.pk), (motorista.pk, moto.pk))
+
+    def test_carga_con_el_ultimo_despacho_de_cada_motorista(self):
+        primero, moto = self.motoristas[0]
+        movimiento = self.crear(primero, moto, 'D1')
+        Movimiento.objects.filter(pk=movimiento.pk).update(estado='COMPLETADO')
+        indice_despacho.invalidar()
+        with self.assertNumQueries(5):
+            indice_despacho.cargar()
+        self.assertEqual(indice_despacho.motoristas[primero.pk]['ultimo'], movimiento.fecha_registro)
+        # Sin despachos previos va primero
+        otro, otra_moto = self.motoristas[1]
+        self.assertEqual(indice_despacho.proponer(self.farmacia.pk), (otro.pk, otra_moto.pk))
+
+    def test_no_se_reserva_dos_veces(self):
+        motorista, moto = self.motoristas[0]
+        self.crear(motorista, moto, 'D1')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Movimiento.objects.create(codigo='D2', tipo='DIRECTO', destino='D', motorista=motorista)
+
+        crear_usuario('admin_test', 'admin')
+        self.client.login(username='admin_test', password='Clave123@')
+        response = self.client.post(reverse('movimiento_create'), {
+            'codigo': 'D3', 'tipo': 'DIRECTO', 'estado': 'EN_PROCESO', 'destino': 'D',
+            'farmacia_origen': self.farmacia.pk, 'motorista': motorista.pk, 'moto': moto.pk,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('El motorista ya tiene un movimiento en proceso.', response.context['form'].non_field_errors())
+        self.assertFalse(Movimiento.objects.filter(codigo='D3').exists())
+
+    def test_endpoint_de_propuesta(self):
+        crear_usuario('recep_test', 'recepcionista')
+        self.client.login(username='recep_test', password='Clave123@')
+        data = self.client.get(reverse('movimiento_propuesta'), {'farmacia': self.farmacia.pk}).json()
+        self.assertEqual(data['moto_patente'], 'DS0000')
+        self.assertEqual(self.client.get(reverse('movimiento_propuesta'), {'farmacia': 'x'}).status_code, 400)
+
+
+class AutocompletarTests(TestCase):
+    """Los selects de relaciones no cargan la tabla completa"""
+
+    def setUp(self):
+        crear_usuario('admin_test', 'admin')
+        self.client.login(username='admin_test', password='Clave123@')
+        for i in range(30):
+            crear_movimientos(0, inicio=i)
+
+    def test_formulario_solo_renderiza_la_opcion_elegida(self):
+        html = str(AsignacionMotoForm()['motorista'])
+        self.assertEqual(html.count('<option'), 1)
+        self.assertIn('data-url="/autocompletar/motorista/"', html)
+
+        motorista = Motorista.objects.get(nombre='Motorista 7')
+        html = str(AsignacionMotoForm(initial={'motorista': motorista.pk})['motorista'])
+        self.assertEqual(html.count('<option'), 2)
+        self.assertIn('Motorista 7 (C1)', html)
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('asignacion_moto_create'))
+        tabla = Motorista._meta.db_table
+        self.assertFalse([q for q in consultas.captured_queries if f'FROM "{tabla}"' in q['sql']])
+
+    def test_busqueda_por_prefijo(self):
+        data = self.client.get(reverse('autocompletar', args=['motorista']), {'q': 'motorista 1'}).json()
+        self.assertEqual(
+            [r['texto'] for r in data['resultados']],
+            ['Motorista 1 (C1)'] + [f'Motorista {i} (C1)' for i in range(10, 20)],
+        )
+        data = self.client.get(reverse('autocompletar', args=['moto']), {'q': 'ab002'}).json()
+        self.assertEqual(len(data['resultados']), 10)
+        self.assertEqual(data['resultados'][0]['texto'], 'Honda CB - AB0020')
+        self.assertEqual(self.client.get(reverse('autocompletar', args=['moto'])).json(), {'resultados': []})
+        self.assertEqual(self.client.get(reverse('autocompletar', args=['user'])).status_code, 404)
+
+
+class AsignacionesTemporalesTests(TestCase):
+    """Historial de asignaciones consultable por fecha"""
+
+    def setUp(self):
+        self.motos = [Moto.objects.create(patente=f'HT{i:04d}', marca='Honda', modelo='CB', anio=2022) for i in range(3)]
+        self.motoristas = [
+            Motorista.objects.create(
+                nombre=f'Motorista {i}', rut=f'{i}-2', telefono='1', correo='m@logico.com',
+                licencia='C1', fecha_ingreso=date(2024, 1, 1),
+            )
+            for i in range(2)
+        ]
+
+    def asignar(self, motorista, moto, inicio, fin=None):
+        asignacion = AsignacionMoto.objects.create(motorista=motorista, moto=moto)
+        # fecha_asignacion es auto_now_add: el historial se arma con update
+        AsignacionMoto.objects.filter(pk=asignacion.pk).update(
+            fecha_asignacion=inicio, fecha_fin=fin, activa=fin is None,
+        )
+        return asignacion
+
+    def test_quien_tenia_cada_moto_en_una_fecha(self):
+        primero, segundo = self.motoristas
+        moto_a, moto_b, moto_c = self.motos
+        self.asignar(primero, moto_a, date(2024, 1, 1), date(2024, 2, 1))
+        self.asignar(segundo, moto_a, date(2024, 2, 1), date(2024, 3, 1))
+        self.asignar(primero, moto_b, date(2024, 2, 1))
+
+        with self.assertNumQueries(1):
+            en_enero = motoristas_de_motos_en(date(2024, 1, 15), [m.pk for m in self.motos])
+        self.assertEqual(en_enero, {moto_a.pk: primero.pk})
+        # El día de término ya es de la asignación siguiente
+        self.assertEqual(
+            motoristas_de_motos_en(date(2024, 2, 1)),
+            {moto_a.pk: segundo.pk, moto_b.pk: primero.pk},
+        )
+        self.assertEqual(motoristas_de_motos_en(date(2030, 1, 1)), {moto_b.pk: primero.pk})
+        self.assertNotIn(moto_c.pk, motoristas_de_motos_en(date(2024, 2, 15)))
+
+        marzo = asignaciones_entre(AsignacionMoto, date(2024, 2, 15), date(2024, 3, 15), moto=moto_a)
+        self.assertEqual(list(marzo.values_list('motorista_id', flat=True)), [segundo.pk])
+
+    def test_solapamientos_y_restriccion_de_activas(self):
+        primero, segundo = self.motoristas
+        moto = self.motos[0]
+        self.asignar(primero, moto, date(2024, 1, 1), date(2024, 2, 1))
+        self.asignar(segundo, moto, date(2024, 2, 1), date(2024, 3, 1))
+        self.assertFalse(solapamientos(AsignacionMoto, 'moto').exists())
+
+        if connection.vendor != 'postgresql':
+            # En PostgreSQL la restricción de exclusión (0025) ya rechaza el cruce
+            cruzada = self.asignar(segundo, self.motos[1], date(2024, 1, 15), date(2024, 2, 15))
+            AsignacionMoto.objects.filter(pk=cruzada.pk).update(moto=moto)
+            self.assertEqual(len(solapamientos(AsignacionMoto, 'moto')), 3)
+
+        AsignacionMoto.objects.create(motorista=primero, moto=self.motos[2])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            AsignacionMoto.objects.create(motorista=segundo, moto=self.motos[2])
+        form = AsignacionMotoForm(data={'motorista': segundo.pk, 'moto': self.motos[2].pk, 'activa': True})
+        self.assertIn('La moto ya tiene una asignación activa.', form.non_field_errors())
+
+    def test_vencidas_no_bloquean_la_siguiente(self):
+        primero, segundo = self.motoristas
+        moto = self.motos[0]
+        ayer = timezone.localdate() - timedelta(days=1)
+        # Venció ayer pero nadie la volvió a guardar: sigue activa
+        vencida = self.asignar(primero, moto, ayer - timedelta(days=30))
+        AsignacionMoto.objects.filter(pk=vencida.pk).update(fecha_fin=ayer)
+
+        form = AsignacionMotoForm(data={'motorista': segundo.pk, 'moto': moto.pk, 'activa': True})
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        vencida.refresh_from_db()
+        self.assertFalse(vencida.activa)
+        self.assertIsNone(Motorista.objects.get(pk=primero.pk).moto_id)
+        self.assertEqual(Motorista.objects.get(pk=segundo.pk).moto_id, moto.pk)
+
+        # Sin formulario también: save() cierra la vencida antes del INSERT
+        otra = self.asignar(primero, self.motos[1], ayer - timedelta(days=30))
+        AsignacionMoto.objects.filter(pk=otra.pk).update(fecha_fin=ayer)
+        AsignacionMoto.objects.create(motorista=primero, moto=self.motos[2])
+        self.assertFalse(AsignacionMoto.objects.get(pk=otra.pk).activa)
+
+    def test_cruces_con_el_historial_y_cierre_periodico(self):
+        primero, segundo = self.motoristas
+        moto = self.motos[0]
+        hoy = timezone.localdate()
+        self.asignar(primero, moto, hoy - timedelta(days=10), hoy + timedelta(days=5))
+        form = AsignacionMotoForm(data={'motorista': segundo.pk, 'moto': moto.pk, 'activa': True})
+        self.assertIn('La moto ya estaba asignada en esas fechas.', form.non_field_errors())
+        form = AsignacionMotoForm(data={
+            'motorista': segundo.pk, 'moto': self.motos[1].pk, 'activa': True, 'fecha_fin': hoy + timedelta(days=5),
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+
+        vencida = self.asignar(segundo, self.motos[2], hoy - timedelta(days=3))
+        AsignacionMoto.objects.filter(pk=vencida.pk).update(fecha_fin=hoy)
+        salida = io.StringIO()
+        call_command('purgar_vencidos', stdout=salida)
+        self.assertIn('1 asignaciones cerradas', salida.getvalue())
+        self.assertFalse(AsignacionMoto.objects.get(pk=vencida.pk).activa)
+
+    def test_motorista_refleja_la_asignacion_activa(self):
+        motorista = self.motoristas[0]
+        farmacia = Farmacia.objects.create(
+            nombre='Farmacia Centro', direccion='Calle 1', telefono='123', correo='f@logico.com',
+            region='Metropolitana de Santiago', provincia='Santiago', comuna='Santiago',
+        )
+        asignacion = AsignacionMoto.objects.create(motorista=motorista, moto=self.motos[0])
+        AsignacionFarmacia.objects.create(motorista=motorista, farmacia=farmacia)
+        motorista.refresh_from_db()
+        self.assertEqual((motorista.moto_id, motorista.farmacia_id), (self.motos[0].pk, farmacia.pk))
+
+        asignacion.activa = False
+        asignacion.save()
+        asignacion.refresh_from_db()
+        self.assertEqual(asignacion.fecha_fin, timezone.localdate())
+        motorista.refresh_from_db()
+        self.assertIsNone(motorista.moto_id)
+
+        AsignacionMoto.objects.create(motorista=motorista, moto=self.motos[1])
+        motorista.refresh_from_db()
+        self.assertEqual(motorista.moto_id, self.motos[1].pk)
+
+
+class MigracionEnProcesoTests(TransactionTestCase):
+    """La migración 0014 resuelve los EN_PROCESO duplicados en lugar de detener el despliegue"""
+
+    anterior = [('App', '0013_versionperiodo')]
+
+    def test_base_con_duplicados_migra(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.anterior)
+        apps = executor.loader.project_state(self.anterior).apps
+        MotoristaHistorico = apps.get_model('App', 'Motorista')
+        MotoHistorica = apps.get_model('App', 'Moto')
+        MovimientoHistorico = apps.get_model('App', 'Movimiento')
+        motorista = MotoristaHistorico.objects.create(
+            nombre='Duplicado', rut='9-9', telefono='1', correo='m@logico.com', licencia='C1', fecha_ingreso=date(2024, 1, 1),
+        )
+        moto = MotoHistorica.objects.create(patente='DU0001', marca='Honda', modelo='CB', anio=2022)
+        for i in range(3):
+            MovimientoHistorico.objects.create(
+                codigo=f'DUP{i}', tipo='DIRECTO', destino='D', estado='EN_PROCESO', motorista=motorista, moto=moto,
+            )
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+        estados = dict(Movimiento.objects.values_list('codigo', 'estado'))
+        self.assertEqual(estados, {'DUP0': 'ANULADO', 'DUP1': 'ANULADO', 'DUP2': 'EN_PROCESO'})
+        self.assertEqual(Movimiento.objects.filter(descripcion__contains='[0014]').count(), 2)
+        self.assertEqual(
+            dict(ResumenMovimientoDiario.objects.values_list('estado', 'total')), {'ANULADO': 2, 'EN_PROCESO': 1},
+        )
+
+
+class CodigosMovimientoTests(TransactionTestCase):
+    """Los códigos se reservan por bloques sin repetirse entre procesos"""
+
+    def setUp(self):
+        asignador_codigos.limpiar()
+        self.addCleanup(asignador_codigos.limpiar)
+        crear_movimientos(0)
+        self.farmacia = Farmacia.objects.get()
+        self.prefijo = f"{timezone.localdate():%y%m%d}-{self.farmacia.pk}"
+
+    def test_bloques_por_proceso(self):
+        # Dos asignadores hacen de dos workers de gunicorn
+        a, b = AsignadorCodigos(bloque=10), AsignadorCodigos(bloque=10)
+        self.assertEqual(a.siguiente(self.farmacia.pk), f"{self.prefijo}-0001")
+        self.assertEqual(b.siguiente(self.farmacia.pk), f"{self.prefijo}-0011")
+        with self.assertNumQueries(0):
+            self.assertEqual(a.siguiente(self.farmacia.pk), f"{self.prefijo}-0002")
+            self.assertEqual(b.siguiente(self.farmacia.pk), f"{self.prefijo}-0012")
+        self.assertEqual(SecuenciaCodigo.objects.get(clave=self.prefijo).siguiente, 21)
+
+    def test_reserva_dentro_de_transaccion_revertida(self):
+        asignador = AsignadorCodigos(bloque=10)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.assertEqual(asignador.siguiente(self.farmacia.pk), f"{self.prefijo}-0001")
+            raise RuntimeError
+        # El número volvió a la base con la transacción, no quedó un bloque en memoria
+        self.assertEqual(asignador.siguiente(self.farmacia.pk), f"{self.prefijo}-0001")
+        self.assertEqual(asignador.siguiente(self.farmacia.pk), f"{self.prefijo}-0002")
+
+    def test_formulario_y_orm_sin_codigo(self):
+        crear_usuario('admin_test', 'admin')
+        self.client.login(username='admin_test', password='Clave123@')
+        motorista = Motorista.objects.get()
+        datos = {
+            'tipo': 'DIRECTO', 'estado': 'COMPLETADO', 'farmacia_origen': self.farmacia.pk,
+            'destino': 'Destino', 'motorista': motorista.pk, 'moto': motorista.moto_id,
+        }
+        for _ in range(2):
+            self.assertEqual(self.client.post(reverse('movimiento_create'), datos).status_code, 302)
+        movimiento = Movimiento.objects.create(
+            tipo='DIRECTO', estado='ANULADO', destino='Destino', farmacia_origen=self.farmacia,
+        )
+        self.assertEqual(movimiento.codigo, f"{self.prefijo}-0003")
+        self.assertEqual(
+            sorted(Movimiento.objects.values_list('codigo', flat=True)),
+            [f"{self.prefijo}-000{i}" for i in (1, 2, 3)],
+        )
+
+
+class EventosMovimientoTests(TestCase):
+    """Los listados reciben los cambios de Movimiento sin recargar"""
+
+    def test_senales_publican_despues_del_commit(self):
+        crear_movimientos(0)
+        with mock.patch('App.signals.publicar') as publicar:
+            with self.captureOnCommitCallbacks(execute=True):
+                movimiento = Movimiento.objects.create(
+                    codigo='EV-1', tipo='DIRECTO', estado='COMPLETADO', destino='D',
+                    farmacia_origen=Farmacia.objects.get(),
+                )
+                self.assertFalse(publicar.called)
+            evento, datos = publicar.call_args.args
+            self.assertEqual(evento, 'creado')
+            self.assertEqual(datos['codigo'], movimiento.codigo)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                movimiento.estado = 'ANULADO'
+                movimiento.save()
+            evento, datos = publicar.call_args.args
+            self.assertEqual((evento, datos['estado'], datos['estado_anterior']), ('estado', 'ANULADO', 'COMPLETADO'))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                movimiento.delete()
+            self.assertEqual(publicar.call_args.args[0], 'eliminado')
+
+    async def test_flujo_sse_y_reconexion(self):
+        backend = BackendMemoria(historial=3)
+        with mock.patch('App.eventos.obtener_backend', return_value=backend):
+            flujo = flujo_eventos(latido=0.05)
+            self.assertEqual(await anext(flujo), 'retry: 5000\n\n')
+            # Publicado desde otro hilo, como lo hacen las señales
+            await asyncio.to_thread(backend.publicar, 'estado', {'id': 7, 'estado': 'ANULADO'})
+            self.assertEqual(await anext(flujo), 'id: 1\nevent: estado\ndata: {"id":7,"estado":"ANULADO"}\n\n')
+            self.assertEqual(await anext(flujo), ': ping\n\n')
+            await flujo.aclose()
+            self.assertFalse(backend._suscriptores)
+
+            for i in range(4):
+                backend.publicar('creado', {'id': i})
+            reconectado = flujo_eventos(ultimo_id=3)
+            await anext(reconectado)
+            self.assertTrue((await anext(reconectado)).startswith('id: 4\n'))
+            await reconectado.aclose()
+            # El evento 1 ya salió del historial
+            perdido = flujo_eventos(ultimo_id=0)
+            await anext(perdido)
+            self.assertIn('event: recargar', await anext(perdido))
+            await perdido.aclose()
+
+    async def test_flujo_termina_al_cumplir_la_duracion(self):
+        with mock.patch('App.eventos.obtener_backend', return_value=BackendMemoria()):
+            recibidos = [e async for e in flujo_eventos(latido=0.02, duracion=0.05)]
+        self.assertEqual(recibidos[0], 'retry: 5000\n\n')
+        self.assertLessEqual(len(recibidos), 4)
+
+    @override_settings(EVENTOS_EN_VIVO=True)
+    def test_vista_requiere_sesion(self):
+        url = reverse('movimiento_eventos')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        crear_usuario('recep_test', 'recepcionista')
+        self.client.login(username='recep_test', password='Clave123@')
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertTrue(response.streaming)
+        self.assertContains(self.client.get(reverse('movimiento_list2')), 'EventSource')
+
+    @override_settings(EVENTOS_EN_VIVO=False)
+    def test_desactivado_bajo_wsgi(self):
+        crear_usuario('recep_test', 'recepcionista')
+        self.client.login(username='recep_test', password='Clave123@')
+        self.assertEqual(self.client.get(reverse('movimiento_eventos')).status_code, 404)
+        self.assertNotContains(self.client.get(reverse('movimiento_list2')), 'EventSource')
+
+
+class LecturaAsyncTests(TestCase):
+    """/api_async/<modelo>/ devuelve lo mismo que la API REST, con el ORM asíncrono"""
+
+    def setUp(self):
+        self.usuario = crear_usuario('api_test', 'admin')
+        self.client.force_login(self.usuario)
+        crear_movimientos(60)
+
+    def test_paginas_coinciden_con_la_api(self):
+        url = reverse('lectura_async', args=['movimientos'])
+        primera = self.client.get(url).json()
+        segunda = self.client.get(url, {'despues': primera['siguiente']}).json()
+        self.assertEqual(len(primera['resultados']), 50)
+        self.assertEqual(len(segunda['resultados']), 10)
+        self.assertIsNone(segunda['siguiente'])
+
+        api = self.client.get('/api_movimientos/').data['results']
+        self.assertEqual([m['id'] for m in primera['resultados']], [m['id'] for m in api])
+        self.assertEqual(set(primera['resultados'][0]), set(api[0]))
+        self.assertEqual(primera['resultados'][0]['motorista'], api[0]['motorista'])
+
+    async def test_proyeccion_y_total(self):
+        await self.async_client.aforce_login(self.usuario)
+        response = await self.async_client.get(
+            reverse('lectura_async', args=['motos']), {'fields': 'patente', 'total': '1'},
+        )
+        data = response.json()
+        self.assertEqual(data['resultados'], [{'id': data['resultados'][0]['id'], 'patente': 'AB0000'}])
+        self.assertEqual(data['total'], 1)
+        response = await self.async_client.get(reverse('lectura_async', args=['user']))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_sesion_del_model_backend(self):
+        # Sin el select_related de RolBackend el rol se lee fuera del loop
+        await self.async_client.aforce_login(self.usuario, backend='django.contrib.auth.backends.ModelBackend')
+        response = await self.async_client.get(reverse('lectura_async', args=['motos']))
+        self.assertEqual(response.status_code, 200)
+
+
+class MetricasTests(TestCase):
+    """Consultas, tiempos y tamaño por URL expuestos en /metrics"""
+
+    def setUp(self):
+        registro_metricas.limpiar()
+        crear_movimientos(5)
+        crear_usuario('admin_test', 'admin')
+
+    def test_agregados_por_url_en_formato_prometheus(self):
+        self.client.login(username='admin_test', password='Clave123@')
+        for _ in range(3):
+            html = self.client.get(reverse('movimiento_list')).content
+        texto = self.client.get(reverse('metricas')).content.decode()
+
+        self.assertIn('# TYPE logico_request_consultas summary', texto)
+        self.assertIn('logico_request_duracion_segundos_count{url="movimiento_list"} 3', texto)
+        self.assertIn(f'logico_request_bytes{{url="movimiento_list",quantile="0.5"}} {len(html)}', texto)
+        consultas = re.search(r'logico_request_consultas_sum\{url="movimiento_list"\} (\d+)', texto)
+        self.assertGreater(int(consultas.group(1)), 0)
+
+    def test_render_de_plantillas_y_bytes_en_streaming(self):
+        self.client.login(username='admin_test', password='Clave123@')
+        self.client.get(reverse('movimiento_list'))
+        response = self.client.get(reverse('exportar_movimientos', args=['csv']), {'tipo': 'ANUAL', 'anio': '2024'})
+        self.assertNotIn('Content-Length', response)
+        cuerpo = b''.join(response.streaming_content)
+        response.close()
+        texto = registro_metricas.prometheus()
+
+        self.assertIn(f'logico_request_bytes_sum{{url="exportar_movimientos"}} {len(cuerpo)}', texto)
+        render = re.search(r'logico_request_render_segundos_sum\{url="movimiento_list"\} (\S+)', texto)
+        self.assertGreater(float(render.group(1)), 0)
+        # La exportación no usa plantillas
+        self.assertIn('logico_request_render_segundos_sum{url="exportar_movimientos"} 0', texto)
+
+    def test_metrics_protegido(self):
+        url = reverse('metricas')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        with override_settings(METRICAS_TOKEN='secreto'):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer otro').status_code, 403)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer secreto').status_code, 200)
+
+    def test_log_de_consultas_lentas(self):
+        self.client.login(username='admin_test', password='Clave123@')
+        with override_settings(METRICAS_SQL_LENTA_MS=0), self.assertLogs('App.metricas', 'WARNING') as logs:
+            self.client.get(reverse('movimiento_list'))
+        self.assertTrue(any('movimiento_list (App.views.movimiento_list)' in linea for linea in logs.output))
+
+
+class SembradoTests(TestCase):
+    """El sembrador es determinista y respeta las restricciones del modelo"""
+
+    def huella(self):
+        return list(
+            Movimiento.objects.order_by('codigo')
+            .values_list('codigo', 'fecha_registro', 'estado', 'tipo', 'motorista__rut', 'moto__patente')
+        )
+
+    def test_misma_semilla_mismos_datos(self):
+        hasta = date(2025, 3, 14)
+        sembrar(movimientos=300, farmacias=4, motoristas=8, dias=30, semilla=7, hasta=hasta)
+        primera = self.huella()
+        self.assertEqual(len(primera), 300)
+        self.assertEqual(primera[-1][1].date(), hasta)
+        self.assertEqual(resumen_periodo('MENSUAL', mes='3', anio='2025')['total'] + resumen_periodo('MENSUAL', mes='2', anio='2025')['total'], 300)
+        self.assertEqual(Motorista.objects.filter(moto__isnull=False).count(), AsignacionMoto.objects.filter(activa=True).count())
+
+        for modelo in (Movimiento, AsignacionMoto, AsignacionFarmacia, Motorista, Moto, Farmacia):
+            modelo.objects.all().delete()
+        sembrar(movimientos=300, farmacias=4, motoristas=8, dias=30, semilla=7, hasta=hasta)
+        self.assertEqual(self.huella(), primera)
+
+    def test_historial_coherente_con_movimientos(self):
+        hasta = date(2025, 3, 14)
+        sembrar(movimientos=400, farmacias=20, motoristas=6, dias=60, semilla=3, hasta=hasta, historial=2)
+        self.assertEqual(Farmacia.objects.values('region').distinct().count(), len(Farmacia.REGIONES))
+        self.assertEqual(AsignacionMoto.objects.filter(activa=False).count(), 12)
+        self.assertFalse(solapamientos(AsignacionMoto, 'moto').exists())
+        self.assertFalse(solapamientos(AsignacionMoto, 'motorista').exists())
+        # Cada movimiento usa la moto que su motorista tenía asignada ese día
+        for movimiento in Movimiento.objects.order_by('pk')[::40]:
+            dia = timezone.localdate(movimiento.fecha_registro)
+            self.assertEqual(motoristas_de_motos_en(dia, [movimiento.moto_id])[movimiento.moto_id], movimiento.motorista_id)
+        call_command('seed_logico', movimientos=50, farmacias=2, motoristas=2, dias=5, semilla=4, stdout=io.StringIO())
+        self.assertEqual(Movimiento.objects.filter(codigo__startswith='S4-').count(), 50)
+
+    def test_rut_y_patente(self):
+        self.assertEqual(rut(11111111), '11111111-1')
+        self.assertEqual(rut(12345678), '12345678-5')
+        self.assertEqual(rut(6), '6-K')
+        self.assertEqual(patente(0), 'BBBB00')
+        self.assertEqual(len({patente(i) for i in range(5000)}), 5000)
+
+
+class TransicionesMovimientoTests(TestCase):
+    """Máquina de estados, bloqueo optimista y cambios de estado en lote"""
+
+    def setUp(self):
+        self.client.force_login(crear_usuario('api_test', 'admin'))
+        crear_movimientos(0)
+        self.farmacia = Farmacia.objects.get()
+        Movimiento.objects.bulk_create([
+            Movimiento(codigo=f'TR-{i}', tipo='DIRECTO', estado='EN_PROCESO', destino='D', farmacia_origen=self.farmacia)
+            for i in range(30)
+        ])
+        reconstruir_resumen()
+
+    def test_lote_un_update_con_resumen_y_bitacora(self):
+        ids = list(Movimiento.objects.values_list('pk', flat=True))
+        Movimiento.objects.filter(pk=ids[0]).update(estado='ANULADO')
+        Movimiento.objects.filter(pk=ids[1]).update(version=5)
+        reconstruir_resumen()
+        seleccion = [(pk, 1) for pk in ids] + [999999]
+
+        with CaptureQueriesContext(connection) as ctx:
+            resultado = transicionar(seleccion, 'COMPLETADO', usuario='admin_test', motivo='Cierre de turno')
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "movimiento"')]
+        self.assertEqual(len(updates), 1)
+
+        self.assertEqual(len(resultado['actualizados']), 28)
+        self.assertEqual(resultado['conflictos'], {
+            ids[0]: 'estado inválido', ids[1]: 'versión distinta', 999999: 'no existe',
+        })
+        self.assertEqual(Movimiento.objects.filter(estado='COMPLETADO', version=2).count(), 28)
+        self.assertEqual(TransicionMovimiento.objects.filter(usuario='admin_test', estado_nuevo='COMPLETADO').count(), 28)
+
+        incremental = sorted(ResumenMovimientoDiario.objects.filter(total__gt=0).values_list('estado', 'total'))
+        reconstruir_resumen()
+        self.assertEqual(incremental, sorted(ResumenMovimientoDiario.objects.filter(total__gt=0).values_list('estado', 'total')))
+
+    def test_version_desactualizada_y_transicion_invalida(self):
+        movimiento = Movimiento.objects.first()
+        copia = Movimiento.objects.get(pk=movimiento.pk)
+        movimiento.estado = 'COMPLETADO'
+        movimiento.save()
+        self.assertEqual(movimiento.version, 2)
+        self.assertEqual(movimiento.transiciones.get().estado_anterior, 'EN_PROCESO')
+
+        copia.descripcion = 'Cambio viejo'
+        with self.assertRaises(VersionDesactualizada):
+            copia.save()
+        self.assertEqual(copia.version, 1)
+
+        crear_usuario('admin_test', 'admin')
+        self.client.login(username='admin_test', password='Clave123@')
+        motorista = Motorista.objects.get()
+        datos = {
+            'codigo': movimiento.codigo, 'tipo': 'DIRECTO', 'farmacia_origen': self.farmacia.pk, 'destino': 'D',
+            'motorista': motorista.pk, 'moto': motorista.moto_id, 'estado': 'ANULADO', 'version': 1,
+        }
+        response = self.client.post(reverse('movimiento_update', args=[movimiento.pk]), datos)
+        self.assertContains(response, 'Otro usuario modificó este movimiento')
+
+        response = self.client.post(reverse('movimiento_update', args=[movimiento.pk]), {**datos, 'estado': 'EN_PROCESO', 'version': 2})
+        self.assertContains(response, 'No se puede pasar de Completado a En proceso')
+
+        response = self.client.post(reverse('movimiento_update', args=[movimiento.pk]), {**datos, 'version': 2})
+        self.assertRedirects(response, reverse('movimiento_list'))
+        self.assertEqual(Movimiento.objects.get(pk=movimiento.pk).estado, 'ANULADO')
+
+    def test_api_transicion_y_lote(self):
+        movimiento = Movimiento.objects.first()
+        url = f'/api_movimientos/{movimiento.pk}/transicion/'
+        response = self.client.post(url, {'estado': 'COMPLETADO', 'version': 3}, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        response = self.client.post(url, {'estado': 'COMPLETADO', 'version': 1}, content_type='application/json')
+        self.assertEqual((response.data['estado'], response.data['version']), ('COMPLETADO', 2))
+
+        response = self.client.patch(
+            f'/api_movimientos/{movimiento.pk}/', {'descripcion': 'x', 'version': 1}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 409)
+
+        ids = list(Movimiento.objects.filter(estado='EN_PROCESO').values_list('pk', flat=True))
+        response = self.client.post(
+            '/api_movimientos/transiciones/', {'estado': 'ANULADO', 'movimientos': ids + [{'id': movimiento.pk, 'version': 1}]},
+            content_type='application/json',
+        )
+        self.assertEqual(len(response.data['actualizados']), len(ids))
+        self.assertEqual(response.data['conflictos'], {movimiento.pk: 'versión distinta'})
+
+    def test_vista_de_lote(self):
+        crear_usuario('recep_test', 'recepcionista')
+        self.client.login(username='recep_test', password='Clave123@')
+        seleccion = [f'{pk}:1' for pk in Movimiento.objects.values_list('pk', flat=True)[:5]]
+        response = self.client.post(reverse('movimiento_transicion'), {'estado': 'COMPLETADO', 'seleccion': seleccion})
+        self.assertRedirects(response, reverse('movimiento_list2'))
+        self.assertEqual(Movimiento.objects.filter(estado='COMPLETADO').count(), 5)
+        self.assertEqual(TransicionMovimiento.objects.filter(usuario='recep_test').count(), 5)
+
+
+class LoteApiTests(TestCase):
+    """/api_<modelo>/lote/: resultados por ítem, SQL por conjunto e idempotencia"""
+
+    def setUp(self):
+        self.client.force_login(crear_usuario('api_test', 'admin'))
+        crear_movimientos(0)
+        self.farmacia = Farmacia.objects.get()
+        self.motorista = Motorista.objects.get()
+
+    def lote(self, metodo, datos, ruta='/api_movimientos/lote/', **cabeceras):
+        return getattr(self.client, metodo)(ruta, datos, content_type='application/json', **cabeceras)
+
+    def movimiento(self, **extra):
+        return {'tipo': 'DIRECTO', 'estado': 'COMPLETADO', 'destino': 'D', 'farmacia_origen': self.farmacia.pk, **extra}
+
+    def test_alta_en_lote_con_resultados_por_item(self):
+        Movimiento.objects.create(codigo='DUP', tipo='DIRECTO', destino='D', farmacia_origen=self.farmacia)
+        items = [self.movimiento() for _ in range(50)] + [
+            self.movimiento(farmacia_origen=999999),
+            self.movimiento(codigo='DUP'),
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.lote('post', items)
+        self.assertLess(len(ctx.captured_queries), 30)
+
+        self.assertEqual(response.status_code, 207)
+        resultados = response.data['resultados']
+        self.assertEqual([r['estado'] for r in resultados], [201] * 50 + [400, 400])
+        self.assertIn('farmacia_origen', resultados[50]['errores'])
+        self.assertIn('codigo', resultados[51]['errores'])
+        self.assertEqual(Movimiento.objects.count(), 51)
+        self.assertEqual(len(set(r['datos']['codigo'] for r in resultados[:50])), 50)
+
+        incremental = sorted(ResumenMovimientoDiario.objects.filter(total__gt=0).values_list('estado', 'total'))
+        reconstruir_resumen()
+        self.assertEqual(incremental, sorted(ResumenMovimientoDiario.objects.filter(total__gt=0).values_list('estado', 'total')))
+
+    def test_restriccion_de_la_base_por_item(self):
+        # Dos EN_PROCESO para el mismo motorista: la restricción parcial rechaza el segundo
+        items = [
+            self.movimiento(estado='EN_PROCESO', motorista=self.motorista.pk),
+            self.movimiento(estado='EN_PROCESO', motorista=self.motorista.pk),
+        ]
+        response = self.lote('post', items)
+        self.assertEqual([r['estado'] for r in response.data['resultados']], [201, 409])
+        self.assertEqual(Movimiento.objects.filter(estado='EN_PROCESO').count(), 1)
+
+    def test_cambios_y_bajas_en_lote(self):
+        creados = self.lote('post', [self.movimiento(estado='EN_PROCESO') for _ in range(5)]).data['resultados']
+        ids = [r['id'] for r in creados]
+        cambios = [{'id': pk, 'estado': 'COMPLETADO', 'version': 1} for pk in ids[:3]] + [
+            {'id': ids[3], 'estado': 'COMPLETADO', 'version': 7},
+            {'id': 999999, 'destino': 'X'},
+            {'id': [ids[4]], 'destino': 'X'},
+            {'id': {'a': 1}, 'destino': 'X'},
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.lote('patch', cambios)
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "movimiento"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual([r['estado'] for r in response.data['resultados']], [200, 200, 200, 409, 400, 400, 400])
+        self.assertEqual(Movimiento.objects.filter(estado='COMPLETADO', version=2).count(), 3)
+        self.assertEqual(TransicionMovimiento.objects.filter(estado_nuevo='COMPLETADO').count(), 3)
+
+        response = self.lote('delete', {'ids': ids[:2] + [999999, [1], True]})
+        self.assertEqual([r['estado'] for r in response.data['resultados']], [200, 200, 404, 400, 400])
+        self.assertEqual(Movimiento.objects.count(), 3)
+
+    def test_idempotency_key(self):
+        items = [self.movimiento() for _ in range(3)]
+        primera = self.lote('post', items, HTTP_IDEMPOTENCY_KEY='lote-1')
+        self.assertEqual(primera.status_code, 201)
+
+        with CaptureQueriesContext(connection) as ctx:
+            reintento = self.lote('post', items, HTTP_IDEMPOTENCY_KEY='lote-1')
+        self.assertFalse([q for q in ctx.captured_queries if 'INSERT INTO "movimiento"' in q['sql']])
+        self.assertEqual(reintento.status_code, 201)
+        self.assertEqual(reintento['Idempotent-Replayed'], 'true')
+        self.assertEqual(reintento.json(), primera.json())
+        self.assertEqual(Movimiento.objects.count(), 3)
+
+        otro = self.lote('post', items[:1], HTTP_IDEMPOTENCY_KEY='lote-1')
+        self.assertEqual(otro.status_code, 422)
+
+        # La misma clave de otro usuario es otra solicitud
+        self.client.force_login(crear_usuario('api_otro', 'admin'))
+        ajena = self.lote('post', items[:1], HTTP_IDEMPOTENCY_KEY='lote-1')
+        self.assertEqual(ajena.status_code, 201)
+        self.assertFalse(ajena.has_header('Idempotent-Replayed'))
+        self.assertEqual(Movimiento.objects.count(), 4)
+
+        # Vencida, la clave vuelve a ejecutarse; el comando purga las que quedan
+        SolicitudIdempotente.objects.update(fecha_creacion=timezone.now() - timedelta(days=2))
+        self.assertEqual(self.lote('post', items[:1], HTTP_IDEMPOTENCY_KEY='lote-1').status_code, 201)
+        call_command('purgar_vencidos', stdout=io.StringIO())
+        self.assertEqual(SolicitudIdempotente.objects.count(), 1)
+
+        catalogo = self.lote('post', [{'patente': 'ZZ0001', 'marca': 'Honda', 'modelo': 'CB', 'anio': 2022}], ruta='/api_motos/lote/')
+        self.assertEqual(catalogo.status_code, 201)
+        self.assertTrue(Moto.objects.filter(patente='ZZ0001').exists())
+
+
+class ApiCondicionalTests(TestCase):
+    """ETag / Last-Modified: sin cambios el cliente recibe 304 sin serializar"""
+
+    def setUp(self):
+        self.client.force_login(crear_usuario('api_test', 'admin'))
+        crear_movimientos(3)
+
+    def test_listado_304_y_cambios(self):
+        primera = self.client.get('/api_movimientos/')
+        etag = primera['ETag']
+        with mock.patch('App.views.MovimientoSerializer.to_representation') as serializar:
+            # Sesión, usuario y agregados
+            with self.assertNumQueries(3):
+                response = self.client.get('/api_movimientos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(serializar.called)
+        self.assertEqual(response['ETag'], etag)
+
+        # Otra proyección es otro cuerpo
+        self.assertEqual(self.client.get('/api_movimientos/?fields=codigo', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # El listado no usa fechas: un borrado no mueve MAX(fecha_actualizacion)
+        self.assertNotIn('Last-Modified', primera)
+        ultima = http_date(Movimiento.objects.aggregate(m=Max('fecha_actualizacion'))['m'].timestamp())
+        Movimiento.objects.order_by('fecha_actualizacion').first().delete()
+        self.assertEqual(self.client.get('/api_movimientos/', HTTP_IF_MODIFIED_SINCE=ultima).status_code, 200)
+        response = self.client.get('/api_movimientos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detalle_y_catalogos(self):
+        motorista = Motorista.objects.get()
+        url = f'/api_motoristas/{motorista.pk}/'
+        primera = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=primera['Last-Modified']).status_code, 304)
+
+        # El cambio de moto llega por QuerySet.update en la señal de la asignación
+        nueva = Moto.objects.create(patente='ZZ9999', marca='Honda', modelo='CB', anio=2022)
+        AsignacionMoto.objects.filter(motorista=motorista, activa=True).update(activa=False)
+        AsignacionMoto.objects.create(motorista=motorista, moto=nueva)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['moto'], nueva.pk)
+
+        # Borrar la farmacia deja farmacia=null: también cambia el ETag
+        etag = response['ETag']
+        Farmacia.objects.get().delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.assertEqual(self.client.get('/api_motoristas/999999/').status_code, 404)
+
+
+@override_settings(SINCRONIZACION_RETRASO_SEGUNDOS=0)
+class FeedCambiosTests(TestCase):
+    """/api_movimientos/cambios/: solo lo posterior al cursor, por páginas"""
+
+    def setUp(self):
+        self.client.force_login(crear_usuario('api_test', 'admin'))
+        crear_movimientos(5)
+
+    def cambios(self, since=None, **params):
+        if since:
+            params['since'] = since
+        response = self.client.get('/api_movimientos/cambios/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_sincronizacion_inicial_y_cambios(self):
+        vistos, cursor = [], None
+        while True:
+            pagina = self.cambios(cursor, tamano=2)
+            vistos += [m['id'] for m in pagina['cambios']]
+            cursor = pagina['siguiente']
+            if not pagina['hay_mas']:
+                break
+        self.assertEqual(sorted(vistos), sorted(Movimiento.objects.values_list('id', flat=True)))
+        self.assertEqual(self.cambios(cursor)['cambios'], [])
+
+        modificado, eliminado = Movimiento.objects.order_by('id')[:2]
+        modificado.descripcion = 'Cambiada'
+        modificado.save()
+        self.client.delete(f'/api_movimientos/{eliminado.pk}/')
+        nuevo = Movimiento.objects.create(
+            tipo=modificado.tipo, farmacia_origen=modificado.farmacia_origen,
+            motorista=modificado.motorista, moto=modificado.moto, destino='Destino', estado='COMPLETADO',
+        )
+
+        pagina = self.cambios(cursor)
+        self.assertEqual([m['id'] for m in pagina['cambios']], [modificado.pk, nuevo.pk])
+        self.assertEqual(pagina['eliminados'], [eliminado.pk])
+        self.assertEqual(MovimientoEliminado.objects.get().codigo, eliminado.codigo)
+        siguiente = self.cambios(pagina['siguiente'])
+        self.assertEqual((siguiente['cambios'], siguiente['eliminados']), ([], []))
+
+    def test_consultas_independientes_del_tamano(self):
+        cursor = self.cambios()['siguiente']
+        Movimiento.objects.order_by('id').first().save()
+        # Sesión + usuario + cambios + eliminados
+        with self.assertNumQueries(4):
+            pagina = self.cambios(cursor, fields='id,codigo,fecha_actualizacion')
+        self.assertEqual(len(pagina['cambios']), 1)
+
+    def test_cursor_invalido_y_vencido(self):
+        self.assertEqual(self.client.get('/api_movimientos/cambios/?since=basura').status_code, 400)
+        for valores in ([None, None, None, None], ['2026-01-01T00:00:00', 1, None, None], [None, 'x', None, None]):
+            since = codificar_cursor(valores)
+            self.assertEqual(self.client.get('/api_movimientos/cambios/', {'since': since}).status_code, 400)
+        cursor = self.cambios()['siguiente']
+        with override_settings(SINCRONIZACION_DIAS_ELIMINADOS=0):
+            self.assertEqual(self.client.get('/api_movimientos/cambios/', {'since': cursor}).status_code, 410)
+
+    def test_escrituras_masivas_con_fecha_de_la_base(self):
+        cursor = self.cambios()['siguiente']
+        primero, segundo = Movimiento.objects.order_by('id')[:2]
+        transicionar([primero.pk], 'ANULADO')
+        self.client.patch(
+            '/api_movimientos/lote/', [{'id': segundo.pk, 'destino': 'Otro'}], content_type='application/json',
+        )
+        self.assertEqual([m['id'] for m in self.cambios(cursor)['cambios']], [primero.pk, segundo.pk])
+
+    def test_purga_fuera_del_request(self):
+        Movimiento.objects.first().delete()
+        MovimientoEliminado.objects.update(fecha_eliminacion=timezone.now() - timedelta(days=31))
+        self.cambios()
+        self.assertEqual(MovimientoEliminado.objects.count(), 1)
+        call_command('purgar_vencidos', stdout=io.StringIO())
+        self.assertFalse(MovimientoEliminado.objects.exists())
+
+
+class ApiPermisosTests(TestCase):
+    """La API exige sesión y aplica los mismos roles que las vistas del sitio"""
+
+    def setUp(self):
+        crear_movimientos(1)
+
+    def test_anonimo_no_lee_ni_escribe(self):
+        self.assertEqual(self.client.get('/api_motoristas/').status_code, 403)
+        moto = {'patente': 'ZZ0001', 'marca': 'Honda', 'modelo': 'CB', 'anio': 2022}
+        self.assertEqual(self.client.post('/api_motos/lote/', [moto], content_type='application/json').status_code, 403)
+        self.assertEqual(self.client.get('/api_movimientos/cambios/').status_code, 403)
+        self.assertFalse(Moto.objects.filter(patente='ZZ0001').exists())
+
+    def test_recepcionista_solo_movimientos(self):
+        self.client.force_login(crear_usuario('recep_test', 'recepcionista'))
+        self.assertEqual(self.client.get('/api_motoristas/').status_code, 403)
+        self.assertEqual(self.client.get('/api_movimientos/').status_code, 200)
+        movimiento = Movimiento.objects.get()
+        self.assertEqual(self.client.delete(f'/api_movimientos/{movimiento.pk}/').status_code, 403)
+
+    def test_lectura_async_con_roles(self):
+        url = reverse('lectura_async', args=['motoristas'])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(crear_usuario('recep_test', 'recepcionista'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(reverse('lectura_async', args=['movimientos'])).status_code, 200)
@@ -0,0 +1,120 @@
+"""
+Cola de trabajos de reportes respaldada en la base de datos.
+
+La vista solo encola un TrabajoReporte y responde de inmediato; el PDF lo
+genera `python manage.py procesar_reportes`, que reparte los trabajos en
+un pool de procesos. Un trabajo se toma con un UPDATE condicional
+(estado = PENDIENTE), así varios workers pueden correr a la vez sin
+procesar dos veces el mismo trabajo.
+
+Mientras un trabajo está EN_CURSO su worker renueva `latido` en cada
+vuelta del loop. Solo se reencola el que lleva LATIDO_VENCIDO sin latido:
+su worker murió. Un PDF que simplemente tarda no se genera dos veces.
+"""
+import os
+import shutil
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .cache_reportes import CacheReportes, clave_cache
+from .models import Movimiento, ReporteMovimiento, TrabajoReporte
+from .reportes import filtrar_periodo, generar_pdf_movimientos, normalizar_periodo
+from .resumen import resumen_periodo
+
+# Minutos sin latido tras los cuales un trabajo EN_CURSO se da por huérfano
+LATIDO_VENCIDO = 2
+
+
+def encolar_reporte(usuario, tipo, fecha=None, mes=None, anio=None):
+    """Crea el registro de auditoría del reporte y su trabajo pendiente"""
+    reporte = ReporteMovimiento.objects.create(
+        tipo=tipo,
+        generado_por=usuario.username,
+        total_movimientos=resumen_periodo(tipo, fecha, mes, anio)['total'],
+    )
+    return TrabajoReporte.objects.create(
+        reporte=reporte,
+        solicitado_por=usuario,
+        fecha=fecha or '',
+        mes=mes or '',
+        anio=anio or '',
+    )
+
+
+def tomar_trabajo():
+    """Marca como EN_CURSO el trabajo pendiente más antiguo y lo devuelve"""
+    pendientes = (
+        TrabajoReporte.objects
+        .filter(estado='PENDIENTE')
+        .order_by('fecha_creacion')
+        .values_list('pk', flat=True)
+    )
+    for pk in pendientes[:10]:
+        ahora = timezone.now()
+        tomado = TrabajoReporte.objects.filter(pk=pk, estado='PENDIENTE').update(
+            estado='EN_CURSO', fecha_inicio=ahora, latido=ahora
+        )
+        if tomado:
+            return TrabajoReporte.objects.get(pk=pk)
+    return None
+
+
+def renovar_latidos(trabajo_ids):
+    """Los trabajos siguen vivos en este worker"""
+    if trabajo_ids:
+        TrabajoReporte.objects.filter(pk__in=list(trabajo_ids), estado='EN_CURSO').update(latido=timezone.now())
+
+
+def reencolar_colgados(minutos=LATIDO_VENCIDO):
+    """Devuelve a la cola los trabajos cuyo worker dejó de dar latidos"""
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return TrabajoReporte.objects.filter(estado='EN_CURSO', latido__lt=limite).update(
+        estado='PENDIENTE', fecha_inicio=None, latido=None
+    )
+
+
+def ruta_archivo(trabajo):
+    return os.path.join(settings.REPORTES_DIR, trabajo.archivo)
+
+
+def ejecutar_trabajo(trabajo_id):
+    """Genera el PDF de un trabajo ya tomado. Se ejecuta en un proceso del pool"""
+    trabajo = TrabajoReporte.objects.select_related('reporte').get(pk=trabajo_id)
+    tipo = trabajo.reporte.tipo
+    nombre = f"reporte_{trabajo.pk}_{tipo.lower()}.pdf"
+    destino = os.path.join(settings.REPORTES_DIR, nombre)
+    temporal = f"{destino}.tmp"
+
+    try:
+        os.makedirs(settings.REPORTES_DIR, exist_ok=True)
+        periodo = normalizar_periodo(tipo, trabajo.fecha, trabajo.mes, trabajo.anio)
+        cache = CacheReportes()
+        clave = clave_cache(*periodo) if periodo else None
+        cacheado = cache.abrir(clave) if clave else None
+
+        if cacheado:
+            with cacheado, open(temporal, 'wb') as salida:
+                shutil.copyfileobj(cacheado, salida)
+        else:
+            _, fecha, mes, anio = periodo or (tipo, trabajo.fecha, trabajo.mes, trabajo.anio)
+            movimientos = filtrar_periodo(Movimiento.objects.all(), tipo, fecha, mes, anio)
+            with open(temporal, 'wb') as salida:
+                for parte in generar_pdf_movimientos(movimientos, tipo, fecha, mes, anio):
+                    salida.write(parte)
+            if clave:
+                cache.guardar_archivo(clave, temporal)
+        os.replace(temporal, destino)
+    except Exception as e:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        TrabajoReporte.objects.filter(pk=trabajo.pk).update(
+            estado='ERROR', error=str(e), fecha_fin=timezone.now()
+        )
+        return 'ERROR'
+
+    TrabajoReporte.objects.filter(pk=trabajo.pk).update(
+        estado='LISTO', archivo=nombre, fecha_fin=timezone.now()
+    )
+    return 'LISTO'
@@ -0,0 +1,152 @@
+"""
+Máquina de estados de Movimiento y transiciones en lote.
+
+Los cambios de estado permitidos están en Movimiento.TRANSICIONES. Un
+movimiento se identifica por su id o por el par (id, version) que el
+cliente leyó; con versión, la transición solo se aplica si nadie lo
+guardó entretanto (bloqueo optimista, ver Movimiento.save).
+
+`transicionar` cierra cientos de movimientos (p. ej. al terminar el
+turno) con un SELECT ... FOR UPDATE y un único UPDATE condicionado por
+estado y versión por cada lote, en vez de un save() por fila. Como
+QuerySet.update no dispara señales, aquí se registran la bitácora
+(TransicionMovimiento), la tabla resumen, las versiones del cache de
+reportes, el índice de despacho y los eventos en vivo.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from .cache_reportes import incrementar_versiones
+from .eventos import publicar
+from .models import Movimiento, TransicionMovimiento, VersionDesactualizada
+from .resumen import ajustar_resumen, clave_resumen
+from .signals import refrescar_despacho
+
+LOTE = 500
+
+NO_EXISTE = 'no existe'
+ESTADO_INVALIDO = 'estado inválido'
+VERSION_DISTINTA = 'versión distinta'
+
+
+def permitida(origen, destino):
+    return destino in Movimiento.TRANSICIONES.get(origen, ())
+
+
+def origenes_de(destino):
+    """Estados desde los que se puede llegar a `destino`"""
+    return [origen for origen, destinos in Movimiento.TRANSICIONES.items() if destino in destinos]
+
+
+def _normalizar(movimientos):
+    """{id: version o None} a partir de ids o pares (id, version)"""
+    versiones = {}
+    for movimiento in movimientos:
+        if isinstance(movimiento, (tuple, list)):
+            pk, version = movimiento
+            versiones[int(pk)] = None if version is None else int(version)
+        else:
+            versiones[int(movimiento)] = None
+    return versiones
+
+
+def _condicion(versiones):
+    sin_version = [pk for pk, version in versiones.items() if version is None]
+    condicion = Q(pk__in=sin_version)
+    for pk, version in versiones.items():
+        if version is not None:
+            condicion |= Q(pk=pk, version=version)
+    return condicion
+
+
+def _conflictos(versiones):
+    """Motivo por el que cada id de `versiones` no se pudo transicionar"""
+    if not versiones:
+        return {}
+    actuales = {
+        pk: (estado, version)
+        for pk, estado, version in Movimiento.objects.filter(pk__in=list(versiones)).values_list('pk', 'estado', 'version')
+    }
+    conflictos = {}
+    for pk, version in versiones.items():
+        if pk not in actuales:
+            conflictos[pk] = NO_EXISTE
+        elif version is not None and actuales[pk][1] != version:
+            conflictos[pk] = VERSION_DISTINTA
+        else:
+            conflictos[pk] = ESTADO_INVALIDO
+    return conflictos
+
+
+def _transicionar_lote(versiones, destino, usuario, motivo, ahora):
+    filas = list(
+        Movimiento.objects.select_for_update()
+        .filter(_condicion(versiones), estado__in=origenes_de(destino))
+        .values_list('pk', 'codigo', 'tipo', 'estado', 'version', 'fecha_registro',
+                     'farmacia_origen_id', 'motorista_id', 'moto_id')
+    )
+    ids = [fila[0] for fila in filas]
+    movidos = set(ids)
+    conflictos = _conflictos({pk: v for pk, v in versiones.items() if pk not in movidos})
+    if not ids:
+        return ids, conflictos
+
+    # Las filas están bloqueadas: si el conteo no cuadra, alguien se saltó el bloqueo
+    actualizados = Movimiento.objects.filter(pk__in=ids, estado__in=origenes_de(destino)).update(
+        # Now() de la base: el feed de cambios (App/sincronizacion.py) lee hasta
+        # el inicio de la transacción abierta más antigua
+        estado=destino, version=F('version') + 1, fecha_actualizacion=Now(),
+    )
+    if actualizados != len(ids):
+        raise VersionDesactualizada(f"Se esperaban {len(ids)} movimientos y se actualizaron {actualizados}")
+
+    TransicionMovimiento.objects.bulk_create([
+        TransicionMovimiento(
+            movimiento_id=pk, estado_anterior=estado, estado_nuevo=destino,
+            version=version + 1, usuario=usuario, motivo=motivo, fecha=ahora,
+        )
+        for pk, _, _, estado, version, *_ in filas
+    ])
+
+    deltas = Counter()
+    for _, _, tipo, estado, _, fecha, farmacia_id, _, _ in filas:
+        deltas[clave_resumen(fecha, farmacia_id, tipo, estado)] -= 1
+        deltas[clave_resumen(fecha, farmacia_id, tipo, destino)] += 1
+    ajustar_resumen(deltas)
+    incrementar_versiones([fila[5] for fila in filas])
+    refrescar_despacho([fila[7] for fila in filas if fila[7]], [fila[8] for fila in filas if fila[8]])
+
+    eventos = [
+        {'id': pk, 'codigo': codigo, 'tipo': tipo, 'estado': destino, 'estado_anterior': estado, 'version': version + 1}
+        for pk, codigo, tipo, estado, version, *_ in filas
+    ]
+
+    def publicar_eventos():
+        for datos in eventos:
+            publicar('estado', datos)
+    transaction.on_commit(publicar_eventos)
+    return ids, conflictos
+
+
+def transicionar(movimientos, destino, usuario='', motivo='', lote=LOTE):
+    """
+    Lleva `movimientos` (ids o pares (id, version)) al estado `destino`.
+
+    Los que no se pueden mover no detienen al resto: vuelven en
+    'conflictos' como {id: motivo}. Todo corre en una sola transacción.
+    """
+    if destino not in dict(Movimiento.ESTADO_MOVIMIENTO):
+        raise ValueError(f"Estado desconocido: {destino}")
+    versiones = list(_normalizar(movimientos).items())
+    ahora = timezone.now()
+    resultado = {'actualizados': [], 'conflictos': {}}
+    with transaction.atomic():
+        for inicio in range(0, len(versiones), lote):
+            ids, conflictos = _transicionar_lote(dict(versiones[inicio:inicio + lote]), destino, usuario, motivo, ahora)
+            resultado['actualizados'].extend(ids)
+            resultado['conflictos'].update(conflictos)
+    return resultado
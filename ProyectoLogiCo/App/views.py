@@ -3,23 +3,46 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.views.decorators.http import require_http_methods
-from django.http import JsonResponse, HttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_http_methods
+from django.http import FileResponse, Http404, JsonResponse, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.db import IntegrityError, transaction
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.conf import settings
 from datetime import timedelta
+from functools import wraps
 
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+from asgiref.sync import iscoroutinefunction, sync_to_async
 
 from .models import (
     Employee, Farmacia, Moto, Motorista, Movimiento, 
     AsignacionMoto, AsignacionFarmacia, ReporteMovimiento, UsuarioRol,
-    PasswordRecoveryCode
+    PasswordRecoveryCode, TrabajoReporte, VersionDesactualizada, es_admin, rol_de
 )
 from .forms import (
     FarmaciaForm, MotoForm, MotoristaForm, 
     MovimientoForm, AsignacionMotoForm, AsignacionFarmaciaForm
 )
+from . import territorio
+from .autocompletar import AUTOCOMPLETABLES, abuscar as buscar_autocompletar
+from .despacho import indice as indice_despacho
+from .eventos import flujo_eventos
+from .importacion import FORMATOS, IMPORTABLES, formato_de, importar, leer_filas
+from . import lecturas
+from .listados import LISTADOS, movimientos_listado, paginar_keyset
+from .metricas import registro as registro_metricas
+from .cache_reportes import CacheReportes, clave_cache
+from .codigos import asignador as asignador_codigos
+from .reportes import (
+    filtrar_periodo, generar_csv_movimientos, generar_ndjson_movimientos, generar_pdf_movimientos,
+    normalizar_periodo,
+)
+from .resumen import resumen_periodo
+from .trabajos import encolar_reporte, ruta_archivo
+from . import sincronizacion
+from .transiciones import transicionar
 
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
@@ -27,8 +50,37 @@ from rest_framework.response import Response
 # DECORADORES PERSONALIZADOS
 # =====================================================
 
-
-
+def rol_requerido(*roles, roles_de=None):
+    """
+    Reemplaza @login_required + @user_passes_test(es_...). Sin roles solo
+    exige sesión iniciada. Con roles_de(**kwargs) los roles dependen de la
+    URL (p. ej. el modelo de lectura_async) y sin el rol se responde 403.
+    """
+    def decorador(vista):
+        if roles:
+            vista = user_passes_test(lambda user: rol_de(user) in roles, login_url='login')(vista)
+        if roles_de:
+            vista = _roles_por_url(vista, roles_de)
+        return login_required(vista, login_url='login')
+    return decorador
+
+
+def _roles_por_url(vista, roles_de):
+    if iscoroutinefunction(vista):
+        @wraps(vista)
+        async def envoltura(request, *args, **kwargs):
+            # Con el ModelBackend user.rol es una consulta perezosa: fuera del loop
+            rol = await sync_to_async(rol_de)(await request.auser())
+            if rol not in roles_de(**kwargs):
+                return HttpResponse(status=403)
+            return await vista(request, *args, **kwargs)
+    else:
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if rol_de(request.user) not in roles_de(**kwargs):
+                return HttpResponse(status=403)
+            return vista(request, *args, **kwargs)
+    return envoltura
 
 
 # =====================================================
@@ -36,67 +88,157 @@ from rest_framework.response import Response
 # =====================================================
 
 from rest_framework import serializers, viewsets
+from rest_framework.decorators import action
+
+from .api import (
+    CamposDinamicosMixin, CondicionalMixin, Conflicto, CursorCatalogo, CursorMovimientos, ProyeccionMixin,
+)
+from .lotes import EscrituraLoteMixin
 
 # SERIALIZERS
-class FarmaciaSerializer(serializers.ModelSerializer):
+class FarmaciaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Farmacia
         fields = '__all__'
 
-class MotoSerializer(serializers.ModelSerializer):
+class MotoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Moto
         fields = '__all__'
 
-class MotoristaSerializer(serializers.ModelSerializer):
+class MotoristaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Motorista
         fields = '__all__'
+        expandibles = {
+            'farmacia': FarmaciaSerializer,
+            'moto': MotoSerializer,
+        }
 
-class MovimientoSerializer(serializers.ModelSerializer):
+class MovimientoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Movimiento
         fields = '__all__'
+        expandibles = {
+            'farmacia_origen': FarmaciaSerializer,
+            'motorista': MotoristaSerializer,
+            'moto': MotoSerializer,
+        }
+
+    def validate_estado(self, estado):
+        anterior = self.instance.estado if self.instance else None
+        if anterior and estado != anterior and estado not in Movimiento.TRANSICIONES[anterior]:
+            raise serializers.ValidationError(f"No se puede pasar de {anterior} a {estado}.")
+        return estado
+
+    def validate(self, datos):
+        # Al crear la versión siempre parte en 1; al editar es la que leyó el cliente
+        if self.instance is None:
+            datos.pop('version', None)
+        return datos
+
+
+class TransicionSerializer(serializers.Serializer):
+    estado = serializers.ChoiceField(choices=Movimiento.ESTADO_MOVIMIENTO)
+    version = serializers.IntegerField(required=False)
+    motivo = serializers.CharField(max_length=200, required=False, default='')
+
+
+class TransicionLoteSerializer(serializers.Serializer):
+    """movimientos: [id, ...] o [{"id": .., "version": ..}, ...]"""
+    estado = serializers.ChoiceField(choices=Movimiento.ESTADO_MOVIMIENTO)
+    movimientos = serializers.ListField(child=serializers.JSONField(), min_length=1, max_length=5000)
+    motivo = serializers.CharField(max_length=200, required=False, default='')
+
+    def validate_movimientos(self, movimientos):
+        pares = []
+        for movimiento in movimientos:
+            if isinstance(movimiento, dict):
+                pk, version = movimiento.get('id'), movimiento.get('version')
+            else:
+                pk, version = movimiento, None
+            if not isinstance(pk, int) or not (version is None or isinstance(version, int)):
+                raise serializers.ValidationError('Cada movimiento es un id o {"id": .., "version": ..} enteros.')
+            pares.append((pk, version))
+        return pares
 
 # VIEWSETS
-class FarmaciaViewSet(viewsets.ModelViewSet):
+class FarmaciaViewSet(EscrituraLoteMixin, CondicionalMixin, ProyeccionMixin, viewsets.ModelViewSet):
     queryset = Farmacia.objects.all()
     serializer_class = FarmaciaSerializer
+    pagination_class = CursorCatalogo
 
-class MotoViewSet(viewsets.ModelViewSet):
+class MotoViewSet(EscrituraLoteMixin, CondicionalMixin, ProyeccionMixin, viewsets.ModelViewSet):
     queryset = Moto.objects.all()
     serializer_class = MotoSerializer
+    pagination_class = CursorCatalogo
 
-class MotoristaViewSet(viewsets.ModelViewSet):
+class MotoristaViewSet(EscrituraLoteMixin, CondicionalMixin, ProyeccionMixin, viewsets.ModelViewSet):
     queryset = Motorista.objects.all()
     serializer_class = MotoristaSerializer
+    pagination_class = CursorCatalogo
 
-class MovimientoViewSet(viewsets.ModelViewSet):
+class MovimientoViewSet(EscrituraLoteMixin, CondicionalMixin, ProyeccionMixin, viewsets.ModelViewSet):
     queryset = Movimiento.objects.all()
     serializer_class = MovimientoSerializer
-
-def es_admin(user):
-    """Verifica si el usuario es admin"""
-    try:
-        return user.rol.rol == 'admin'
-    except UsuarioRol.DoesNotExist:
-        return False
-
-
-def es_recepcionista(user):
-    """Verifica si el usuario es recepcionista"""
-    try:
-        return user.rol.rol == 'recepcionista'
-    except UsuarioRol.DoesNotExist:
-        return False
-
-
-def es_admin_o_recepcionista(user):
-    """Verifica si es admin o recepcionista"""
-    try:
-        return user.rol.rol in ['admin', 'recepcionista']
-    except UsuarioRol.DoesNotExist:
-        return False
+    pagination_class = CursorMovimientos
+    # Como en el sitio: el recepcionista consulta, registra y cambia estados;
+    # editar, eliminar y los lotes quedan para el admin
+    roles_por_accion = dict.fromkeys(
+        ['list', 'retrieve', 'create', 'transicion', 'transiciones', 'cambios'], ('admin', 'recepcionista'),
+    )
+
+    def perform_update(self, serializer):
+        serializer.instance._usuario = self.request.user.username
+        try:
+            serializer.save()
+        except VersionDesactualizada:
+            raise Conflicto()
+
+    @action(detail=True, methods=['post'])
+    def transicion(self, request, pk=None):
+        """{"estado": .., "version": .., "motivo": ..} -> movimiento actualizado o 409"""
+        datos = TransicionSerializer(data=request.data)
+        datos.is_valid(raise_exception=True)
+        movimiento = self.get_object()
+        resultado = transicionar(
+            [(movimiento.pk, datos.validated_data.get('version'))], datos.validated_data['estado'],
+            request.user.username, datos.validated_data['motivo'],
+        )
+        if resultado['conflictos']:
+            raise Conflicto(f"No se aplicó la transición: {resultado['conflictos'][movimiento.pk]}.")
+        movimiento.refresh_from_db()
+        return Response(self.get_serializer(movimiento).data)
+
+    @action(detail=False, methods=['post'])
+    def transiciones(self, request):
+        """Transición en lote; los que no se pudieron mover vuelven en 'conflictos'"""
+        datos = TransicionLoteSerializer(data=request.data)
+        datos.is_valid(raise_exception=True)
+        resultado = transicionar(
+            datos.validated_data['movimientos'], datos.validated_data['estado'],
+            request.user.username, datos.validated_data['motivo'],
+        )
+        return Response(resultado)
+
+    @action(detail=False, methods=['get'])
+    def cambios(self, request):
+        """
+        Altas, cambios y bajas posteriores a ?since=<cursor> (ver App/sincronizacion.py).
+        Acepta ?fields= y ?expand= como el listado.
+        """
+        try:
+            tamano = int(request.query_params.get('tamano', sincronizacion.TAMANO))
+            resultado = sincronizacion.pagina(request.query_params.get('since'), tamano, self.get_queryset())
+        except ValueError:
+            raise serializers.ValidationError({'detail': 'Cursor o tamaño inválido.'})
+        except sincronizacion.CursorVencido:
+            return Response(
+                {'detail': 'El cursor es anterior a las bajas guardadas; sincronice desde el principio.'},
+                status=410,
+            )
+        resultado['cambios'] = self.get_serializer(resultado['cambios'], many=True).data
+        return Response(resultado)
 
 
 # =====================================================
@@ -117,35 +259,31 @@ def login_view(request):
         
         if user is not None:
             login(request, user)
-            try:
-                rol = user.rol.rol
-                if rol == 'admin':
-                    return redirect('index')
-                elif rol == 'recepcionista':
-                    return redirect('index2')
-            except UsuarioRol.DoesNotExist:
-                # Si no tiene rol asignado, ir a página principal
-                return redirect('paginaPrincipal')
+            rol = rol_de(user)
+            if rol == 'admin':
+                return redirect('index')
+            elif rol == 'recepcionista':
+                return redirect('index2')
+            # Si no tiene rol asignado, ir a página principal
+            return redirect('paginaPrincipal')
         else:
             messages.error(request, '❌ Usuario o contraseña incorrectos.')
     
     return render(request, 'login.html')
 
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def index(request):
     """Dashboard principal - Solo ADMIN"""
     return render(request, 'index.html')
 
 
-@login_required(login_url='login')
-@user_passes_test(es_recepcionista)
+@rol_requerido('recepcionista')
 def index2(request):
     """Dashboard recepcionista - Solo RECEPCIONISTA"""
     return render(request, 'index2.html')
 
-@login_required(login_url='login')
+@rol_requerido()
 def logout_view(request):
     """Cerrar sesión"""
     logout(request)
@@ -153,7 +291,7 @@ def logout_view(request):
     return redirect('paginaPrincipal')
 
 
-@login_required(login_url='login')
+@rol_requerido()
 @require_http_methods(["GET", "POST"])
 def cambiar_password(request):
     """Cambiar contraseña del usuario actual"""
@@ -178,7 +316,8 @@ def cambiar_password(request):
         
         user.set_password(new_password1)
         user.save()
-        login(request, user)
+        # Con dos backends configurados login() necesita saber cuál usar
+        login(request, user, backend='App.backends.RolBackend')
         messages.success(request, '✅ Contraseña actualizada correctamente.')
         return redirect('index')
     
@@ -369,8 +508,8 @@ def registrar_view(request):
         # Asignar rol de recepcionista
         UsuarioRol.objects.create(usuario=user, rol='recepcionista')
         
-        # Login automático del usuario
-        login(request, user)
+        # Login automático del usuario (no viene de authenticate(): se indica el backend)
+        login(request, user, backend='App.backends.RolBackend')
         
         # Refresca el usuario en la sesión para que Django reconozca el rol
         request.user = User.objects.get(pk=user.pk)
@@ -383,11 +522,11 @@ def registrar_view(request):
 # MENÚ Y REPORTES
 # =====================================================
 
-@login_required(login_url='login')
+@rol_requerido()
 def reportes_menu(request):
     return render(request, 'reportes_menu.html')
 
-@login_required(login_url='login')
+@rol_requerido()
 def reportes_menu2(request):
     return render(request, 'reportes_menu2.html')
 
@@ -395,15 +534,13 @@ def reportes_menu2(request):
 # CRUD FARMACIA - SOLO ADMIN
 # =====================================================
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def farmacia_list(request):
-    farmacias = Farmacia.objects.all()
-    return render(request, 'farmacia_list.html', {'farmacias': farmacias})
+    contexto = LISTADOS['farmacia'].contexto(request)
+    return render(request, 'farmacia_list.html', {'farmacias': contexto['pagina'], **contexto})
 
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def farmacia_create(request):
     if request.method == 'POST':
         form = FarmaciaForm(request.POST)
@@ -415,8 +552,7 @@ def farmacia_create(request):
     return render(request, 'farmacia_form.html', {'form': form})
 
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def farmacia_update(request, pk):
     farmacia = get_object_or_404(Farmacia, pk=pk)
     if request.method == 'POST':
@@ -429,8 +565,7 @@ def farmacia_update(request, pk):
     return render(request, 'farmacia_form.html', {'form': form})
 
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def farmacia_delete(request, pk):
     farmacia = get_object_or_404(Farmacia, pk=pk)
     if request.method == 'POST':
@@ -443,15 +578,13 @@ def farmacia_delete(request, pk):
 # CRUD MOTO - SOLO ADMIN
 # =====================================================
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def moto_list(request):
-    motos = Moto.objects.all()
-    return render(request, 'moto_list.html', {'motos': motos})
+    contexto = LISTADOS['moto'].contexto(request)
+    return render(request, 'moto_list.html', {'motos': contexto['pagina'], **contexto})
 
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def moto_create(request):
     if request.method == 'POST':
         form = MotoForm(request.POST)
@@ -463,8 +596,7 @@ def moto_create(request):
     return render(request, 'moto_form.html', {'form': form})
 
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def moto_update(request, pk):
     moto = get_object_or_404(Moto, pk=pk)
     if request.method == 'POST':
@@ -477,8 +609,7 @@ def moto_update(request, pk):
     return render(request, 'moto_form.html', {'form': form})
 
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def moto_delete(request, pk):
     moto = get_object_or_404(Moto, pk=pk)
     if request.method == 'POST':
@@ -491,15 +622,13 @@ def moto_delete(request, pk):
 # CRUD MOTORISTA - SOLO ADMIN
 # =====================================================
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def motorista_list(request):
-    motoristas = Motorista.objects.all()
-    return render(request, 'motorista_list.html', {'motoristas': motoristas})
+    contexto = LISTADOS['motorista'].contexto(request)
+    return render(request, 'motorista_list.html', {'motoristas': contexto['pagina'], **contexto})
 
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def motorista_create(request):
     if request.method == 'POST':
         form = MotoristaForm(request.POST)
@@ -511,8 +640,7 @@ def motorista_create(request):
     return render(request, 'motorista_form.html', {'form': form})
 
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def motorista_update(request, pk):
     motorista = get_object_or_404(Motorista, pk=pk)
     if request.method == 'POST':
@@ -525,8 +653,7 @@ def motorista_update(request, pk):
     return render(request, 'motorista_form.html', {'form': form})
 
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def motorista_delete(request, pk):
     motorista = get_object_or_404(Motorista, pk=pk)
     if request.method == 'POST':
@@ -539,15 +666,13 @@ def motorista_delete(request, pk):
 # CRUD ASIGNACIÓN MOTO - SOLO ADMIN
 # =====================================================
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def asignacion_moto_list(request):
-    asignaciones = AsignacionMoto.objects.all()
-    return render(request, 'asignacion_moto_list.html', {'asignaciones': asignaciones})
+    contexto = LISTADOS['asignacion_moto'].contexto(request)
+    return render(request, 'asignacion_moto_list.html', {'asignaciones': contexto['pagina'], **contexto})
 
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def asignacion_moto_create(request):
     if request.method == 'POST':
         form = AsignacionMotoForm(request.POST)
@@ -559,8 +684,7 @@ def asignacion_moto_create(request):
     return render(request, 'asignacion_moto_form.html', {'form': form})
 
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def asignacion_moto_update(request, pk):
     asignacion = get_object_or_404(AsignacionMoto, pk=pk)
     if request.method == 'POST':
@@ -573,8 +697,7 @@ def asignacion_moto_update(request, pk):
     return render(request, 'asignacion_moto_form.html', {'form': form})
 
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def asignacion_moto_delete(request, pk):
     asignacion = get_object_or_404(AsignacionMoto, pk=pk)
     if request.method == 'POST':
@@ -587,15 +710,13 @@ def asignacion_moto_delete(request, pk):
 # CRUD ASIGNACIÓN FARMACIA - SOLO ADMIN
 # =====================================================
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def asignacion_farmacia_list(request):
-    asignaciones = AsignacionFarmacia.objects.all()
-    return render(request, 'asignacion_farmacia_list.html', {'asignaciones': asignaciones})
+    contexto = LISTADOS['asignacion_farmacia'].contexto(request)
+    return render(request, 'asignacion_farmacia_list.html', {'asignaciones': contexto['pagina'], **contexto})
 
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def asignacion_farmacia_create(request):
     if request.method == 'POST':
         form = AsignacionFarmaciaForm(request.POST)
@@ -607,8 +728,7 @@ def asignacion_farmacia_create(request):
     return render(request, 'asignacion_farmacia_form.html', {'form': form})
 
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def asignacion_farmacia_update(request, pk):
     asignacion = get_object_or_404(AsignacionFarmacia, pk=pk)
     if request.method == 'POST':
@@ -621,8 +741,7 @@ def asignacion_farmacia_update(request, pk):
     return render(request, 'asignacion_farmacia_form.html', {'form': form})
 
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def asignacion_farmacia_delete(request, pk):
     asignacion = get_object_or_404(AsignacionFarmacia, pk=pk)
     if request.method == 'POST':
@@ -635,63 +754,108 @@ def asignacion_farmacia_delete(request, pk):
 # CRUD MOVIMIENTO
 # =====================================================
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def movimiento_list(request):
-    movimientos = Movimiento.objects.all()
-    return render(request, 'movimiento_list.html', {'movimientos': movimientos})
+    pagina = paginar_keyset(request, movimientos_listado())
+    return render(request, 'movimiento_list.html', {
+        'movimientos': pagina, 'pagina': pagina, 'eventos_en_vivo': settings.EVENTOS_EN_VIVO,
+    })
 
 
-@login_required(login_url='login')
-@user_passes_test(es_recepcionista)
+@rol_requerido('recepcionista')
 def movimiento_list2(request):
     """Solo recepcionista puede ver este listado"""
-    movimientos = Movimiento.objects.all()
-    return render(request, 'movimiento_list2.html', {'movimientos': movimientos})
+    pagina = paginar_keyset(request, movimientos_listado())
+    return render(request, 'movimiento_list2.html', {
+        'movimientos': pagina, 'pagina': pagina, 'eventos_en_vivo': settings.EVENTOS_EN_VIVO,
+    })
+
+
+@rol_requerido('admin', 'recepcionista')
+async def movimiento_eventos(request):
+    """Cambios de Movimiento en vivo (text/event-stream, ver App/eventos.py); solo bajo ASGI"""
+    if not settings.EVENTOS_EN_VIVO:
+        raise Http404("Eventos en vivo desactivados")
+    try:
+        ultimo_id = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        ultimo_id = None
+    flujo = flujo_eventos(ultimo_id, duracion=settings.EVENTOS_DURACION_MAXIMA)
+    response = StreamingHttpResponse(flujo, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx no debe acumular el flujo
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def guardar_movimiento(form, usuario=''):
+    """
+    Guarda el movimiento. Si otro request reservó al mismo motorista o moto
+    entre la validación y el INSERT, la restricción única lo rechaza.
+    Sin código se asigna uno antes de abrir la transacción, para que el
+    bloque reservado no dependa de ella. Al editar, la versión del
+    formulario debe seguir siendo la vigente (Movimiento.save).
+    """
+    if not form.instance.codigo:
+        form.instance.codigo = asignador_codigos.siguiente(form.instance.farmacia_origen_id)
+    form.instance._usuario = usuario
+    try:
+        with transaction.atomic():
+            form.save()
+    except IntegrityError:
+        form.add_error(None, '⚠️ El motorista o la moto acaban de quedar ocupados. Revisa la propuesta.')
+        return False
+    except VersionDesactualizada:
+        form.add_error(None, '⚠️ Otro usuario modificó este movimiento. Recarga para ver los cambios.')
+        return False
+    return True
+
+
+@rol_requerido()
+def movimiento_propuesta(request):
+    """Motorista y moto libres para la farmacia de origen (?farmacia=<id>)"""
+    try:
+        farmacia_id = int(request.GET.get('farmacia', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Farmacia inválida.'}, status=400)
+    return JsonResponse(indice_despacho.describir(indice_despacho.proponer(farmacia_id)))
 
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def movimiento_create(request):
     if request.method == 'POST':
         form = MovimientoForm(request.POST)
-        if form.is_valid():
-            form.save()
+        if form.is_valid() and guardar_movimiento(form, request.user.username):
             return redirect('movimiento_list')
     else:
         form = MovimientoForm()
     return render(request, 'movimiento_form.html', {'form': form})
 
 
-@login_required(login_url='login')
-@user_passes_test(es_recepcionista)
+@rol_requerido('recepcionista')
 def movimiento_create2(request):
     if request.method == 'POST':
         form = MovimientoForm(request.POST)
-        if form.is_valid():
-            form.save()
+        if form.is_valid() and guardar_movimiento(form, request.user.username):
             return redirect('movimiento_list2')
     else:
         form = MovimientoForm()
     return render(request, 'movimiento_form2.html', {'form': form})
 
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def movimiento_update(request, pk):
     movimiento = get_object_or_404(Movimiento, pk=pk)
     if request.method == 'POST':
         form = MovimientoForm(request.POST, instance=movimiento)
-        if form.is_valid():
-            form.save()
+        if form.is_valid() and guardar_movimiento(form, request.user.username):
             return redirect('movimiento_list')
     else:
         form = MovimientoForm(instance=movimiento)
     return render(request, 'movimiento_form.html', {'form': form})
 
 
-@login_required(login_url='login')
-@user_passes_test(es_admin)
+@rol_requerido('admin')
 def movimiento_delete(request, pk):
     movimiento = get_object_or_404(Movimiento, pk=pk)
     if request.method == 'POST':
@@ -700,60 +864,142 @@ def movimiento_delete(request, pk):
     return render(request, 'movimiento_delete.html', {'movimiento': movimiento})
 
 
+def leer_seleccion(valores):
+    """Casillas "id:version" (o solo "id") de los listados -> pares (id, version)"""
+    pares = []
+    for valor in valores:
+        pk, _, version = valor.partition(':')
+        pares.append((int(pk), int(version) if version else None))
+    return pares
+
+
+@require_http_methods(["POST"])
+@rol_requerido('admin', 'recepcionista')
+def movimiento_transicion(request):
+    """Cambia de estado los movimientos marcados en el listado (cierre de turno)"""
+    listado = 'movimiento_list' if es_admin(request.user) else 'movimiento_list2'
+    estado = request.POST.get('estado')
+    try:
+        seleccion = leer_seleccion(request.POST.getlist('seleccion'))
+    except ValueError:
+        messages.error(request, '❌ Selección inválida.')
+        return redirect(listado)
+    if estado not in dict(Movimiento.ESTADO_MOVIMIENTO) or not seleccion:
+        messages.error(request, '❌ Elige al menos un movimiento y el estado de destino.')
+        return redirect(listado)
+
+    resultado = transicionar(seleccion, estado, request.user.username, request.POST.get('motivo', '')[:200])
+    if resultado['actualizados']:
+        messages.success(request, f"✅ {len(resultado['actualizados'])} movimientos pasaron a {dict(Movimiento.ESTADO_MOVIMIENTO)[estado]}.")
+    if resultado['conflictos']:
+        messages.warning(
+            request,
+            f"⚠️ {len(resultado['conflictos'])} movimientos no se cambiaron (ya modificados o en un estado que no lo permite). Recarga el listado.",
+        )
+    return redirect(listado)
+
+
 # =====================================================
 # COMBOS DINÁMICOS
 # =====================================================
 
-def cargar_provincias(request):
-    region = request.GET.get('region')
-    provincias_por_region = {
-        "Metropolitana de Santiago": ["Santiago", "Cordillera", "Chacabuco", "Maipo", "Melipilla", "Talagante"],
-    }
-    provincias = provincias_por_region.get(region, [])
-    return JsonResponse({'provincias': provincias})
+def _json_territorio(contenido):
+    return HttpResponse(contenido, content_type='application/json')
 
 
-def cargar_comunas(request):
-    provincia = request.GET.get('provincia')
-    comunas_por_provincia = {
-        "Santiago": ["Santiago", "Cerrillos", "Maipú", "La Florida"],
-    }
-    comunas = comunas_por_provincia.get(provincia, [])
-    return JsonResponse({'comunas': comunas})
+def cache_territorio(vista):
+    """
+    El dataset solo cambia con un despliegue: el navegador lo guarda un día
+    y después revalida con If-None-Match (respuesta 304 sin cuerpo)
+    """
+    vista = condition(etag_func=lambda request: territorio.ETAG)(vista)
+    return cache_control(public=True, max_age=60 * 60 * 24)(vista)
+
+
+@cache_territorio
+async def cargar_provincias(request):
+    return _json_territorio(territorio.json_provincias(request.GET.get('region')))
+
+
+@cache_territorio
+async def cargar_comunas(request):
+    return _json_territorio(territorio.json_comunas(request.GET.get('provincia')))
+
+
+@cache_territorio
+async def cargar_division(request):
+    """Provincias y comunas en una sola respuesta (?region= opcional)"""
+    return _json_territorio(territorio.json_division(request.GET.get('region')))
+
+
+@rol_requerido()
+async def autocompletar(request, modelo):
+    """Opciones para los selects con búsqueda (?q=prefijo)"""
+    if modelo not in AUTOCOMPLETABLES:
+        raise Http404
+    return JsonResponse({'resultados': await buscar_autocompletar(modelo, request.GET.get('q'))})
+
+
+@rol_requerido(roles_de=lecturas.roles)
+async def lectura_async(request, modelo):
+    """
+    Variante asíncrona y de solo lectura de /api_<modelo>/ (ver App/lecturas.py):
+    ?despues=<cursor>, ?tamano=, ?fields=a,b y ?total=1
+    """
+    if modelo not in lecturas.LEGIBLES:
+        raise Http404
+    try:
+        tamano = int(request.GET.get('tamano', lecturas.TAMANO))
+    except ValueError:
+        return JsonResponse({'error': 'Tamaño inválido.'}, status=400)
+    campos = [c.strip() for c in request.GET.get('fields', '').split(',') if c.strip()]
+    return JsonResponse(await lecturas.pagina(
+        modelo, request.GET.get('despues'), tamano, campos, con_total=request.GET.get('total') == '1',
+    ))
+
+
+# =====================================================
+# MÉTRICAS
+# =====================================================
+
+def metricas(request):
+    """Agregados por URL en formato Prometheus (ver App/metricas.py)"""
+    token = settings.METRICAS_TOKEN
+    autorizado = token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not autorizado and rol_de(request.user) != 'admin':
+        return HttpResponse(status=403)
+    return HttpResponse(registro_metricas.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 # =====================================================
 # REPORTES
 # =====================================================
 
-@login_required(login_url='login')
+@rol_requerido()
 def reporte_movimientos(request):
     tipo = request.GET.get("tipo")
     fecha = request.GET.get("fecha")
     mes = request.GET.get("mes")
     anio = request.GET.get("anio")
 
-    movimientos = Movimiento.objects.all()
-
-    if tipo == "DIARIO" and fecha:
-        movimientos = movimientos.filter(fecha_registro__date=fecha)
-    elif tipo == "MENSUAL" and mes and anio:
-        movimientos = movimientos.filter(
-            fecha_registro__year=anio,
-            fecha_registro__month=mes
-        )
-    elif tipo == "ANUAL" and anio:
-        movimientos = movimientos.filter(fecha_registro__year=anio)
+    # Totales desde la tabla resumen (costo por día, no por movimiento)
+    resumen = resumen_periodo(tipo, fecha, mes, anio)
 
-    if tipo:
+    # Solo la primera página deja registro del reporte
+    if tipo and not (request.GET.get("despues") or request.GET.get("antes")):
         ReporteMovimiento.objects.create(
             tipo=tipo,
             generado_por=request.user.username,
-            total_movimientos=movimientos.count()
+            total_movimientos=resumen["total"]
         )
 
+    movimientos = filtrar_periodo(movimientos_listado(), tipo, fecha, mes, anio)
+    pagina = paginar_keyset(request, movimientos)
+
     context = {
-        "movimientos": movimientos,
+        "movimientos": pagina,
+        "pagina": pagina,
+        "resumen": resumen,
         "tipo": tipo,
         "fecha": fecha,
         "mes": mes,
@@ -763,87 +1009,148 @@ def reporte_movimientos(request):
     return render(request, "reporte_resultado.html", context)
 
 
-@login_required(login_url='login')
+@rol_requerido()
 def descargar_reporte_pdf(request):
     tipo = request.GET.get("tipo")
     fecha = request.GET.get("fecha")
     mes = request.GET.get("mes")
     anio = request.GET.get("anio")
 
-    movimientos = Movimiento.objects.all()
-
-    if tipo == "DIARIO" and fecha:
-        movimientos = movimientos.filter(fecha_registro__date=fecha)
-    elif tipo == "MENSUAL" and mes and anio:
-        movimientos = movimientos.filter(
-            fecha_registro__year=anio,
-            fecha_registro__month=mes
+    periodo = normalizar_periodo(tipo, fecha, mes, anio)
+    if periodo is None:
+        clave = None
+    else:
+        tipo, fecha, mes, anio = periodo
+        clave = clave_cache(tipo, fecha, mes, anio)
+
+    cache = CacheReportes()
+    archivo = cache.abrir(clave) if clave else None
+    if archivo:
+        return FileResponse(
+            archivo,
+            as_attachment=True,
+            filename='reporte_movimientos.pdf',
+            content_type='application/pdf',
         )
-    elif tipo == "ANUAL" and anio:
-        movimientos = movimientos.filter(fecha_registro__year=anio)
 
-    response = HttpResponse(content_type='application/pdf')
+    movimientos = filtrar_periodo(Movimiento.objects.all(), tipo, fecha, mes, anio)
+    partes = generar_pdf_movimientos(movimientos, tipo, fecha, mes, anio)
+    if clave:
+        partes = cache.guardar_stream(clave, partes)
+
+    response = StreamingHttpResponse(partes, content_type='application/pdf')
     response['Content-Disposition'] = 'attachment; filename=reporte_movimientos.pdf'
+    return response
+
 
-    p = canvas.Canvas(response, pagesize=letter)
-    width, height = letter
-    y = height - 50
-
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(50, y, f"Reporte de Movimientos - {tipo}")
-    y -= 30
-
-    p.setFont("Helvetica", 12)
-    if tipo == "DIARIO":
-        p.drawString(50, y, f"Fecha: {fecha}")
-    elif tipo == "MENSUAL":
-        p.drawString(50, y, f"Mes: {mes} / Año: {anio}")
-    elif tipo == "ANUAL":
-        p.drawString(50, y, f"Año: {anio}")
-    y -= 30
-
-    p.setFont("Helvetica-Bold", 10)
-    p.drawString(40, y, "Código")
-    p.drawString(100, y, "Tipo")
-    p.drawString(160, y, "Estado")
-    p.drawString(230, y, "Fecha")
-    p.drawString(300, y, "Motorista")
-    p.drawString(380, y, "Origen")
-    p.drawString(470, y, "Destino")
-    y -= 18
-
-    p.setFont("Helvetica", 9)
-
-    for m in movimientos:
-        if y < 60:
-            p.showPage()
-            y = height - 50
-            p.setFont("Helvetica-Bold", 10)
-            p.drawString(40, y, "Código")
-            p.drawString(100, y, "Tipo")
-            p.drawString(160, y, "Estado")
-            p.drawString(230, y, "Fecha")
-            p.drawString(300, y, "Motorista")
-            p.drawString(380, y, "Origen")
-            p.drawString(470, y, "Destino")
-            y -= 18
-            p.setFont("Helvetica", 9)
-
-        p.drawString(40, y, str(m.codigo))
-        p.drawString(100, y, str(m.tipo))
-        p.drawString(160, y, str(m.estado))
-        p.drawString(230, y, m.fecha_registro.strftime("%Y-%m-%d"))
-        p.drawString(300, y, m.motorista.nombre if m.motorista else "")
-        p.drawString(380, y, m.farmacia_origen.nombre if m.farmacia_origen else "")
-        p.drawString(470, y, m.destino if m.destino else "")
-
-        y -= 15
-
-    p.showPage()
-    p.save()
+EXPORTACIONES = {
+    'csv': (generar_csv_movimientos, 'text/csv; charset=utf-8'),
+    'ndjson': (generar_ndjson_movimientos, 'application/x-ndjson'),
+}
+
+
+@rol_requerido()
+def exportar_movimientos(request, formato):
+    """Movimientos del periodo en CSV o NDJSON, con los mismos filtros del reporte"""
+    if formato not in EXPORTACIONES:
+        raise Http404
+    generar, content_type = EXPORTACIONES[formato]
+    movimientos = filtrar_periodo(
+        Movimiento.objects.all(),
+        request.GET.get("tipo"), request.GET.get("fecha"), request.GET.get("mes"), request.GET.get("anio"),
+    )
+    response = StreamingHttpResponse(generar(movimientos), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename=movimientos.{formato}'
     return response
 
 
+# =====================================================
+# REPORTES EN SEGUNDO PLANO
+# =====================================================
+
+def _trabajo_json(trabajo):
+    data = {
+        "id": trabajo.pk,
+        "estado": trabajo.estado,
+        "reporte": trabajo.reporte_id,
+        "url_estado": reverse('reporte_trabajo_estado', args=[trabajo.pk]),
+    }
+    if trabajo.estado == 'LISTO':
+        data["url_descarga"] = reverse('reporte_trabajo_descargar', args=[trabajo.pk])
+    elif trabajo.estado == 'ERROR':
+        data["error"] = trabajo.error
+    return data
+
+
+def _trabajo_del_usuario(request, pk):
+    trabajo = get_object_or_404(TrabajoReporte, pk=pk)
+    if trabajo.solicitado_por_id != request.user.pk and not es_admin(request.user):
+        raise Http404
+    return trabajo
+
+
+@rol_requerido()
+@require_http_methods(["POST"])
+def reporte_encolar(request):
+    """Encola el PDF del reporte y devuelve el id del trabajo"""
+    tipo = request.POST.get("tipo")
+    if tipo not in dict(ReporteMovimiento.TIPO_REPORTE):
+        return JsonResponse({"error": "Tipo de reporte inválido."}, status=400)
+    # Validado aquí y no en el worker: un valor largo no cabe en TrabajoReporte
+    periodo = normalizar_periodo(tipo, request.POST.get("fecha"), request.POST.get("mes"), request.POST.get("anio"))
+    if periodo is None:
+        return JsonResponse({"error": "Fecha, mes o año inválidos."}, status=400)
+
+    trabajo = encolar_reporte(request.user, *periodo)
+    return JsonResponse(_trabajo_json(trabajo), status=202)
+
+
+@rol_requerido()
+def reporte_trabajo_estado(request, pk):
+    return JsonResponse(_trabajo_json(_trabajo_del_usuario(request, pk)))
+
+
+@rol_requerido()
+def reporte_trabajo_descargar(request, pk):
+    trabajo = _trabajo_del_usuario(request, pk)
+    if trabajo.estado != 'LISTO':
+        return JsonResponse(_trabajo_json(trabajo), status=409)
+    try:
+        archivo = open(ruta_archivo(trabajo), 'rb')
+    except FileNotFoundError:
+        raise Http404("El archivo del reporte ya no existe")
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename='reporte_movimientos.pdf',
+        content_type='application/pdf',
+    )
+
+
+# =====================================================
+# IMPORTACIÓN MASIVA
+# =====================================================
+
+@rol_requerido('admin')
+@require_http_methods(["POST"])
+def importar_datos(request, modelo):
+    """Recibe un archivo (campo 'archivo') y devuelve el resumen con los errores por fila"""
+    if modelo not in IMPORTABLES:
+        return JsonResponse({"error": "Modelo no importable."}, status=404)
+    archivo = request.FILES.get("archivo")
+    if archivo is None:
+        return JsonResponse({"error": "Falta el archivo."}, status=400)
+
+    formato = request.POST.get("formato") or formato_de(archivo.name)
+    if formato not in FORMATOS:
+        return JsonResponse({"error": "Formato no soportado."}, status=400)
+    try:
+        resultado = importar(modelo, leer_filas(archivo.file, formato))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(resultado)
+
+
 def dashboard_usuario(request):
     return render(request, "dashboard_usuario.html")
 
@@ -944,11 +1251,9 @@ def cambiar_password_recuperacion(request):
     return render(request, 'cambiar_password_recuperacion.html')
 
 
-def employeeView(request):
-   empleados = Employee.objects.all()
-   data = {'employees': list(empleados.values('name'))}
-   
-   return JsonResponse(data)
+async def employeeView(request):
+    data = {'employees': [e async for e in Employee.objects.values('name').aiterator()]}
+    return JsonResponse(data)
 
 
 @api_view(['GET', 'POST'])
@@ -5,6 +5,14 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Los eventos en vivo de los listados de movimientos (App/eventos.py) y las
+lecturas asíncronas (App/lecturas.py) necesitan este punto de entrada:
+
+    EVENTOS_EN_VIVO=1 uvicorn ProyectoLogiCo.asgi:application --workers 1
+
+Con BackendMemoria cada worker solo ve sus propios eventos; para más de un
+worker hay que configurar otro EVENTOS_BACKEND.
 """
 
 import os
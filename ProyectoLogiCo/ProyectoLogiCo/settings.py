@@ -68,6 +68,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'App.metricas.metricas_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,11 +78,19 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# RolBackend carga user.rol en la misma consulta del usuario.
+# ModelBackend queda para las sesiones iniciadas antes del cambio.
+AUTHENTICATION_BACKENDS = [
+    'App.backends.RolBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 ROOT_URLCONF = 'ProyectoLogiCo.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que además mide el tiempo de render (App/metricas.py)
+        'BACKEND': 'App.metricas.PlantillasMedidas',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -102,7 +111,7 @@ WSGI_APPLICATION = 'ProyectoLogiCo.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': os.environ.get('DB_ENGINE', 'django.db.backends.postgresql'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASSWORD'),
@@ -148,6 +157,57 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# PDFs generados por el worker de reportes (manage.py procesar_reportes)
+REPORTES_DIR = BASE_DIR / 'reportes_generados'
+
+# Cache en disco de reportes PDF (LRU acotado por tamaño)
+REPORTES_CACHE_DIR = BASE_DIR / 'reportes_generados' / 'cache'
+REPORTES_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Pub/sub de los eventos en vivo de movimientos (App/eventos.py). El de
+# memoria solo reparte dentro de un proceso ASGI.
+EVENTOS_BACKEND = 'App.eventos.BackendMemoria'
+
+# Los eventos en vivo solo se activan al servir por ASGI
+# (uvicorn ProyectoLogiCo.asgi:application). Bajo WSGI (runserver, gunicorn)
+# Django junta el flujo completo antes de enviarlo y cada listado abierto
+# retendría un hilo para siempre.
+EVENTOS_EN_VIVO = os.environ.get('EVENTOS_EN_VIVO', '0') == '1'
+# Segundos que dura cada conexión; el navegador reconecta con Last-Event-ID
+EVENTOS_DURACION_MAXIMA = 300
+
+# Códigos de movimiento que cada proceso reserva por viaje a la base (App/codigos.py)
+CODIGOS_BLOQUE = 50
+
+# API REST: sesión del sitio y el mismo control de roles que las vistas
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.IsAuthenticated',
+        'App.api.RolRequerido',
+    ],
+}
+
+# Escrituras en lote de la API (App/lotes.py): ítems por request y horas
+# que se guarda la respuesta de cada Idempotency-Key
+API_LOTE_MAXIMO = 1000
+IDEMPOTENCIA_HORAS = 24
+
+# Feed de cambios de movimientos (App/sincronizacion.py): se lee hasta el
+# inicio de la transacción abierta más antigua menos estos segundos (margen
+# entre el reloj de la app y el de la base; en SQLite es la única retención),
+# y las lápidas de los eliminados duran estos días (manage.py purgar_vencidos)
+SINCRONIZACION_RETRASO_SEGUNDOS = 5
+SINCRONIZACION_DIAS_ELIMINADOS = 30
+
+# Métricas por request (App/metricas.py). /metrics lo ve un admin o quien
+# envíe "Authorization: Bearer <METRICAS_TOKEN>" (p. ej. Prometheus).
+METRICAS_ACTIVAS = os.environ.get('METRICAS_ACTIVAS', '1') == '1'
+METRICAS_SQL_LENTA_MS = 200
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN', '')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
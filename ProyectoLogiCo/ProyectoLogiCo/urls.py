@@ -1,5 +1,5 @@
 from django.contrib import admin
-from django.urls import path
+from django.urls import include, path
 from App import views
 from rest_framework import routers
 
@@ -65,17 +65,26 @@ path('dashboard/', views.dashboard_usuario, name='dashboard_usuario'),
     path('movimientos2/', views.movimiento_list2, name='movimiento_list2'),
     path('movimientos/crear/', views.movimiento_create, name='movimiento_create'),
     path('movimientos/crear2/', views.movimiento_create2, name='movimiento_create2'),
+    path('movimientos/propuesta/', views.movimiento_propuesta, name='movimiento_propuesta'),
+    path('movimientos/eventos/', views.movimiento_eventos, name='movimiento_eventos'),
     path('movimientos/editar/<int:pk>/', views.movimiento_update, name='movimiento_update'),
     path('movimientos/eliminar/<int:pk>/', views.movimiento_delete, name='movimiento_delete'),
+    path('movimientos/transicion/', views.movimiento_transicion, name='movimiento_transicion'),
 
     # ========== AJAX: PROVINCIAS Y COMUNAS ==========
     path('ajax/cargar-provincias/', views.cargar_provincias, name='cargar_provincias'),
     path('ajax/cargar-comunas/', views.cargar_comunas, name='cargar_comunas'),
+    path('ajax/division/', views.cargar_division, name='cargar_division'),
+    path('autocompletar/<str:modelo>/', views.autocompletar, name='autocompletar'),
 
     path('reportes2/', views.reportes_menu2, name='reportes_menu2'),
     path('reportes/', views.reportes_menu, name='reportes_menu'),
     path('reportes/resultados/', views.reporte_movimientos, name='reporte_movimientos'),
     path('reportes/descargar/pdf/', views.descargar_reporte_pdf, name='descargar_reporte_pdf'),
+    path('reportes/exportar/<str:formato>/', views.exportar_movimientos, name='exportar_movimientos'),
+    path('reportes/trabajos/', views.reporte_encolar, name='reporte_encolar'),
+    path('reportes/trabajos/<int:pk>/', views.reporte_trabajo_estado, name='reporte_trabajo_estado'),
+    path('reportes/trabajos/<int:pk>/descargar/', views.reporte_trabajo_descargar, name='reporte_trabajo_descargar'),
     path('recuperar-password/', views.recuperar_password, name='recuperar_password'),
 path('verificar-codigo/', views.verificar_codigo, name='verificar_codigo'),
 path('cambiar-password-recuperacion/', views.cambiar_password_recuperacion, name='cambiar_password_recuperacion'),
@@ -84,6 +93,13 @@ path('cambiar-password-recuperacion/', views.cambiar_password_recuperacion, name
     path('cambiar-password-recuperacion/', views.cambiar_password_recuperacion, name='cambiar_password_recuperacion'),
     path('employee/', views.employeeView, name='employee'),
 
-    
+    path('metrics', views.metricas, name='metricas'),
+
+    # ========== IMPORTACIÓN MASIVA ==========
+    path('importar/<str:modelo>/', views.importar_datos, name='importar_datos'),
+
+    # ========== API REST ==========
+    path('api_async/<str:modelo>/', views.lectura_async, name='lectura_async'),
+    path('', include(router.urls)),
 ]
 
@@ -0,0 +1,25 @@
+"""
+Arranque de Django compartido por los scripts de benchmarks/.
+
+Los scripts se ejecutan como `python benchmarks/<script>.py`, así que esta
+carpeta ya está en sys.path y basta con `from _django import ...`.
+"""
+import os
+import sys
+
+PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def configurar_django(db=None):
+    """
+    django.setup() con el proyecto en sys.path. Con `db` usa esa base
+    SQLite; sin ella respeta las variables DB_* del entorno.
+    """
+    if db:
+        os.environ['DB_ENGINE'] = 'django.db.backends.sqlite3'
+        os.environ['DB_NAME'] = db
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ProyectoLogiCo.settings')
+    if PROYECTO not in sys.path:
+        sys.path.insert(0, PROYECTO)
+    import django
+    django.setup()
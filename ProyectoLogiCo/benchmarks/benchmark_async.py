@@ -0,0 +1,237 @@
+"""
+Benchmark de concurrencia: vistas síncronas por WSGI contra las vistas
+asíncronas (/api_async/, App/lecturas.py) por ASGI.
+
+Uso (desde la carpeta ProyectoLogiCo, con gunicorn y uvicorn instalados):
+    pip install gunicorn uvicorn
+    python benchmarks/benchmark_async.py --clientes 500 --duracion 15
+
+Siembra una base SQLite temporal (o usa la PostgreSQL de las variables
+DB_* con --postgres), levanta cada servidor en un puerto local y lo carga
+con un generador propio basado en asyncio: `--clientes` conexiones
+keep-alive pidiendo la misma URL sin pausa durante `--duracion` segundos.
+Las dos APIs exigen sesión de admin: la siembra crea el usuario y su
+sesión, y cada request envía la cookie.
+
+Escenarios:
+    wsgi-sync   gunicorn gthread  -> /api_farmacias/   (un hilo por request)
+    asgi-sync   uvicorn           -> /api_farmacias/   (la vista síncrona corre en el threadpool)
+    asgi-async  uvicorn           -> /api_async/farmacias/
+
+Al terminar imprime una tabla con req/s, p50/p95/p99 y errores por
+escenario. Los resultados dependen de la máquina y de la versión del
+código: conviene medir ambos servidores en la misma corrida.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from _django import PROYECTO, configurar_django
+
+LOTE = 5000
+
+ESCENARIOS = {
+    'wsgi-sync': ('wsgi', '/api_farmacias/?tamano=50'),
+    'asgi-sync': ('asgi', '/api_farmacias/?tamano=50'),
+    'asgi-async': ('asgi', '/api_async/farmacias/?tamano=50'),
+}
+
+
+def entorno(db):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='ProyectoLogiCo.settings', PYTHONPATH=PROYECTO)
+    if db:
+        env.update(DB_ENGINE='django.db.backends.sqlite3', DB_NAME=db)
+    return env
+
+
+def sembrar(filas):
+    """Se ejecuta en un proceso aparte con el entorno ya configurado"""
+    configurar_django()
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+    from django.contrib.auth.models import User
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.core.management import call_command
+    from App.models import Farmacia, UsuarioRol
+
+    call_command('migrate', verbosity=0)
+    admin = User.objects.create_user('bench_admin', password='Bench123@')
+    UsuarioRol.objects.create(usuario=admin, rol='admin')
+    sesion = SessionStore()
+    sesion.update({
+        SESSION_KEY: str(admin.pk), BACKEND_SESSION_KEY: 'App.backends.RolBackend',
+        HASH_SESSION_KEY: admin.get_session_auth_hash(),
+    })
+    sesion.create()
+    for inicio in range(0, filas, LOTE):
+        Farmacia.objects.bulk_create([
+            Farmacia(
+                nombre=f'Farmacia {i}', direccion=f'Calle {i}', telefono='123',
+                correo='bench@logico.com', region='Metropolitana de Santiago',
+                provincia='Santiago', comuna='Santiago',
+            )
+            for i in range(inicio, min(inicio + LOTE, filas))
+        ])
+    # El proceso padre lee la cookie de la última línea
+    print(sesion.session_key)
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def comando_servidor(tipo, puerto, workers, hilos):
+    if tipo == 'wsgi':
+        return [
+            sys.executable, '-m', 'gunicorn', 'ProyectoLogiCo.wsgi:application',
+            '--bind', f'127.0.0.1:{puerto}', '--workers', str(workers),
+            '--worker-class', 'gthread', '--threads', str(hilos), '--log-level', 'warning',
+        ]
+    return [
+        sys.executable, '-m', 'uvicorn', 'ProyectoLogiCo.asgi:application',
+        '--host', '127.0.0.1', '--port', str(puerto), '--workers', str(workers),
+        '--log-level', 'warning', '--no-access-log',
+    ]
+
+
+def esperar_servidor(puerto, proceso, limite=30):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        if proceso.poll() is not None:
+            raise RuntimeError('El servidor terminó antes de aceptar conexiones')
+        try:
+            socket.create_connection(('127.0.0.1', puerto), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('El servidor no respondió a tiempo')
+
+
+# =====================================================
+# GENERADOR DE CARGA
+# =====================================================
+
+async def _leer_respuesta(lector):
+    """Lee una respuesta HTTP/1.1 con Content-Length; devuelve (status, cerrar)"""
+    estado = await lector.readline()
+    if not estado:
+        raise ConnectionError('conexión cerrada')
+    largo = 0
+    # HTTP/1.0 cierra la conexión salvo que pida keep-alive
+    cerrar = estado.startswith(b'HTTP/1.0')
+    while True:
+        linea = await lector.readline()
+        if linea in (b'\r\n', b''):
+            break
+        nombre, _, valor = linea.decode('latin-1').partition(':')
+        nombre = nombre.strip().lower()
+        if nombre == 'content-length':
+            largo = int(valor)
+        elif nombre == 'connection':
+            cerrar = valor.strip().lower() == 'close'
+    await lector.readexactly(largo)
+    return int(estado.split()[1]), cerrar
+
+
+async def _cliente(puerto, ruta, sesion, fin, latencias, errores):
+    peticion = (
+        f'GET {ruta} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: keep-alive\r\n'
+        f'Cookie: sessionid={sesion}\r\n\r\n'
+    ).encode()
+    conexion = None
+    while time.monotonic() < fin:
+        try:
+            if conexion is None:
+                conexion = await asyncio.open_connection('127.0.0.1', puerto)
+            lector, escritor = conexion
+            inicio = time.perf_counter()
+            escritor.write(peticion)
+            await escritor.drain()
+            status, cerrar = await _leer_respuesta(lector)
+            if status == 200:
+                latencias.append(time.perf_counter() - inicio)
+            else:
+                errores.append(status)
+            if cerrar:
+                escritor.close()
+                conexion = None
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+            errores.append(type(e).__name__)
+            if conexion is not None:
+                conexion[1].close()
+                conexion = None
+            await asyncio.sleep(0.05)
+    if conexion is not None:
+        conexion[1].close()
+
+
+async def cargar(puerto, ruta, sesion, clientes, duracion):
+    latencias = []
+    errores = []
+    fin = time.monotonic() + duracion
+    inicio = time.perf_counter()
+    await asyncio.gather(*(_cliente(puerto, ruta, sesion, fin, latencias, errores) for _ in range(clientes)))
+    return latencias, errores, time.perf_counter() - inicio
+
+
+def percentil(valores, p):
+    if not valores:
+        return float('nan')
+    return statistics.quantiles(valores, n=100, method='inclusive')[p - 1] if len(valores) > 1 else valores[0]
+
+
+def ejecutar(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = None if args.postgres else os.path.join(tmp, 'benchmark.sqlite3')
+        env = entorno(db)
+        siembra = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--sembrar', str(args.filas)],
+            check=True, env=env, cwd=PROYECTO, capture_output=True, text=True,
+        )
+        sesion = siembra.stdout.split()[-1]
+
+        print(f"{'escenario':>11} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ok':>8} {'errores':>8}")
+        for nombre in args.escenarios:
+            tipo, ruta = ESCENARIOS[nombre]
+            puerto = puerto_libre()
+            proceso = subprocess.Popen(
+                comando_servidor(tipo, puerto, args.workers, args.hilos), env=env, cwd=PROYECTO,
+            )
+            try:
+                esperar_servidor(puerto, proceso)
+                # Calentamiento: conexiones a la base y código importado
+                asyncio.run(cargar(puerto, ruta, sesion, 10, 1))
+                latencias, errores, segundos = asyncio.run(cargar(puerto, ruta, sesion, args.clientes, args.duracion))
+            finally:
+                proceso.terminate()
+                proceso.wait(timeout=30)
+            print(
+                f"{nombre:>11} {len(latencias) / segundos:>9.0f} "
+                f"{percentil(latencias, 50) * 1000:>8.1f} {percentil(latencias, 95) * 1000:>8.1f} "
+                f"{percentil(latencias, 99) * 1000:>8.1f} {len(latencias):>8} {len(errores):>8}"
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clientes', type=int, default=500)
+    parser.add_argument('--duracion', type=float, default=15)
+    parser.add_argument('--filas', type=int, default=2000, help='farmacias sembradas')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--hilos', type=int, default=32, help='hilos por worker de gunicorn')
+    parser.add_argument('--escenarios', nargs='+', choices=list(ESCENARIOS), default=list(ESCENARIOS))
+    parser.add_argument('--postgres', action='store_true', help='usar (y sembrar) la base de las variables DB_*')
+    parser.add_argument('--sembrar', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.sembrar is not None:
+        sembrar(args.sembrar)
+    else:
+        ejecutar(args)
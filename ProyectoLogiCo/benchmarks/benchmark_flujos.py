@@ -0,0 +1,257 @@
+"""
+Benchmark de los flujos principales de LogiCo, con resultados en JSON
+comparables entre commits.
+
+Uso (desde la carpeta ProyectoLogiCo):
+    python benchmarks/benchmark_flujos.py --salida base.json
+    python benchmarks/benchmark_flujos.py --filas 1000 10000 --comparar base.json
+
+Cada escala se siembra con App/sembrado.py (misma semilla, mismos datos)
+en una base SQLite temporal, y los flujos se ejecutan en un proceso aparte
+con el cliente de pruebas de Django: login → dashboard, listados,
+alta de movimiento, reportes por periodo, PDF (con y sin cache) y cada
+endpoint /api_*. Por flujo se registran la mediana, el p95 y el mínimo en
+ms, las consultas SQL y los bytes de la respuesta.
+
+Con --comparar el proceso termina con código 1 si algún flujo es más lento
+que la base por sobre --tolerancia (y por más de 2 ms), o si hace más
+consultas; así se puede usar antes de un despliegue.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from _django import PROYECTO, configurar_django
+
+FORMATO = 1
+DIFERENCIA_MINIMA_MS = 2
+
+
+# =====================================================
+# FLUJOS
+# =====================================================
+
+def definir_flujos(contexto):
+    """nombre -> (función que ejecuta una iteración y devuelve la respuesta, iteraciones)"""
+    from django.test import Client
+    from django.urls import reverse
+
+    from App.sembrado import CLAVE_USUARIOS
+
+    admin = contexto['admin']
+    hoy = contexto['hoy']
+    reporte = reverse('reporte_movimientos')
+    pdf = reverse('descargar_reporte_pdf')
+    mensual = {'tipo': 'MENSUAL', 'mes': str(hoy.month), 'anio': str(hoy.year)}
+
+    def login_dashboard():
+        cliente = Client()
+        return cliente.post(reverse('login'), {'username': 'bench_admin', 'password': CLAVE_USUARIOS}, follow=True)
+
+    def movimiento_create():
+        contexto['creados'] += 1
+        return admin.post(reverse('movimiento_create'), {
+            'codigo': f"BENCH-{contexto['creados']:08d}", 'tipo': 'DIRECTO', 'estado': 'COMPLETADO',
+            'farmacia_origen': contexto['farmacia'], 'destino': 'Av. Benchmark 123',
+            'motorista': contexto['motorista'], 'moto': contexto['moto'],
+        })
+
+    def pdf_sin_cache():
+        shutil.rmtree(contexto['cache_dir'], ignore_errors=True)
+        return admin.get(pdf, mensual)
+
+    return {
+        'login_dashboard': (login_dashboard, 10),
+        'movimiento_list': (lambda: admin.get(reverse('movimiento_list')), 20),
+        'movimiento_list2': (lambda: contexto['recep'].get(reverse('movimiento_list2')), 20),
+        'reporte_diario': (lambda: admin.get(reporte, {'tipo': 'DIARIO', 'fecha': hoy.isoformat()}), 20),
+        'reporte_mensual': (lambda: admin.get(reporte, mensual), 20),
+        'reporte_anual': (lambda: admin.get(reporte, {'tipo': 'ANUAL', 'anio': str(hoy.year)}), 20),
+        'reporte_pdf_mensual': (pdf_sin_cache, 3),
+        'reporte_pdf_mensual_cache': (lambda: admin.get(pdf, mensual), 20),
+        'api_farmacias': (lambda: admin.get('/api_farmacias/'), 20),
+        'api_motos': (lambda: admin.get('/api_motos/'), 20),
+        'api_motoristas': (lambda: admin.get('/api_motoristas/'), 20),
+        'api_movimientos': (lambda: admin.get('/api_movimientos/'), 20),
+        'api_movimientos_expand': (lambda: admin.get('/api_movimientos/?expand=motorista,moto'), 20),
+        'api_async_movimientos': (lambda: admin.get('/api_async/movimientos/'), 20),
+        # Al final: agrega movimientos de hoy y cambiaría lo que leen los demás flujos
+        'movimiento_create': (movimiento_create, 20),
+    }
+
+
+def _tamano(response):
+    if response.streaming:
+        total = sum(len(parte) for parte in response.streaming_content)
+        response.close()
+        return total
+    return len(response.content)
+
+
+def medir_flujo(funcion, iteraciones):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    _tamano(funcion())  # calentamiento
+    tiempos, consultas, tamanos = [], [], []
+    for _ in range(iteraciones):
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            response = funcion()
+            tamano = _tamano(response)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f"respuesta {response.status_code}")
+        consultas.append(len(capturadas))
+        tamanos.append(tamano)
+    tiempos.sort()
+    return {
+        'iteraciones': iteraciones,
+        'mediana_ms': round(statistics.median(tiempos), 3),
+        'p95_ms': round(tiempos[min(len(tiempos) - 1, int(0.95 * len(tiempos)))], 3),
+        'min_ms': round(tiempos[0], 3),
+        'consultas': int(statistics.median(consultas)),
+        'bytes': int(statistics.median(tamanos)),
+    }
+
+
+def medir_escala(filas, semilla, solo):
+    """Se ejecuta en un proceso hijo; imprime el resultado de la escala en JSON"""
+    with tempfile.TemporaryDirectory() as tmp:
+        configurar_django(os.path.join(tmp, 'benchmark.sqlite3'))
+        from django.core.management import call_command
+        from django.test import Client, override_settings
+        from django.utils import timezone
+
+        from App.models import Farmacia, Motorista
+        from App.sembrado import CLAVE_USUARIOS, sembrar
+
+        call_command('migrate', verbosity=0)
+        inicio = time.perf_counter()
+        sembrar(movimientos=filas, farmacias=50, motoristas=200, semilla=semilla)
+        siembra = time.perf_counter() - inicio
+
+        cache_dir = os.path.join(tmp, 'cache')
+        with override_settings(
+            ALLOWED_HOSTS=['testserver'], REPORTES_DIR=os.path.join(tmp, 'reportes'), REPORTES_CACHE_DIR=cache_dir,
+        ):
+            admin, recep = Client(), Client()
+            admin.login(username='bench_admin', password=CLAVE_USUARIOS)
+            recep.login(username='bench_recep', password=CLAVE_USUARIOS)
+            # Un motorista sin moto libre no importa: los movimientos se crean COMPLETADO
+            motorista = Motorista.objects.filter(moto__isnull=False).order_by('pk').first()
+            contexto = {
+                'admin': admin, 'recep': recep, 'hoy': timezone.localdate(), 'cache_dir': cache_dir,
+                'farmacia': Farmacia.objects.order_by('pk').first().pk,
+                'motorista': motorista.pk, 'moto': motorista.moto_id, 'creados': 0,
+            }
+            resultado = {}
+            for nombre, (funcion, iteraciones) in definir_flujos(contexto).items():
+                if solo and nombre not in solo:
+                    continue
+                resultado[nombre] = medir_flujo(funcion, iteraciones)
+
+    print(json.dumps({'siembra_s': round(siembra, 2), 'flujos': resultado}))
+
+
+# =====================================================
+# EJECUCIÓN Y COMPARACIÓN
+# =====================================================
+
+def commit_actual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROYECTO, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ejecutar(args):
+    import django
+
+    resultado = {
+        'formato': FORMATO,
+        'commit': commit_actual(),
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'entorno': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'plataforma': platform.platform(),
+            'base': 'sqlite',
+        },
+        'semilla': args.semilla,
+        'escalas': {},
+    }
+    for filas in args.filas:
+        comando = [sys.executable, os.path.abspath(__file__), '--medir', str(filas), '--semilla', str(args.semilla)]
+        if args.flujos:
+            comando += ['--flujos', *args.flujos]
+        salida = subprocess.run(comando, check=True, capture_output=True, text=True, cwd=PROYECTO).stdout
+        escala = json.loads(salida.strip().splitlines()[-1])
+        resultado['escalas'][str(filas)] = escala
+        imprimir_escala(filas, escala)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+    return resultado
+
+
+def imprimir_escala(filas, escala):
+    print(f"\n== {filas} movimientos (siembra {escala['siembra_s']} s)")
+    print(f"{'flujo':<28} {'mediana ms':>11} {'p95 ms':>9} {'consultas':>10} {'KB':>9}")
+    for nombre, r in escala['flujos'].items():
+        print(f"{nombre:<28} {r['mediana_ms']:>11.2f} {r['p95_ms']:>9.2f} {r['consultas']:>10} {r['bytes'] / 1024:>9.1f}")
+
+
+def comparar(actual, base, tolerancia):
+    """Lista de regresiones (escala, flujo, motivo) respecto de `base`"""
+    regresiones = []
+    for filas, escala in actual['escalas'].items():
+        anteriores = base.get('escalas', {}).get(filas, {}).get('flujos', {})
+        for nombre, r in escala['flujos'].items():
+            previo = anteriores.get(nombre)
+            if previo is None:
+                continue
+            limite = previo['mediana_ms'] * (1 + tolerancia)
+            if r['mediana_ms'] > limite and r['mediana_ms'] - previo['mediana_ms'] > DIFERENCIA_MINIMA_MS:
+                regresiones.append((filas, nombre, f"{previo['mediana_ms']:.2f} -> {r['mediana_ms']:.2f} ms"))
+            if r['consultas'] > previo['consultas']:
+                regresiones.append((filas, nombre, f"{previo['consultas']} -> {r['consultas']} consultas"))
+    return regresiones
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filas', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--flujos', nargs='+', help='ejecutar solo estos flujos')
+    parser.add_argument('--salida', help='archivo JSON con los resultados')
+    parser.add_argument('--comparar', help='JSON de una ejecución anterior')
+    parser.add_argument('--tolerancia', type=float, default=0.25, help='aumento de mediana tolerado (0.25 = 25%%)')
+    parser.add_argument('--medir', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir is not None:
+        medir_escala(args.medir, args.semilla, set(args.flujos or ()))
+        sys.exit(0)
+
+    resultado = ejecutar(args)
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            base = json.load(archivo)
+        regresiones = comparar(resultado, base, args.tolerancia)
+        print(f"\nComparado con {base.get('commit') or args.comparar}:")
+        for filas, nombre, motivo in regresiones:
+            print(f"  ❌ {filas} {nombre}: {motivo}")
+        if regresiones:
+            sys.exit(1)
+        print("  ✅ sin regresiones")
@@ -0,0 +1,95 @@
+"""
+Costo del middleware de métricas (App/metricas.py).
+
+Uso (desde la carpeta ProyectoLogiCo):
+    python benchmarks/benchmark_metricas.py --requests 2000
+
+Siembra una base SQLite temporal y atiende las mismas URLs con el
+cliente de pruebas de Django, alternando rondas con y sin el middleware
+para que el ruido del equipo afecte a ambos por igual. Informa la mediana
+del tiempo por request de cada variante y la mediana de la diferencia
+entre rondas consecutivas (más estable que restar las dos medianas).
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import date
+
+from _django import configurar_django
+
+URLS = ('/api_movimientos/?tamano=50', '/api_async/farmacias/', '/ajax/division/')
+MIDDLEWARE = 'App.metricas.metricas_middleware'
+
+
+def sembrar(filas):
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from App.models import Farmacia, Moto, Motorista, Movimiento, UsuarioRol
+
+    call_command('migrate', verbosity=0)
+    # Las APIs exigen sesión de admin
+    admin = User.objects.create_user('bench_admin', password='Bench123@')
+    UsuarioRol.objects.create(usuario=admin, rol='admin')
+    farmacia = Farmacia.objects.create(
+        nombre='Farmacia Benchmark', direccion='Calle 1', telefono='123', correo='b@logico.com',
+        region='Metropolitana de Santiago', provincia='Santiago', comuna='Santiago',
+    )
+    moto = Moto.objects.create(patente='BENCH1', marca='Honda', modelo='CB190', anio=2022)
+    motorista = Motorista.objects.create(
+        nombre='Motorista Benchmark', rut='11111111-1', telefono='123', correo='m@logico.com',
+        licencia='C1', fecha_ingreso=date(2024, 1, 1), farmacia=farmacia, moto=moto,
+    )
+    Movimiento.objects.bulk_create([
+        Movimiento(
+            codigo=f'B{i:07d}', tipo='DIRECTO', estado='COMPLETADO', destino='Destino',
+            farmacia_origen=farmacia, motorista=motorista, moto=moto,
+        )
+        for i in range(filas)
+    ])
+    return admin
+
+
+def ronda(cliente, requests):
+    inicio = time.perf_counter()
+    for i in range(requests):
+        response = cliente.get(URLS[i % len(URLS)])
+        assert response.status_code == 200, response.status_code
+    return (time.perf_counter() - inicio) / requests
+
+
+def ejecutar(requests, rondas, filas):
+    with tempfile.TemporaryDirectory() as tmp:
+        configurar_django(os.path.join(tmp, 'benchmark.sqlite3'))
+        from django.conf import settings
+        from django.test import Client, override_settings
+
+        admin = sembrar(filas)
+        con = list(settings.MIDDLEWARE)
+        sin = [m for m in con if m != MIDDLEWARE]
+        tiempos = {'con': [], 'sin': []}
+        for _ in range(rondas):
+            for nombre, middleware in (('sin', sin), ('con', con)):
+                with override_settings(MIDDLEWARE=middleware, ALLOWED_HOSTS=['testserver']):
+                    cliente = Client()
+                    cliente.force_login(admin)
+                    ronda(cliente, 50)
+                    tiempos[nombre].append(ronda(cliente, requests // rondas))
+
+    sin_ms = statistics.median(tiempos['sin']) * 1000
+    con_ms = statistics.median(tiempos['con']) * 1000
+    pares = statistics.median(con / sin - 1 for con, sin in zip(tiempos['con'], tiempos['sin']))
+    print(f"{'variante':>10} {'ms/request':>11}")
+    print(f"{'sin':>10} {sin_ms:>11.3f}")
+    print(f"{'con':>10} {con_ms:>11.3f}")
+    print(f"overhead: {pares * 100:+.2f}%")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rondas', type=int, default=40)
+    parser.add_argument('--filas', type=int, default=1000, help='movimientos sembrados')
+    args = parser.parse_args()
+    ejecutar(args.requests, args.rondas, args.filas)
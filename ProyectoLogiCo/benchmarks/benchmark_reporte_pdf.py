@@ -0,0 +1,116 @@
+"""
+Benchmark de memoria del reporte PDF de movimientos.
+
+Uso (desde la carpeta ProyectoLogiCo):
+    python benchmarks/benchmark_reporte_pdf.py --filas 10000 100000 1000000
+
+Cada tamaño se siembra en una base SQLite temporal y el PDF se genera en
+un proceso aparte, así el pico de RSS (ru_maxrss) corresponde solo a la
+generación del reporte y no a la carga de datos.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+from _django import configurar_django
+
+LOTE = 10000
+
+
+def rss_pico_mb():
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB, macOS bytes
+    return pico / 1024 / (1024 if sys.platform == 'darwin' else 1)
+
+
+def sembrar(db, filas):
+    configurar_django(db)
+    from django.core.management import call_command
+    from App.models import Farmacia, Moto, Motorista, Movimiento
+
+    call_command('migrate', verbosity=0)
+    farmacia = Farmacia.objects.create(
+        nombre='Farmacia Benchmark', direccion='Av. Siempre Viva 742', telefono='123',
+        correo='bench@logico.com', region='Metropolitana de Santiago',
+        provincia='Santiago', comuna='Santiago',
+    )
+    moto = Moto.objects.create(patente='BENCH1', marca='Honda', modelo='CB190', anio=2022)
+    motorista = Motorista.objects.create(
+        nombre='Motorista Benchmark', rut='11111111-1', telefono='123', correo='m@logico.com',
+        licencia='C1', fecha_ingreso=date(2024, 1, 1), farmacia=farmacia, moto=moto,
+    )
+    for inicio in range(0, filas, LOTE):
+        Movimiento.objects.bulk_create([
+            Movimiento(
+                codigo=f'B{i:09d}', tipo='DIRECTO', estado='COMPLETADO',
+                destino='Calle Larga 1234, depto 56', farmacia_origen=farmacia,
+                motorista=motorista, moto=moto,
+            )
+            for i in range(inicio, min(inicio + LOTE, filas))
+        ])
+
+
+def medir(db):
+    configurar_django(db)
+    from django.utils import timezone
+    from App.models import Movimiento
+    from App.reportes import filtrar_periodo, generar_pdf_movimientos
+
+    base = rss_pico_mb()
+    anio = str(timezone.localdate().year)
+    movimientos = filtrar_periodo(Movimiento.objects.all(), 'ANUAL', anio=anio)
+
+    inicio = time.perf_counter()
+    primer_byte = None
+    total = 0
+    for parte in generar_pdf_movimientos(movimientos, 'ANUAL', anio=anio):
+        if primer_byte is None:
+            primer_byte = time.perf_counter() - inicio
+        total += len(parte)
+    duracion = time.perf_counter() - inicio
+
+    print(json.dumps({
+        'rss_base_mb': round(base, 1),
+        'rss_pico_mb': round(rss_pico_mb(), 1),
+        'bytes_pdf': total,
+        'primer_byte_s': round(primer_byte, 4),
+        'duracion_s': round(duracion, 2),
+    }))
+
+
+def ejecutar(filas_lista):
+    print(f"{'filas':>10} {'RSS base MB':>12} {'RSS pico MB':>12} {'PDF MB':>8} {'1er byte s':>11} {'total s':>8}")
+    for filas in filas_lista:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = os.path.join(tmp, 'benchmark.sqlite3')
+            script = os.path.abspath(__file__)
+            subprocess.run([sys.executable, script, '--sembrar', str(filas), '--db', db], check=True)
+            salida = subprocess.run(
+                [sys.executable, script, '--medir', '--db', db],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            r = json.loads(salida.strip().splitlines()[-1])
+            print(f"{filas:>10} {r['rss_base_mb']:>12} {r['rss_pico_mb']:>12} "
+                  f"{r['bytes_pdf'] / 1024 / 1024:>8.1f} {r['primer_byte_s']:>11} {r['duracion_s']:>8}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filas', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--sembrar', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--medir', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.sembrar is not None:
+        sembrar(args.db, args.sembrar)
+    elif args.medir:
+        medir(args.db)
+    else:
+        ejecutar(args.filas)